@@ -2,71 +2,228 @@
 
 from __future__ import annotations
 
+import gzip
 import hashlib
-import json
+import sys
+import threading
 import time
+from collections import OrderedDict
 from functools import lru_cache
-from typing import Any, Optional
+from pathlib import Path
+from typing import Any, Iterable, Optional
 
 import sqlite3
 
-# ── TTL Cache ───────────────────────────────────────────────────────
+from fastapi import Request, Response
+from pydantic import TypeAdapter
 
+from snapshot import Snapshot, load_or_build
 
-class TTLCache:
-    """Simple in-memory cache with TTL expiration."""
+# ── LRU + TTL Cache ─────────────────────────────────────────────────
 
-    def __init__(self, ttl_seconds: int = 300, max_size: int = 1000):
-        self._store: dict[str, tuple[float, Any]] = {}
+
+class LRUCache:
+    """Thread-safe LRU cache with TTL expiry and a byte-size budget.
+
+    Entries live in an ``OrderedDict`` (oldest first), so get/set/evict are
+    all O(1). Expired entries are dropped lazily when read and swept
+    periodically on write.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = 300,
+        max_size: int = 1000,
+        max_bytes: int = 16 * 1024 * 1024,
+        sweep_interval: float = 60.0,
+    ):
+        # key → (expires_at, size_bytes, value)
+        self._store: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
         self._ttl = ttl_seconds
         self._max_size = max_size
+        self._max_bytes = max_bytes
+        self._sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
 
     def get(self, key: str) -> Optional[Any]:
-        if key in self._store:
-            ts, value = self._store[key]
-            if time.time() - ts < self._ttl:
-                return value
-            del self._store[key]
-        return None
-
-    def set(self, key: str, value: Any) -> None:
-        # Evict oldest if full
-        if len(self._store) >= self._max_size:
-            oldest_key = min(self._store, key=lambda k: self._store[k][0])
-            del self._store[oldest_key]
-        self._store[key] = (time.time(), value)
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self._discard(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._store.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key: str, value: Any, size: int | None = None) -> None:
+        if size is None:
+            size = _estimate_size(value)
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._next_sweep:
+                self._sweep(now)
+            self._discard(key)
+            if size > self._max_bytes:
+                return  # would evict everything else; don't cache it
+            self._store[key] = (now + self._ttl, size, value)
+            self._bytes += size
+            while len(self._store) > self._max_size or self._bytes > self._max_bytes:
+                _, (_, old_size, _) = self._store.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
 
     def invalidate(self, key: str) -> None:
-        self._store.pop(key, None)
+        with self._lock:
+            self._discard(key)
 
     def clear(self) -> None:
-        self._store.clear()
+        with self._lock:
+            self._store.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._store),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def _discard(self, key: str) -> None:
+        entry = self._store.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _sweep(self, now: float) -> None:
+        expired = [k for k, (expires_at, _, _) in self._store.items() if expires_at <= now]
+        for k in expired:
+            self._discard(k)
+        self.expirations += len(expired)
+        self._next_sweep = now + self._sweep_interval
+
+
+def _estimate_size(value: Any) -> int:
+    """Rough deep size in bytes of a cached value."""
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(value, (bytes, bytearray, str)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            _estimate_size(k) + _estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(_estimate_size(v) for v in value)
+    return sys.getsizeof(value)
 
 
 # ── Global caches ───────────────────────────────────────────────────
 
-query_cache = TTLCache(ttl_seconds=300, max_size=500)
-neighborhood_cache = TTLCache(ttl_seconds=600, max_size=100)
-occasion_cache = TTLCache(ttl_seconds=600, max_size=50)
-trending_cache = TTLCache(ttl_seconds=120, max_size=10)
+query_cache = LRUCache(ttl_seconds=300, max_size=500, max_bytes=32 * 1024 * 1024)
+neighborhood_cache = LRUCache(ttl_seconds=600, max_size=100, max_bytes=8 * 1024 * 1024)
+occasion_cache = LRUCache(ttl_seconds=600, max_size=50, max_bytes=8 * 1024 * 1024)
+trending_cache = LRUCache(ttl_seconds=120, max_size=10, max_bytes=2 * 1024 * 1024)
+search_cache = LRUCache(ttl_seconds=300, max_size=2000, max_bytes=16 * 1024 * 1024)
+place_cache = LRUCache(ttl_seconds=600, max_size=5000, max_bytes=32 * 1024 * 1024)
+conversation_cache = LRUCache(ttl_seconds=1800, max_size=10000, max_bytes=16 * 1024 * 1024)
+suggest_cache = LRUCache(ttl_seconds=600, max_size=5000, max_bytes=8 * 1024 * 1024)
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    """Hit/miss/eviction counters for every global cache."""
+    return {
+        "query": query_cache.stats(),
+        "neighborhood": neighborhood_cache.stats(),
+        "occasion": occasion_cache.stats(),
+        "trending": trending_cache.stats(),
+        "search": search_cache.stats(),
+        "suggest": suggest_cache.stats(),
+        "conversation": conversation_cache.stats(),
+        "place": place_cache.stats(),
+    }
+
+
+def clear_caches(changed_ids: Optional[Iterable[str]] = None) -> None:
+    """Drop everything derived from the place catalog (after a reload).
+
+    With ``changed_ids`` (from an incremental import's changeset) only
+    those places leave the place cache; result lists are always dropped,
+    since any change can reorder them. Conversation contexts stay: they
+    are checked against the facet index generation instead.
+    """
+    for cache in (
+        query_cache, neighborhood_cache, occasion_cache, trending_cache,
+        search_cache, suggest_cache,
+    ):
+        cache.clear()
+    if changed_ids is None:
+        place_cache.clear()
+    else:
+        for pid in changed_ids:
+            place_cache.invalidate(pid)
 
 
 # ── Pre-computed views ──────────────────────────────────────────────
 
 
-_precomputed: dict[str, Any] = {}
+# Bump when build_views() changes what it produces: snapshot files are
+# keyed by data version *and* this, so a deploy never maps old shapes
+VIEWS_SCHEMA = 2
+
+# The shared snapshot, or the views built in this process if it can't be
+# written; replaced as a whole so readers never see it half-loaded
+_views: Snapshot | dict[str, Any] = {}
 
 
 def precompute_views(conn: sqlite3.Connection) -> None:
+    """Attach to (or build) the shared snapshot of pre-computed views.
+
+    All workers map one read-only file keyed by the data version; if the
+    snapshot can't be written, the views are kept in this process instead.
+    The new views are published in one assignment; a replaced snapshot is
+    unmapped when the last request still reading it lets go (refcount).
+    """
+    global _views
+    from database import DATABASE_PATH, get_data_version
+
+    version = f"{get_data_version(conn)}-s{VIEWS_SCHEMA}"
+    try:
+        views = load_or_build(Path(DATABASE_PATH), version, lambda: build_views(conn))
+    except OSError as e:
+        print(f"⚠️ ما قدرنا نكتب السنابشوت ({e}) — الكاش بالذاكرة")
+        views = build_views(conn)
+    _views = views
+
+
+def build_views(conn: sqlite3.Connection) -> dict[str, Any]:
     """Pre-compute top-10 per neighborhood, trending, and occasion data."""
     from database import row_to_dict
 
+    views: dict[str, Any] = {}
+
     # Top 10 per neighborhood
     neighborhoods = conn.execute(
         "SELECT DISTINCT neighborhood, neighborhood_en FROM places WHERE neighborhood != ''"
     ).fetchall()
 
-    top_by_hood: dict[str, list[dict]] = {}
     for row in neighborhoods:
         hood = row["neighborhood"]
         places = conn.execute(
@@ -76,9 +233,7 @@ def precompute_views(conn: sqlite3.Connection) -> None:
             LIMIT 10""",
             (hood,),
         ).fetchall()
-        top_by_hood[hood] = [row_to_dict(p) for p in places]
-
-    _precomputed["top_by_neighborhood"] = top_by_hood
+        views[f"top_by_neighborhood:{hood}"] = [row_to_dict(p) for p in places]
 
     # Trending: hot (trending=true) + new (is_new=true)
     hot = conn.execute(
@@ -87,11 +242,11 @@ def precompute_views(conn: sqlite3.Connection) -> None:
     new = conn.execute(
         "SELECT * FROM places WHERE is_new = 1 ORDER BY google_rating DESC LIMIT 30"
     ).fetchall()
-    _precomputed["trending_hot"] = [row_to_dict(p) for p in hot]
-    _precomputed["trending_new"] = [row_to_dict(p) for p in new]
+    views["trending_hot"] = [row_to_dict(p) for p in hot]
+    views["trending_new"] = [row_to_dict(p) for p in new]
 
     # Occasion mappings
-    _precomputed["occasions"] = _build_occasion_mappings(conn)
+    views["occasions"] = views["occasion_keywords"] = _build_occasion_mappings(conn)
 
     # Neighborhood list
     hood_info = conn.execute(
@@ -100,13 +255,12 @@ def precompute_views(conn: sqlite3.Connection) -> None:
         GROUP BY neighborhood
         ORDER BY cnt DESC"""
     ).fetchall()
-    _precomputed["neighborhoods"] = [dict(r) for r in hood_info]
+    views["neighborhoods"] = [dict(r) for r in hood_info]
+    return views
 
 
 def _build_occasion_mappings(conn: sqlite3.Connection) -> dict[str, list[str]]:
     """Map occasion types to perfect_for keywords."""
-    from database import row_to_dict
-
     occasion_keywords: dict[str, list[str]] = {
         "romantic": [
             "رومانسي", "أجواء رومانسية", "عشاء رومانسي",
@@ -131,18 +285,76 @@ def _build_occasion_mappings(conn: sqlite3.Connection) -> dict[str, list[str]]:
             "سهرة هادئة", "قراءة", "دراسة",
         ],
     }
-    _precomputed["occasion_keywords"] = occasion_keywords
     return occasion_keywords
 
 
+def cached_places(conn: sqlite3.Connection, ids: list[str]) -> dict[str, dict]:
+    """Decoded place rows by id, reading only cache misses (one query).
+
+    The dicts are shared between requests: callers must not mutate them.
+    """
+    from database import fetch_places_by_ids
+
+    found: dict[str, dict] = {}
+    misses = []
+    for pid in ids:
+        place = place_cache.get(pid)
+        if place is None:
+            misses.append(pid)
+        else:
+            found[pid] = place
+    for place in fetch_places_by_ids(conn, misses):
+        place_cache.set(place["id"], place)
+        found[place["id"]] = place
+    return found
+
+
 def get_precomputed(key: str) -> Any:
-    return _precomputed.get(key)
+    """Decode one view from the shared snapshot (or the in-process fallback)."""
+    return _views.get(key)
+
+
+# ── Pre-encoded responses ───────────────────────────────────────────
+
+_GZIP_MIN_SIZE = 500  # same threshold as the GZip middleware
+
+
+class EncodedResponse:
+    """A response payload serialized once: JSON bytes, gzip bytes and ETag."""
+
+    __slots__ = ("body", "gzip_body", "etag", "nbytes")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.gzip_body = (
+            gzip.compress(body, compresslevel=6) if len(body) >= _GZIP_MIN_SIZE else None
+        )
+        self.etag = hashlib.md5(body).hexdigest()
+        self.nbytes = len(body) + len(self.gzip_body or b"") + len(self.etag)
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_type: Any) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
 
+def encode_response(response_type: Any, data: Any) -> EncodedResponse:
+    """Validate ``data`` against the route's response model and encode it once."""
+    adapter = _adapter(response_type)
+    return EncodedResponse(adapter.dump_json(adapter.validate_python(data)))
 
-# ── ETag ────────────────────────────────────────────────────────────
 
+def encoded_response(request: Request, entry: EncodedResponse) -> Response:
+    """Serve a pre-encoded entry, honouring If-None-Match and Accept-Encoding.
 
-def compute_etag(data: Any) -> str:
-    """Generate ETag from data content."""
-    raw = json.dumps(data, ensure_ascii=False, sort_keys=True, default=str)
-    return hashlib.md5(raw.encode()).hexdigest()
+    Every variant (304 and identity bodies included) carries ``Vary:
+    Accept-Encoding`` so shared caches never hand a gzip body to a client
+    that didn't ask for one, or the reverse.
+    """
+    headers = {"ETag": entry.etag, "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == entry.etag:
+        return Response(status_code=304, headers=headers)
+    if entry.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(entry.gzip_body, media_type="application/json", headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
@@ -2,78 +2,365 @@
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
+import os
 import sqlite3
+import threading
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Iterator, Optional
+
+import aiosqlite
+
+from normalization import normalize_arabic
 
 DATABASE_PATH = Path("./places.db")
+READ_POOL_SIZE = 4
+
+# Bump when the text written to the FTS index changes; startup re-indexes.
+FTS_VERSION = "3-trigram"
+
+# Tables of the place catalog (everything rebuilt from places.json)
+CATALOG_TABLES = ("places_fts", "places_trigram", "places_rtree", "place_tags", "meta", "places")
+
+# Secondary indexes over the catalog tables; bulk imports build them once
+# after loading.
+SECONDARY_INDEXES: dict[str, str] = {
+    "idx_places_category": "places(category)",
+    "idx_places_neighborhood": "places(neighborhood)",
+    "idx_places_rating": "places(google_rating DESC)",
+    "idx_places_reviews": "places(review_count)",  # MAX() for search ranking
+    "idx_places_trending": "places(trending)",
+    "idx_places_is_new": "places(is_new)",
+    "idx_places_category_rating": "places(category, google_rating DESC)",
+    "idx_places_neighborhood_rating": "places(neighborhood, google_rating DESC)",
+    "idx_place_tags_place": "place_tags(place_id)",
+}
 
 _conn: Optional[sqlite3.Connection] = None
+_write_lock = threading.Lock()
+_read_pool: Optional[ReadPool] = None
+_async_pool: Optional[AsyncReadPool] = None
+_catalog_stamp: Optional[tuple[int, int]] = None
+
+
+# ── Connection pools ────────────────────────────────────────────────
+
+
+class PoolClosed(Exception):
+    """The pool was replaced (catalog reload) or shut down; borrow from the current one."""
+
+
+class ReadPool:
+    """Fixed-size pool of read-only connections shared by threadpool handlers."""
+
+    def __init__(self, db_path: Path, size: int = READ_POOL_SIZE):
+        self._idle: list[sqlite3.Connection] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        for _ in range(max(1, size)):
+            self._idle.append(_create_connection(db_path, readonly=True))
+
+    def acquire(self) -> sqlite3.Connection:
+        """Borrow a connection; raises :class:`PoolClosed` once the pool is closed."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._idle or self._closed)
+            if self._closed:
+                raise PoolClosed
+            return self._idle.pop()
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        with self._cond:
+            if not self._closed:
+                self._idle.append(conn)
+                self._cond.notify()
+                return
+        conn.close()
+
+    def close(self) -> None:
+        """Close idle connections now; borrowed ones close when returned.
+
+        Threads still waiting get :class:`PoolClosed` and move on to the
+        pool that replaced this one.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+
+class AsyncReadPool:
+    """Read-only aiosqlite connections for async route handlers."""
+
+    def __init__(self, db_path: Path, size: int = READ_POOL_SIZE):
+        self._db_path = db_path
+        self._size = max(1, size)
+        self._idle: list[aiosqlite.Connection] = []
+        self._cond: Optional[asyncio.Condition] = None
+        self._closed = False
+
+    async def open(self) -> None:
+        conns = []
+        for _ in range(self._size):
+            conn = await aiosqlite.connect(_readonly_uri(self._db_path), uri=True)
+            conn.row_factory = sqlite3.Row
+            await conn.execute("PRAGMA query_only=1")
+            await conn.execute("PRAGMA busy_timeout=5000")
+            for sql, params in _attach_catalog_sql(readonly=True):
+                await conn.execute(sql, params)
+            conns.append(conn)
+        if self._cond is not None or self._closed:  # opened concurrently / closed meanwhile
+            for conn in conns:
+                await conn.close()
+            return
+        self._idle = conns
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> aiosqlite.Connection:
+        """Borrow a connection; raises :class:`PoolClosed` once the pool is closed."""
+        if self._cond is None:
+            await self.open()
+        if self._cond is None:  # closed before it finished opening
+            raise PoolClosed
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._idle or self._closed)
+            if self._closed:
+                raise PoolClosed
+            return self._idle.pop()
+
+    async def release(self, conn: aiosqlite.Connection) -> None:
+        async with self._cond:
+            if not self._closed:
+                self._idle.append(conn)
+                self._cond.notify()
+                return
+        await conn.close()
+
+    async def close(self) -> None:
+        """Close idle connections now; borrowed ones close when returned."""
+        if self._cond is None:
+            self._closed = True
+            return
+        async with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in idle:
+            await conn.close()
 
 
 def get_connection() -> sqlite3.Connection:
-    """Return the module-level synchronous connection (create if needed)."""
+    """Return the module-level writer connection (create if needed).
+
+    Request handlers should prefer :func:`read_connection` and
+    :func:`write_connection`; this is kept for startup and scripts.
+    """
     global _conn
     if _conn is None:
         _conn = _create_connection(DATABASE_PATH)
     return _conn
 
 
-def _create_connection(db_path: Path) -> sqlite3.Connection:
-    conn = sqlite3.connect(str(db_path), check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA synchronous=NORMAL")
+@contextmanager
+def read_connection() -> Iterator[sqlite3.Connection]:
+    """Borrow a read-only connection from the per-worker pool."""
+    global _read_pool
+    while True:
+        pool = _read_pool
+        if pool is None:
+            get_connection()  # make sure the file and WAL exist first
+            pool = _read_pool = ReadPool(DATABASE_PATH, READ_POOL_SIZE)
+        try:
+            conn = pool.acquire()
+            break
+        except PoolClosed:
+            continue  # swapped by a catalog reload while we waited
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def write_connection() -> Iterator[sqlite3.Connection]:
+    """Serialize access to the single writer; commit on success, roll back on error."""
+    with _write_lock:
+        conn = get_connection()
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+@asynccontextmanager
+async def async_read_connection() -> AsyncIterator[aiosqlite.Connection]:
+    """Borrow a read-only aiosqlite connection (for ``async def`` routes)."""
+    global _async_pool
+    while True:
+        pool = _async_pool
+        if pool is None:
+            get_connection()
+            pool = _async_pool = AsyncReadPool(DATABASE_PATH, READ_POOL_SIZE)
+        try:
+            conn = await pool.acquire()
+            break
+        except PoolClosed:
+            continue
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
+async def open_async_pool() -> None:
+    """Open the aiosqlite pool on the running event loop (replacing the old one)."""
+    global _async_pool
+    pool = AsyncReadPool(DATABASE_PATH, READ_POOL_SIZE)
+    await pool.open()
+    old, _async_pool = _async_pool, pool
+    if old is not None:
+        await old.close()
+
+
+async def close_async_pool() -> None:
+    global _async_pool
+    old, _async_pool = _async_pool, None
+    if old is not None:
+        await old.close()
+
+
+def close_db() -> None:
+    """Close the writer and the sync read pool."""
+    global _conn, _read_pool
+    old, _read_pool = _read_pool, None
+    if old is not None:
+        old.close()
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+
+def _readonly_uri(db_path: Path) -> str:
+    return f"{Path(db_path).resolve().as_uri()}?mode=ro"
+
+
+def _create_connection(db_path: Path, readonly: bool = False) -> sqlite3.Connection:
+    if readonly:
+        conn = sqlite3.connect(_readonly_uri(db_path), uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only=1")
+    else:
+        conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
     conn.execute("PRAGMA cache_size=-64000")  # 64 MB
     conn.execute("PRAGMA busy_timeout=5000")
+    # Lets index rebuilds normalize text in SQL (see rebuild_fts)
+    conn.create_function("normalize_arabic", 1, normalize_arabic, deterministic=True)
+    for sql, params in _attach_catalog_sql(readonly):
+        conn.execute(sql, params)
     return conn
 
 
-def init_db(db_path: Path | None = None) -> sqlite3.Connection:
-    """Create tables, indexes, and FTS5 virtual table."""
-    global _conn, DATABASE_PATH
+def catalog_path(db_path: Path | None = None) -> Path:
+    """The place catalog file that goes with ``db_path`` (places.catalog.db)."""
+    db_path = Path(db_path or DATABASE_PATH)
+    return db_path.with_name(f"{db_path.stem}.catalog{db_path.suffix}")
+
+
+def open_catalog(path: Path, indexes: bool = True) -> sqlite3.Connection:
+    """Standalone connection to a catalog file (the importer builds into one).
+
+    With ``indexes=False`` only the tables are created, so a bulk load
+    into a fresh file isn't slowed down by maintaining the secondary
+    indexes; build them afterwards with :func:`create_secondary_indexes`.
+    """
+    conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    conn.create_function("normalize_arabic", 1, normalize_arabic, deterministic=True)
+    create_catalog_schema(conn, indexes=indexes)
+    return conn
+
+
+def _attach_catalog_sql(readonly: bool) -> list[tuple[str, tuple]]:
+    path = catalog_path()
+    target = _readonly_uri(path) if readonly else str(path)
+    return [
+        ("ATTACH DATABASE ? AS catalog", (target,)),
+        ("PRAGMA catalog.cache_size=-64000", ()),
+    ]
+
+
+def _file_stamp(path: Path) -> Optional[tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_dev, st.st_ino)
+
+
+def catalog_changed() -> bool:
+    """Has a new catalog file been swapped in since this process attached?"""
+    stamp = _file_stamp(catalog_path())
+    return stamp is not None and stamp != _catalog_stamp
+
+
+def reload_catalog() -> Optional[tuple[int, int]]:
+    """Attach the writer and a fresh read pool to the current catalog file.
+
+    Connections already borrowed finish their request on the old file,
+    which stays readable until they close. The async pool is reopened
+    separately (:func:`open_async_pool`) on the event loop.
+
+    Returns the file's stamp; pass it to :func:`mark_catalog_loaded` once
+    everything derived from the catalog is rebuilt, so a reload that fails
+    half-way is retried on the next :func:`catalog_changed` poll.
+    """
+    global _read_pool
+    # stat before attaching: a swap in between costs a spare reload, not a missed one
+    stamp = _file_stamp(catalog_path())
+    with _write_lock:
+        conn = get_connection()
+        conn.execute("DETACH DATABASE catalog")
+        for sql, params in _attach_catalog_sql(readonly=False):
+            conn.execute(sql, params)
+    old, _read_pool = _read_pool, ReadPool(DATABASE_PATH, READ_POOL_SIZE)
+    if old is not None:
+        old.close()
+    return stamp
+
+
+def mark_catalog_loaded(stamp: Optional[tuple[int, int]]) -> None:
+    """Record the catalog file this worker now serves (see :func:`reload_catalog`)."""
+    global _catalog_stamp
+    _catalog_stamp = stamp
+
+
+def init_db(db_path: Path | None = None, pool_size: int | None = None) -> sqlite3.Connection:
+    """Create tables, indexes, and FTS5 virtual table.
+
+    User data (favorites, lists, sync) lives in ``db_path``; the place
+    catalog is a separate file (see :func:`catalog_path`) attached to
+    every connection as ``catalog``. Re-opens the writer and the read
+    pool, and returns the writer.
+    """
+    global _conn, _read_pool, _catalog_stamp, DATABASE_PATH, READ_POOL_SIZE
     if db_path:
         DATABASE_PATH = db_path
+    if pool_size:
+        READ_POOL_SIZE = pool_size
+    close_db()
     _conn = _create_connection(DATABASE_PATH)
     conn = _conn
 
     conn.executescript("""
-        CREATE TABLE IF NOT EXISTS places (
-            id TEXT PRIMARY KEY,
-            name_ar TEXT DEFAULT '',
-            name_en TEXT DEFAULT '',
-            category TEXT DEFAULT '',
-            category_ar TEXT,
-            category_en TEXT,
-            neighborhood TEXT DEFAULT '',
-            neighborhood_en TEXT,
-            description_ar TEXT,
-            google_rating REAL,
-            price_level TEXT,
-            trending INTEGER DEFAULT 0,
-            is_new INTEGER DEFAULT 0,
-            sources TEXT,
-            google_maps_url TEXT,
-            district TEXT,
-            perfect_for TEXT,
-            lat REAL,
-            lng REAL,
-            is_free INTEGER DEFAULT 0,
-            audience TEXT,
-            price_range TEXT,
-            tags TEXT,
-            opening_hours TEXT
-        );
-
-        CREATE INDEX IF NOT EXISTS idx_places_category ON places(category);
-        CREATE INDEX IF NOT EXISTS idx_places_neighborhood ON places(neighborhood);
-        CREATE INDEX IF NOT EXISTS idx_places_rating ON places(google_rating DESC);
-        CREATE INDEX IF NOT EXISTS idx_places_trending ON places(trending);
-        CREATE INDEX IF NOT EXISTS idx_places_is_new ON places(is_new);
-        CREATE INDEX IF NOT EXISTS idx_places_category_rating ON places(category, google_rating DESC);
-        CREATE INDEX IF NOT EXISTS idx_places_neighborhood_rating ON places(neighborhood, google_rating DESC);
-
         -- Favorites
         CREATE TABLE IF NOT EXISTS favorites (
             device_id TEXT NOT NULL,
@@ -103,11 +390,122 @@ def init_db(db_path: Path | None = None) -> sqlite3.Connection:
             FOREIGN KEY (list_id) REFERENCES lists(id),
             FOREIGN KEY (place_id) REFERENCES places(id)
         );
+
+        -- Offline sync: applied op ids (idempotency) and last-writer-wins clocks
+        CREATE TABLE IF NOT EXISTS sync_ops (
+            device_id TEXT NOT NULL,
+            op_id TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (device_id, op_id)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS sync_state (
+            device_id TEXT NOT NULL,
+            entity TEXT NOT NULL,
+            key TEXT NOT NULL,
+            client_ts INTEGER NOT NULL,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (device_id, entity, key)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_sync_ops_applied ON sync_ops(applied_at);
     """)
 
-    # FTS5 virtual table for Arabic full-text search
-    conn.execute("""
-        CREATE VIRTUAL TABLE IF NOT EXISTS places_fts USING fts5(
+    # Columns added after the first release
+    columns = {r["name"] for r in conn.execute("PRAGMA main.table_info(sync_state)")}
+    if "updated_at" not in columns:
+        conn.execute("ALTER TABLE sync_state ADD COLUMN updated_at TIMESTAMP")
+        conn.execute("UPDATE sync_state SET updated_at = CURRENT_TIMESTAMP")
+
+    create_catalog_schema(conn, "catalog")
+    conn.commit()
+    _migrate_legacy_catalog(conn)
+    _catalog_stamp = _file_stamp(catalog_path())
+    _read_pool = ReadPool(DATABASE_PATH, READ_POOL_SIZE)
+    return conn
+
+
+def _migrate_legacy_catalog(conn: sqlite3.Connection) -> None:
+    """Move places kept in main (before the catalog split) into the catalog.
+
+    The legacy tables would shadow the attached catalog, so they go — but
+    only once their rows are committed to the catalog file. Search, tag
+    and spatial indexes are derived data and are rebuilt there.
+    """
+    if not conn.execute("SELECT 1 FROM main.sqlite_master WHERE name = 'places'").fetchone():
+        return
+    print("🧹 نقل الأماكن لملف الكتالوج من قاعدة المستخدمين")
+    if conn.execute("SELECT 1 FROM catalog.places LIMIT 1").fetchone() is None:
+        for table in ("places", "meta"):
+            legacy = {r["name"] for r in conn.execute(f"PRAGMA main.table_info({table})")}
+            if not legacy:
+                continue
+            current = [r["name"] for r in conn.execute(f"PRAGMA catalog.table_info({table})")]
+            columns = ", ".join(c for c in current if c in legacy)
+            conn.execute(
+                f"INSERT OR REPLACE INTO catalog.{table} ({columns}) SELECT {columns} FROM main.{table}"
+            )
+        conn.commit()
+    for table in CATALOG_TABLES:
+        conn.execute(f"DROP TABLE IF EXISTS main.{table}")
+    conn.commit()
+    # unqualified names resolve to the catalog from here on
+    rebuild_tags(conn)
+    rebuild_fts(conn)
+    rebuild_spatial_index(conn)
+    conn.commit()
+
+
+def create_catalog_schema(
+    conn: sqlite3.Connection, schema: str = "main", indexes: bool = True
+) -> None:
+    """Create the place tables (and, unless ``indexes=False``, their indexes) in ``schema``."""
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.places (
+            id TEXT PRIMARY KEY,
+            name_ar TEXT DEFAULT '',
+            name_en TEXT DEFAULT '',
+            category TEXT DEFAULT '',
+            category_ar TEXT,
+            category_en TEXT,
+            neighborhood TEXT DEFAULT '',
+            neighborhood_en TEXT,
+            description_ar TEXT,
+            google_rating REAL,
+            review_count INTEGER,
+            price_level TEXT,
+            trending INTEGER DEFAULT 0,
+            is_new INTEGER DEFAULT 0,
+            sources TEXT,
+            google_maps_url TEXT,
+            district TEXT,
+            perfect_for TEXT,
+            lat REAL,
+            lng REAL,
+            is_free INTEGER DEFAULT 0,
+            audience TEXT,
+            price_range TEXT,
+            tags TEXT,
+            opening_hours TEXT,
+            content_hash TEXT
+        );
+
+        -- One row per list-valued attribute (perfect_for / audience / tags)
+        CREATE TABLE IF NOT EXISTS {schema}.place_tags (
+            kind TEXT NOT NULL,
+            tag TEXT NOT NULL,
+            place_id TEXT NOT NULL,
+            PRIMARY KEY (kind, tag, place_id),
+            FOREIGN KEY (place_id) REFERENCES places(id)
+        ) WITHOUT ROWID;
+
+        -- Key/value metadata (data_version, ...)
+        CREATE TABLE IF NOT EXISTS {schema}.meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+
+        -- FTS5 virtual table for Arabic full-text search
+        CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.places_fts USING fts5(
             id UNINDEXED,
             name_ar,
             name_en,
@@ -116,74 +514,298 @@ def init_db(db_path: Path | None = None) -> sqlite3.Connection:
             category,
             neighborhood,
             tokenize='unicode61 remove_diacritics 2'
-        )
+        );
+
+        -- Trigram index for substring / partial-word matches (normalized text)
+        CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.places_trigram USING fts5(
+            id UNINDEXED,
+            name_ar,
+            name_en,
+            description_ar,
+            category,
+            neighborhood,
+            tokenize='trigram'
+        );
+
+        -- R*Tree spatial index keyed by places.rowid
+        CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.places_rtree USING rtree(
+            id,
+            min_lat, max_lat,
+            min_lng, max_lng
+        );
     """)
 
-    conn.commit()
-    return conn
+    # Columns added after the first release
+    columns = {r["name"] for r in conn.execute(f"PRAGMA {schema}.table_info(places)")}
+    for column, decl in (("review_count", "INTEGER"), ("content_hash", "TEXT")):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {schema}.places ADD COLUMN {column} {decl}")
+    if indexes:
+        create_secondary_indexes(conn, schema)
 
 
-def insert_place(conn: sqlite3.Connection, place: dict) -> None:
-    """Insert a single place into main table and FTS index."""
+def create_secondary_indexes(conn: sqlite3.Connection, schema: str = "main") -> None:
+    for name, target in SECONDARY_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {schema}.{name} ON {target}")
+
+
+def rebuild_spatial_index(conn: sqlite3.Connection, only: Optional[str] = None) -> int:
+    """Re-sync ``places_rtree`` with the coordinates in ``places``.
+
+    Run after bulk changes: ``INSERT OR REPLACE`` assigns new rowids.
+    ``only`` (an SQL subquery of place ids) limits it to those places.
+    """
+    if only is None:
+        conn.execute("DELETE FROM places_rtree")
+    else:
+        conn.execute(
+            f"""DELETE FROM places_rtree
+            WHERE id IN (SELECT rowid FROM places WHERE id IN ({only}))"""
+        )
+    cur = conn.execute(
+        f"""INSERT INTO places_rtree (id, min_lat, max_lat, min_lng, max_lng)
+        SELECT rowid, lat, lat, lng, lng FROM places
+        WHERE lat IS NOT NULL AND lng IS NOT NULL{_only_places(only)}"""
+    )
+    return cur.rowcount
+
+
+def delete_places(conn: sqlite3.Connection, only: str) -> int:
+    """Delete the places whose ids ``only`` selects, with their R*Tree rows.
+
+    The FTS / trigram / tag rows go with ``rebuild_fts`` / ``rebuild_tags``
+    over the same ids (they are keyed by place id, not rowid).
+    """
     conn.execute(
-        """INSERT OR REPLACE INTO places
-        (id, name_ar, name_en, category, category_ar, category_en,
-         neighborhood, neighborhood_en, description_ar, google_rating,
-         price_level, trending, is_new, sources, google_maps_url,
-         district, perfect_for, lat, lng, is_free, audience,
-         price_range, tags, opening_hours)
-        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-        (
-            place["id"],
-            place.get("name_ar", ""),
-            place.get("name_en", ""),
-            place.get("category", ""),
-            place.get("category_ar", ""),
-            place.get("category_en", ""),
-            place.get("neighborhood", ""),
-            place.get("neighborhood_en", ""),
-            place.get("description_ar", ""),
-            place.get("google_rating"),
-            place.get("price_level"),
-            1 if place.get("trending") else 0,
-            1 if place.get("is_new") else 0,
-            json.dumps(place.get("sources", []), ensure_ascii=False),
-            place.get("google_maps_url", ""),
-            place.get("district", ""),
-            json.dumps(place.get("perfect_for", []), ensure_ascii=False),
-            place.get("lat"),
-            place.get("lng"),
-            1 if place.get("is_free") else 0,
-            json.dumps(place.get("audience", []), ensure_ascii=False),
-            place.get("price_range", ""),
-            json.dumps(place.get("tags", []), ensure_ascii=False),
-            place.get("opening_hours", ""),
-        ),
+        f"""DELETE FROM places_rtree
+        WHERE id IN (SELECT rowid FROM places WHERE id IN ({only}))"""
+    )
+    return conn.execute(f"DELETE FROM places WHERE id IN ({only})").rowcount
+
+
+def _only_places(only: Optional[str], column: str = "id") -> str:
+    return "" if only is None else f" AND {column} IN ({only})"
+
+
+def get_meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row["value"] if row else None
+
+
+def set_meta(conn: sqlite3.Connection, key: str, value: str) -> None:
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def get_data_version(conn: sqlite3.Connection) -> str:
+    """Version of the imported place data (set by import_data.py)."""
+    version = get_meta(conn, "data_version")
+    if version:
+        return version
+    # Databases imported before versioning: derive one from the table shape
+    row = conn.execute("SELECT COUNT(*) as cnt, MAX(rowid) as max_id FROM places").fetchone()
+    return f"rows-{row['cnt']}-{row['max_id'] or 0}"
+
+
+def set_data_version(conn: sqlite3.Connection, version: str) -> None:
+    set_meta(conn, "data_version", version)
+
+
+def get_changeset(conn: sqlite3.Connection) -> Optional[dict]:
+    """What the last incremental import changed (see import_data.py), if any."""
+    raw = get_meta(conn, "changeset")
+    return json.loads(raw) if raw else None
+
+
+def set_changeset(conn: sqlite3.Connection, changeset: Optional[dict]) -> None:
+    if changeset is None:
+        conn.execute("DELETE FROM meta WHERE key = 'changeset'")
+    else:
+        set_meta(conn, "changeset", json.dumps(changeset, ensure_ascii=False))
+
+
+PLACE_COLUMNS = (
+    "id", "name_ar", "name_en", "category", "category_ar", "category_en",
+    "neighborhood", "neighborhood_en", "description_ar", "google_rating",
+    "review_count", "price_level", "trending", "is_new", "sources",
+    "google_maps_url", "district", "perfect_for", "lat", "lng", "is_free",
+    "audience", "price_range", "tags", "opening_hours", "content_hash",
+)
+
+INSERT_PLACE_SQL = (
+    f"INSERT OR REPLACE INTO places ({', '.join(PLACE_COLUMNS)}) "
+    f"VALUES ({','.join('?' * len(PLACE_COLUMNS))})"
+)
+
+# Keeps the rowid of an existing place (the R*Tree is keyed by it)
+UPSERT_PLACE_SQL = (
+    f"INSERT INTO places ({', '.join(PLACE_COLUMNS)}) "
+    f"VALUES ({','.join('?' * len(PLACE_COLUMNS))}) "
+    f"ON CONFLICT (id) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in PLACE_COLUMNS[1:])
+)
+
+
+def place_row(place: dict) -> tuple:
+    """Column values of a place from places.json, in ``PLACE_COLUMNS`` order.
+
+    The last value, ``content_hash``, fingerprints all the others so an
+    import can tell which rows actually changed.
+    """
+    values = (
+        place["id"],
+        place.get("name_ar", ""),
+        place.get("name_en", ""),
+        place.get("category", ""),
+        place.get("category_ar", ""),
+        place.get("category_en", ""),
+        place.get("neighborhood", ""),
+        place.get("neighborhood_en", ""),
+        place.get("description_ar", ""),
+        place.get("google_rating"),
+        place.get("review_count", place.get("google_reviews_count")),
+        place.get("price_level"),
+        1 if place.get("trending") else 0,
+        1 if place.get("is_new") else 0,
+        json.dumps(place.get("sources", []), ensure_ascii=False),
+        place.get("google_maps_url", ""),
+        place.get("district", ""),
+        json.dumps(place.get("perfect_for", []), ensure_ascii=False),
+        place.get("lat"),
+        place.get("lng"),
+        1 if place.get("is_free") else 0,
+        json.dumps(place.get("audience", []), ensure_ascii=False),
+        place.get("price_range", ""),
+        json.dumps(place.get("tags", []), ensure_ascii=False),
+        place.get("opening_hours", ""),
+    )
+    content = json.dumps(values, ensure_ascii=False).encode()
+    return values + (hashlib.sha1(content).hexdigest()[:16],)
+
+
+def insert_place(conn: sqlite3.Connection, place: dict) -> None:
+    """Insert a single place into the main table (indexes: see insert_fts)."""
+    conn.execute(INSERT_PLACE_SQL, place_row(place))
+
+
+# List-valued place fields mirrored into ``place_tags``
+TAG_KINDS = ("perfect_for", "audience", "tags")
+
+
+def insert_tags(conn: sqlite3.Connection, place: dict) -> None:
+    """Replace the ``place_tags`` rows of one place."""
+    conn.execute("DELETE FROM place_tags WHERE place_id = ?", (place["id"],))
+    conn.executemany(
+        "INSERT OR IGNORE INTO place_tags (kind, tag, place_id) VALUES (?,?,?)",
+        [
+            (kind, tag, place["id"])
+            for kind in TAG_KINDS
+            for tag in place.get(kind) or []
+            if tag
+        ],
+    )
+
+
+def rebuild_tags(conn: sqlite3.Connection, only: Optional[str] = None) -> int:
+    """Re-derive ``place_tags`` from the JSON columns of ``places``; returns row count.
+
+    ``only`` (an SQL subquery of place ids) limits it to those places.
+    """
+    conn.execute(f"DELETE FROM place_tags WHERE 1{_only_places(only, 'place_id')}")
+    count = 0
+    for kind in TAG_KINDS:
+        cur = conn.execute(
+            f"""INSERT OR IGNORE INTO place_tags (kind, tag, place_id)
+            SELECT ?, j.value, p.id FROM places p, json_each({_json_list(f"p.{kind}")}) j
+            WHERE j.value IS NOT NULL AND j.value != ''{_only_places(only, "p.id")}""",
+            (kind,),
+        )
+        count += cur.rowcount
+    return count
+
+
+def _json_list(column: str) -> str:
+    """SQL for ``column`` as a JSON array, ``'[]'`` when it isn't one."""
+    return (
+        f"CASE WHEN json_valid({column}) AND json_type({column}) = 'array' "
+        f"THEN {column} ELSE '[]' END"
     )
 
 
 def insert_fts(conn: sqlite3.Connection, place: dict) -> None:
-    """Insert into FTS5 index."""
-    tags_str = " ".join(place.get("tags", []))
+    """Insert into the FTS5 word index and the trigram substring index.
+
+    The index holds normalized text (see ``normalize_arabic``) so it lines
+    up with normalized queries; display fields always come from ``places``.
+    """
+    tags_str = " ".join(place.get("tags") or [])
+    name_ar = normalize_arabic(place.get("name_ar") or "")
+    name_en = normalize_arabic(place.get("name_en") or "")
+    description_ar = normalize_arabic(place.get("description_ar") or "")
+    category = normalize_arabic(place.get("category") or "")
+    neighborhood = normalize_arabic(place.get("neighborhood") or "")
     conn.execute(
         """INSERT OR REPLACE INTO places_fts
         (id, name_ar, name_en, description_ar, tags, category, neighborhood)
         VALUES (?,?,?,?,?,?,?)""",
         (
-            place["id"],
-            place.get("name_ar", ""),
-            place.get("name_en", ""),
-            place.get("description_ar", ""),
-            tags_str,
-            place.get("category", ""),
-            place.get("neighborhood", ""),
+            place["id"], name_ar, name_en, description_ar,
+            normalize_arabic(tags_str), category, neighborhood,
         ),
     )
+    conn.execute(
+        """INSERT INTO places_trigram
+        (id, name_ar, name_en, description_ar, category, neighborhood)
+        VALUES (?,?,?,?,?,?)""",
+        (place["id"], name_ar, name_en, description_ar, category, neighborhood),
+    )
+
+
+def rebuild_fts(conn: sqlite3.Connection, only: Optional[str] = None) -> int:
+    """Re-index every place from the ``places`` table.
+
+    Same text as :func:`insert_fts`, produced in SQL by the
+    ``normalize_arabic`` function registered on every connection.
+    ``only`` (an SQL subquery of place ids) re-indexes just those places;
+    ids no longer in ``places`` are dropped from the index.
+    """
+    conn.execute(f"DELETE FROM places_fts WHERE 1{_only_places(only)}")
+    conn.execute(f"DELETE FROM places_trigram WHERE 1{_only_places(only)}")
+    tags = f"(SELECT group_concat(value, ' ') FROM json_each({_json_list('p.tags')}))"
+    cur = conn.execute(
+        f"""INSERT INTO places_fts
+        (id, name_ar, name_en, description_ar, tags, category, neighborhood)
+        SELECT id, normalize_arabic(name_ar), normalize_arabic(name_en),
+               normalize_arabic(description_ar), normalize_arabic({tags}),
+               normalize_arabic(category), normalize_arabic(neighborhood)
+        FROM places p WHERE 1{_only_places(only)}"""
+    )
+    conn.execute(
+        f"""INSERT INTO places_trigram
+        (id, name_ar, name_en, description_ar, category, neighborhood)
+        SELECT id, name_ar, name_en, description_ar, category, neighborhood
+        FROM places_fts WHERE 1{_only_places(only)}"""
+    )
+    if only is None:
+        set_meta(conn, "fts_version", FTS_VERSION)
+    return cur.rowcount
+
+
+def fetch_places_by_ids(conn: sqlite3.Connection, ids: list[str]) -> list[dict]:
+    """Fetch places by id in one query, returned in the order of ``ids``."""
+    if not ids:
+        return []
+    placeholders = ",".join(["?"] * len(ids))
+    rows = conn.execute(
+        f"SELECT * FROM places WHERE id IN ({placeholders})", ids
+    ).fetchall()
+    by_id = {r["id"]: row_to_dict(r) for r in rows}
+    return [by_id[pid] for pid in ids if pid in by_id]
 
 
 def row_to_dict(row: sqlite3.Row) -> dict:
     """Convert a sqlite3.Row to a plain dict with JSON fields parsed."""
     d = dict(row)
+    d.pop("content_hash", None)
     for field in ("sources", "perfect_for", "audience", "tags"):
         if field in d and isinstance(d[field], str):
             try:
@@ -1,16 +1,223 @@
-"""Import places.json → SQLite + FTS5 — وين نروح بالرياض."""
+"""Import places.json → SQLite + FTS5 — وين نروح بالرياض.
+
+Streams the file: places are decoded one at a time from fixed-size
+chunks and written in ``executemany`` batches, so memory stays flat
+however large the file is.
+
+The catalog is built into a temp file next to the live one, checked,
+and renamed over it; running workers notice the new file and reload
+(see ``main._watch_catalog``). Readers never see a half-imported table.
+
+Two ways to fill the temp file:
+
+- **full** (first import, ``--full``, or an old catalog): load every
+  row, then build the secondary indexes, FTS / trigram, tags and R*Tree
+  in SQL in one pass each.
+- **incremental** (default): copy the live catalog and diff the JSON
+  against each row's ``content_hash``; only inserted / updated / deleted
+  places are written and re-indexed. The ids go into ``meta.changeset``
+  so workers can invalidate just those places. Nothing changed → no swap.
+"""
 
 from __future__ import annotations
 
+import codecs
+import hashlib
 import json
+import os
+import sqlite3
 import sys
 import time
 from pathlib import Path
+from typing import Iterator, Optional
+
+from database import (
+    catalog_path, create_secondary_indexes, delete_places, get_data_version, get_meta,
+    open_catalog, place_row, rebuild_fts, rebuild_spatial_index, rebuild_tags,
+    set_changeset, set_data_version, DATABASE_PATH, FTS_VERSION, INSERT_PLACE_SQL,
+    UPSERT_PLACE_SQL,
+)
+
+CHUNK_SIZE = 1 << 20  # bytes read per step
+BATCH_SIZE = 2000  # rows per executemany
+
+# Above this many changed places the changeset carries counts only
+# (workers then drop their whole place cache)
+CHANGESET_MAX_IDS = 5000
+
+# Bulk-load settings for the private temp file (fsynced before the swap)
+_IMPORT_PRAGMAS = (
+    "PRAGMA journal_mode=MEMORY",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-256000",  # 256 MB, for the index builds
+)
+
+# Ids touched by an incremental import, for the ``only=`` index rebuilds
+_CHANGED = "SELECT id FROM temp.import_changes"
+
+
+def iter_json_array(path: Path, digest=None, chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """Yield the elements of the top-level JSON array in ``path`` one by one.
+
+    ``digest`` (a hashlib object), if given, is fed every byte read.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+    buf, pos = "", 0
+    started = eof = False
+
+    with open(path, "rb") as f:
+        while True:
+            # skip whitespace and separators
+            while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ",")):
+                pos += 1
+            if pos < len(buf):
+                if not started:
+                    if buf[pos] != "[":
+                        raise ValueError("places.json لازم يكون مصفوفة JSON")
+                    started = True
+                    pos += 1
+                    continue
+                if buf[pos] == "]":
+                    return
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # a value ending exactly at the chunk edge may be cut short
+                    if end < len(buf) or eof:
+                        yield item
+                        pos = end
+                        continue
+            elif eof:
+                raise ValueError("places.json ناقص — المصفوفة ما انقفلت")
+
+            chunk = f.read(chunk_size)
+            if digest is not None:
+                digest.update(chunk)
+            eof = not chunk
+            buf = buf[pos:] + utf8.decode(chunk, final=eof)
+            pos = 0
+
+
+def _write_batch(conn: sqlite3.Connection, rows: list[tuple], sql: str = INSERT_PLACE_SQL) -> int:
+    """Insert ``rows``; on a failing batch, retry row by row. Returns errors."""
+    try:
+        conn.executemany(sql, rows)
+        return 0
+    except sqlite3.Error:
+        errors = 0
+        for row in rows:
+            try:
+                conn.execute(sql, row)
+            except sqlite3.Error as e:
+                errors += 1
+                if errors <= 5:
+                    print(f"  ⚠️ خطأ في: {row[0]} — {e}")
+        return errors
+
+
+def _rows(data_file: Path, digest, stats: dict) -> Iterator[tuple]:
+    """``place_row`` of every place in the file; bad entries are counted and skipped."""
+    for place in iter_json_array(data_file, digest):
+        try:
+            yield place_row(place)
+        except Exception as e:
+            stats["errors"] += 1
+            if stats["errors"] <= 5:
+                print(f"  ⚠️ خطأ في: {place.get('id', '?')} — {e}")
+
 
-from database import init_db, insert_place, insert_fts, DATABASE_PATH
+def _load_full(conn: sqlite3.Connection, data_file: Path, digest, stats: dict) -> None:
+    """Load every row into an empty catalog, then build all indexes."""
+    batch: list[tuple] = []
+    inserted = 0
+    for row in _rows(data_file, digest, stats):
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            stats["errors"] += _write_batch(conn, batch)
+            inserted += len(batch)
+            batch = []
+            if inserted % (BATCH_SIZE * 25) == 0:
+                print(f"  ⏳ {inserted} مكان")
+    if batch:
+        stats["errors"] += _write_batch(conn, batch)
+
+    print("  🔄 بناء الفهارس...")
+    create_secondary_indexes(conn)
+    rebuild_tags(conn)
+    rebuild_fts(conn)
+    rebuild_spatial_index(conn)
+
+
+def _apply_diff(conn: sqlite3.Connection, data_file: Path, digest, stats: dict) -> dict[str, list[str]]:
+    """Upsert new / changed rows of a copied catalog and drop vanished ones.
+
+    Returns the changed ids by kind (``inserted`` / ``updated`` / ``deleted``).
+    """
+    known = {r["id"]: r["content_hash"] for r in conn.execute("SELECT id, content_hash FROM places")}
+    seen: set[str] = set()
+    changed: dict[str, str] = {}  # id → inserted / updated / deleted
+    batch: list[tuple] = []
+
+    for row in _rows(data_file, digest, stats):
+        pid, content_hash = row[0], row[-1]
+        if pid in seen:  # repeated id: the last copy wins, as in a full import
+            changed.setdefault(pid, "updated")
+        else:
+            seen.add(pid)
+            previous = known.pop(pid, None)
+            if previous == content_hash:
+                continue
+            changed[pid] = "inserted" if previous is None else "updated"
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            stats["errors"] += _write_batch(conn, batch, UPSERT_PLACE_SQL)
+            batch = []
+    if batch:
+        stats["errors"] += _write_batch(conn, batch, UPSERT_PLACE_SQL)
+    changed.update((pid, "deleted") for pid in known)
 
+    conn.execute("CREATE TEMP TABLE import_changes (id TEXT PRIMARY KEY, kind TEXT NOT NULL)")
+    conn.executemany("INSERT INTO temp.import_changes (id, kind) VALUES (?, ?)", changed.items())
+    delete_places(conn, f"{_CHANGED} WHERE kind = 'deleted'")
+    rebuild_tags(conn, only=_CHANGED)
+    rebuild_fts(conn, only=_CHANGED)
+    rebuild_spatial_index(conn, only=_CHANGED)
 
-def main(json_path: str | None = None, db_path: str | None = None) -> int:
+    changes: dict[str, list[str]] = {"inserted": [], "updated": [], "deleted": []}
+    for pid, kind in changed.items():
+        changes[kind].append(pid)
+    return changes
+
+
+def _incremental_base(target: Path) -> Optional[str]:
+    """Data version of ``target`` if a diff can be applied to it, else None."""
+    if not target.exists():
+        return None
+    conn = sqlite3.connect(f"{target.resolve().as_uri()}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        columns = {r["name"] for r in conn.execute("PRAGMA table_info(places)")}
+        usable = (
+            "content_hash" in columns
+            and get_meta(conn, "fts_version") == FTS_VERSION
+            and conn.execute("SELECT 1 FROM places LIMIT 1").fetchone() is not None
+            and conn.execute(
+                "SELECT 1 FROM places WHERE content_hash IS NULL LIMIT 1"
+            ).fetchone() is None
+        )
+        return get_data_version(conn) if usable else None
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+
+def main(json_path: str | None = None, db_path: str | None = None, full: bool = False) -> int:
     """Import places from JSON into SQLite."""
     data_file = Path(json_path or "../data/places.json")
     if not data_file.exists():
@@ -18,56 +225,100 @@ def main(json_path: str | None = None, db_path: str | None = None) -> int:
         return 1
 
     print(f"📂 قراءة البيانات من: {data_file}")
-    with open(data_file, "r", encoding="utf-8") as f:
-        places = json.load(f)
-
-    print(f"📊 عدد الأماكن: {len(places)}")
 
-    # Initialize database
-    target_db = Path(db_path) if db_path else DATABASE_PATH
-    print(f"🗄️ إنشاء قاعدة البيانات: {target_db}")
-    conn = init_db(target_db)
+    target = catalog_path(Path(db_path) if db_path else DATABASE_PATH)
+    building = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    building.unlink(missing_ok=True)
+    base = None if full else _incremental_base(target)
+    if base is not None:
+        print(f"🔁 تحديث تدريجي على نسخة البيانات {base}")
+        source = sqlite3.connect(f"{target.resolve().as_uri()}?mode=ro", uri=True)
+        copy = sqlite3.connect(str(building))
+        source.backup(copy)
+        copy.close()
+        source.close()
+    else:
+        print(f"🗄️ بناء الكتالوج: {building}")
+    # a fresh build loads unindexed and indexes once at the end (_load_full)
+    conn = open_catalog(building, indexes=base is not None)
+    for pragma in _IMPORT_PRAGMAS:
+        conn.execute(pragma)
 
-    # Clear existing data for fresh import
-    conn.execute("DELETE FROM places_fts")
-    conn.execute("DELETE FROM places")
-    conn.commit()
-
-    # Insert places
     start = time.time()
-    batch_size = 500
-    inserted = 0
-    errors = 0
-
-    for i in range(0, len(places), batch_size):
-        batch = places[i : i + batch_size]
-        for place in batch:
-            try:
-                insert_place(conn, place)
-                insert_fts(conn, place)
-                inserted += 1
-            except Exception as e:
-                errors += 1
-                if errors <= 5:
-                    print(f"  ⚠️ خطأ في: {place.get('id', '?')} — {e}")
+    digest = hashlib.sha1()
+    stats = {"errors": 0}
 
+    try:
+        if base is None:
+            _load_full(conn, data_file, digest, stats)
+            set_changeset(conn, None)
+        else:
+            changes = _apply_diff(conn, data_file, digest, stats)
+            counts = {kind: len(ids) for kind, ids in changes.items()}
+            print(
+                f"   ➕ جديد: {counts['inserted']}  ✏️ متغير: {counts['updated']}"
+                f"  🗑️ محذوف: {counts['deleted']}"
+            )
+            if not any(counts.values()):
+                print("✅ ما فيه تغييرات — الكتالوج الحالي يبقى")
+                conn.close()
+                building.unlink(missing_ok=True)
+                return 0
+            changed = sum(counts.values())
+            set_changeset(conn, {
+                "base": base,
+                "counts": counts,
+                "ids": changes if changed <= CHANGESET_MAX_IDS else None,
+            })
+        data_version = digest.hexdigest()[:16]
+        set_data_version(conn, data_version)
         conn.commit()
-        pct = min(100, int((i + len(batch)) / len(places) * 100))
-        print(f"  ⏳ {pct}% ({inserted}/{len(places)})")
+        if base is None:
+            conn.execute("ANALYZE")
 
-    elapsed = time.time() - start
+        # Verify
+        count = conn.execute("SELECT COUNT(*) as cnt FROM places").fetchone()["cnt"]
+        fts_count = conn.execute("SELECT COUNT(*) as cnt FROM places_fts").fetchone()["cnt"]
+        trigram_count = conn.execute("SELECT COUNT(*) as cnt FROM places_trigram").fetchone()["cnt"]
+        spatial_count = conn.execute("SELECT COUNT(*) as cnt FROM places_rtree").fetchone()["cnt"]
+        tag_count = conn.execute("SELECT COUNT(*) as cnt FROM place_tags").fetchone()["cnt"]
+        problems = []
+        if count == 0:
+            problems.append("ما فيه ولا مكان")
+        if fts_count != count or trigram_count != count:
+            problems.append(f"فهرس البحث ناقص ({fts_count}/{trigram_count} من {count})")
+        if problems:
+            print(f"❌ الكتالوج الجديد فيه مشاكل — ما تم استبداله: {'، '.join(problems)}")
+            conn.close()
+            building.unlink(missing_ok=True)
+            return 1
 
-    # Verify
-    count = conn.execute("SELECT COUNT(*) as cnt FROM places").fetchone()["cnt"]
-    fts_count = conn.execute("SELECT COUNT(*) as cnt FROM places_fts").fetchone()["cnt"]
+        elapsed = time.time() - start
+        print(f"\n✅ تم الاستيراد بنجاح!")
+        print(f"   📍 الأماكن: {count}")
+        print(f"   🔍 FTS index: {fts_count}")
+        print(f"   🗺️ R*Tree: {spatial_count}")
+        print(f"   🔖 الوسوم: {tag_count}")
+        print(f"   ❌ أخطاء: {stats['errors']}")
+        print(f"   🏷️ نسخة البيانات: {data_version}")
+        print(f"   ⏱️ الوقت: {elapsed:.1f}s")
+        _print_stats(conn)
+        conn.close()
 
-    print(f"\n✅ تم الاستيراد بنجاح!")
-    print(f"   📍 الأماكن: {count}")
-    print(f"   🔍 FTS index: {fts_count}")
-    print(f"   ❌ أخطاء: {errors}")
-    print(f"   ⏱️ الوقت: {elapsed:.1f}s")
+        # synchronous=OFF skipped every fsync; flush once before the swap
+        with open(building, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(building, target)
+    except BaseException:
+        conn.close()
+        building.unlink(missing_ok=True)
+        raise
 
-    # Quick stats
+    print(f"\n🔁 الكتالوج الجديد مكان القديم: {target}")
+    return 0
+
+
+def _print_stats(conn: sqlite3.Connection) -> None:
     categories = conn.execute(
         "SELECT category, COUNT(*) as cnt FROM places GROUP BY category ORDER BY cnt DESC LIMIT 10"
     ).fetchall()
@@ -80,11 +331,10 @@ def main(json_path: str | None = None, db_path: str | None = None) -> int:
     ).fetchone()
     print(f"\n🏘️ عدد الأحياء: {neighborhoods['cnt']}")
 
-    conn.close()
-    return 0
-
 
 if __name__ == "__main__":
-    json_path = sys.argv[1] if len(sys.argv) > 1 else None
-    db_path = sys.argv[2] if len(sys.argv) > 2 else None
-    sys.exit(main(json_path, db_path))
+    full = "--full" in sys.argv[1:]
+    args = [a for a in sys.argv[1:] if a != "--full"]
+    json_path = args[0] if len(args) > 0 else None
+    db_path = args[1] if len(args) > 1 else None
+    sys.exit(main(json_path, db_path, full=full))
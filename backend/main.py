@@ -5,9 +5,11 @@ Main application with CORS, Gzip, rate limiting, and lifespan management.
 
 from __future__ import annotations
 
+import asyncio
 import os
 from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Optional
 
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
@@ -17,13 +19,21 @@ from fastapi.responses import JSONResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder
+from starlette.types import Message, Receive, Scope, Send
 
 load_dotenv()
 
 # ── Config ──────────────────────────────────────────────────────────
 
 DATABASE_PATH = os.getenv("DATABASE_PATH", "./places.db")
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
 DATA_JSON_PATH = os.getenv("DATA_JSON_PATH", "../data/places.json")
+CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", "5"))
+NEIGHBORHOODS_JSON_PATH = os.getenv(
+    "NEIGHBORHOODS_JSON_PATH", "../data/all-riyadh-neighborhoods.json"
+)
 CORS_ORIGINS = os.getenv(
     "CORS_ORIGINS",
     "http://localhost:3000,http://localhost:5173,https://wain-nrooh.com",
@@ -40,16 +50,82 @@ limiter = Limiter(key_func=get_remote_address, default_limits=[RATE_LIMIT])
 # ── Lifespan ────────────────────────────────────────────────────────
 
 
+def _build_indexes(conn) -> None:
+    """(Re)build every in-memory index and view over the place catalog."""
+    from cache import precompute_views
+    from services.ai_chat import build_intent_matcher
+    from services.facets import build_facet_index
+    from services.fuzzy import build_fuzzy_index
+    from services.occasions import build_occasion_index
+    from services.ranking import build_ranking_index
+    from services.suggest import build_suggest_index
+
+    precompute_views(conn)
+    build_facet_index(conn)
+    build_ranking_index(conn)
+    build_fuzzy_index(conn)
+    build_suggest_index(conn)
+    build_occasion_index(conn)
+    build_intent_matcher(NEIGHBORHOODS_JSON_PATH, conn)
+
+
+def _reload_catalog() -> Optional[tuple[int, int]]:
+    """Switch this worker to a catalog file swapped in by import_data.py.
+
+    Returns the new file's stamp, to be marked loaded once the caller is
+    done too (the async pool).
+    """
+    from cache import clear_caches
+    from database import get_changeset, get_data_version, read_connection, reload_catalog
+
+    with read_connection() as conn:
+        previous = get_data_version(conn)
+    stamp = reload_catalog()
+    with read_connection() as conn:
+        _build_indexes(conn)
+        version = get_data_version(conn)
+        changeset = get_changeset(conn)
+
+    # An incremental import on top of what we had: evict just its places
+    changed = None
+    if changeset and changeset["base"] == previous and changeset["ids"] is not None:
+        changed = [pid for ids in changeset["ids"].values() for pid in ids]
+    clear_caches(changed)
+    detail = f" ({len(changed)} مكان متغير)" if changed is not None else ""
+    print(f"🔁 تم تحميل نسخة بيانات جديدة: {version}{detail}")
+    return stamp
+
+
+async def _watch_catalog() -> None:
+    from database import catalog_changed, mark_catalog_loaded, open_async_pool
+    from starlette.concurrency import run_in_threadpool
+
+    while True:
+        await asyncio.sleep(CATALOG_POLL_SECONDS)
+        if not catalog_changed():
+            continue
+        try:
+            stamp = await run_in_threadpool(_reload_catalog)
+            await open_async_pool()
+        except Exception as e:
+            # stamp not recorded: the next poll tries again
+            print(f"⚠️ فشل تحميل الكتالوج الجديد: {e}")
+        else:
+            mark_catalog_loaded(stamp)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup: load data → SQLite, pre-compute caches."""
-    from database import init_db, get_connection
-    from cache import precompute_views
+    from database import (
+        init_db, close_db, open_async_pool, close_async_pool,
+        get_meta, rebuild_fts, FTS_VERSION,
+    )
 
     db_path = Path(DATABASE_PATH)
 
     # Initialize DB (creates tables if needed)
-    conn = init_db(db_path)
+    conn = init_db(db_path, pool_size=DB_READ_POOL_SIZE)
 
     # Check if data needs importing
     count = conn.execute("SELECT COUNT(*) as cnt FROM places").fetchone()["cnt"]
@@ -58,20 +134,55 @@ async def lifespan(app: FastAPI):
         from import_data import main as import_main
         import_main(DATA_JSON_PATH, DATABASE_PATH)
         # Reconnect after import
-        conn = init_db(db_path)
+        conn = init_db(db_path, pool_size=DB_READ_POOL_SIZE)
 
     count = conn.execute("SELECT COUNT(*) as cnt FROM places").fetchone()["cnt"]
     print(f"✅ قاعدة البيانات جاهزة: {count} مكان")
 
+    # Databases imported before the spatial index / tag table / normalized FTS existed
+    if count and not conn.execute("SELECT 1 FROM places_rtree LIMIT 1").fetchone():
+        from database import rebuild_spatial_index
+        rebuild_spatial_index(conn)
+        conn.commit()
+    if count and not conn.execute("SELECT 1 FROM place_tags LIMIT 1").fetchone():
+        from database import rebuild_tags
+        rebuild_tags(conn)
+        conn.commit()
+    if count and get_meta(conn, "fts_version") != FTS_VERSION:
+        print("🔄 إعادة بناء فهرس البحث...")
+        rebuild_fts(conn)
+        conn.commit()
+
     # Pre-compute caches
     print("🔄 حساب الكاش...")
-    precompute_views(conn)
+    _build_indexes(conn)
     print("✅ الكاش جاهز!")
 
+    # Offline-sync op ids / clocks past retention
+    from services.sync import prune_sync_history
+    pruned = prune_sync_history(conn)
+    conn.commit()
+    if pruned:
+        print(f"🧹 حذف {pruned} سجل مزامنة قديم")
+
+    # Async read pool for `async def` routes
+    await open_async_pool()
+
+    # Favorites / lists writes are batched by a background writer
+    from write_queue import get_write_queue
+    get_write_queue().start()
+
+    # Pick up catalogs rebuilt by import_data.py without a restart
+    watcher = asyncio.create_task(_watch_catalog()) if CATALOG_POLL_SECONDS > 0 else None
+
     yield  # App is running
 
     # Shutdown
-    conn.close()
+    if watcher is not None:
+        watcher.cancel()
+    get_write_queue().stop()
+    await close_async_pool()
+    close_db()
     print("👋 تم إيقاف السيرفر")
 
 
@@ -99,8 +210,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Gzip
-app.add_middleware(GZipMiddleware, minimum_size=500)
+# Gzip — except streams, which must reach the client event by event
+class _StreamAwareGZipResponder(GZipResponder):
+    passthrough = False
+
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            self.passthrough = content_type.startswith("text/event-stream")
+        if self.passthrough:
+            await self.send(message)
+        else:
+            await super().send_with_gzip(message)
+
+
+class StreamAwareGZipMiddleware(GZipMiddleware):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = _StreamAwareGZipResponder(
+                self.app, self.minimum_size, compresslevel=self.compresslevel
+            )
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(StreamAwareGZipMiddleware, minimum_size=500)
 
 
 # ── Routers ─────────────────────────────────────────────────────────
@@ -112,6 +247,7 @@ from routers.trending import router as trending_router
 from routers.favorites import router as favorites_router
 from routers.lists import router as lists_router
 from routers.ai import router as ai_router
+from routers.sync import router as sync_router
 
 app.include_router(places_router)
 app.include_router(neighborhoods_router)
@@ -120,21 +256,30 @@ app.include_router(trending_router)
 app.include_router(favorites_router)
 app.include_router(lists_router)
 app.include_router(ai_router)
+app.include_router(sync_router)
 
 
 # ── Health ──────────────────────────────────────────────────────────
 
 
 @app.get("/health")
-def health_check():
-    from database import get_connection
-    conn = get_connection()
-    count = conn.execute("SELECT COUNT(*) as cnt FROM places").fetchone()["cnt"]
+async def health_check():
+    from database import async_read_connection
+    from cache import cache_stats
+    from write_queue import get_write_queue
+    async with async_read_connection() as conn:
+        async with conn.execute("SELECT COUNT(*) as cnt FROM places") as cur:
+            count = (await cur.fetchone())["cnt"]
+        async with conn.execute("SELECT value FROM meta WHERE key = 'data_version'") as cur:
+            row = await cur.fetchone()
     return {
         "status": "ok",
         "version": "1.0.0",
         "places_count": count,
+        "data_version": row["value"] if row else None,
         "database": "connected",
+        "caches": cache_stats(),
+        "write_queue": get_write_queue().stats(),
     }
 
 
@@ -2,11 +2,13 @@
 
 from __future__ import annotations
 
-from typing import Optional
+from typing import Any, Optional
 
 from pydantic import BaseModel, Field, field_validator
 import re
 
+from services.ranking import PROFILE_PATTERN
+
 
 # ── Input Sanitization ──────────────────────────────────────────────
 
@@ -32,6 +34,7 @@ class PlaceSummary(BaseModel):
     neighborhood: str
     neighborhood_en: str
     google_rating: Optional[float] = None
+    review_count: Optional[int] = None
     price_level: Optional[str] = None
     trending: bool = False
     is_new: bool = False
@@ -54,10 +57,57 @@ class Place(PlaceSummary):
 
 class PlaceList(BaseModel):
     places: list[PlaceSummary]
-    total: int
+    total: Optional[int] = None
     page: int
     limit: int
     has_next: bool
+    next_cursor: Optional[str] = None
+
+
+class PlaceBatchRequest(BaseModel):
+    ids: list[str] = Field(..., min_length=1, max_length=300)
+
+
+class PlaceBatchResponse(BaseModel):
+    # Place objects, limited to the requested ``fields`` projection
+    places: list[dict[str, Any]]
+    missing: list[str] = Field(default_factory=list)
+
+
+class NearbyPlace(PlaceSummary):
+    distance_km: float
+
+
+class NearbyPlaceList(BaseModel):
+    places: list[NearbyPlace]
+    total: int
+    radius_km: float
+
+
+class Suggestion(BaseModel):
+    type: str  # place | neighborhood | category
+    id: Optional[str] = None
+    name_ar: str
+    name_en: Optional[str] = None
+
+
+class SuggestResponse(BaseModel):
+    query: str
+    suggestions: list[Suggestion]
+
+
+class FacetedPlaceList(PlaceList):
+    facets: dict[str, dict[str, int]] = Field(default_factory=dict)
+
+
+class SearchPlace(PlaceSummary):
+    # HTML-escaped text with matched terms wrapped in <mark>…</mark>
+    highlights: dict[str, str] = Field(default_factory=dict)
+    snippet: Optional[str] = None
+
+
+class SearchPlaceList(PlaceList):
+    places: list[SearchPlace]
 
 
 # ── Neighborhood ────────────────────────────────────────────────────
@@ -131,6 +181,53 @@ class ShareableListResponse(BaseModel):
     created_at: str
 
 
+# ── Offline Sync ────────────────────────────────────────────────────
+
+
+SYNC_OP_TYPES = (
+    "favorite_add", "favorite_remove",
+    "list_create", "list_rename", "list_delete",
+    "list_add_place", "list_remove_place",
+)
+
+
+class SyncOp(BaseModel):
+    op_id: str = Field(..., min_length=1, max_length=64)
+    type: str = Field(..., pattern=r"^(" + "|".join(SYNC_OP_TYPES) + r")$")
+    client_ts: int = Field(..., ge=0)  # ms since epoch, on the device clock
+    place_id: Optional[str] = Field(None, max_length=128)
+    list_id: Optional[str] = Field(None, max_length=64)
+    name: Optional[str] = Field(None, min_length=1, max_length=200)
+    place_ids: list[str] = Field(default_factory=list, max_length=50)
+
+    @field_validator("name", mode="before")
+    @classmethod
+    def sanitize_name(cls, v: Optional[str]) -> Optional[str]:
+        return _sanitize(v) if v else v
+
+
+class SyncRequest(BaseModel):
+    device_id: str = Field(..., min_length=1, max_length=128)
+    ops: list[SyncOp] = Field(default_factory=list, max_length=500)
+
+
+class SyncedList(BaseModel):
+    id: str
+    name: str
+    share_code: str
+    place_ids: list[str]
+
+
+class SyncResponse(BaseModel):
+    device_id: str
+    favorites: list[str]  # place ids, newest first
+    lists: list[SyncedList]
+    applied: int
+    duplicates: int
+    stale: int  # lost to a newer write
+    rejected: list[str] = Field(default_factory=list)  # op ids
+
+
 # ── AI Chat ─────────────────────────────────────────────────────────
 
 
@@ -154,6 +251,8 @@ class ChatRequest(BaseModel):
     history: list[ChatMessage] = Field(default_factory=list, max_length=20)
     device_id: str = Field(..., min_length=1, max_length=128)
     location: Optional[LocationInfo] = None
+    # Ranking weights for located results: balanced | nearby | top_rated | trending | new
+    profile: Optional[str] = Field(None, pattern=PROFILE_PATTERN)
 
     @field_validator("message", mode="before")
     @classmethod
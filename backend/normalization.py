@@ -0,0 +1,38 @@
+"""Arabic text normalization shared by indexing and search — وين نروح بالرياض."""
+
+from __future__ import annotations
+
+import re
+
+# ── Arabic Normalization ────────────────────────────────────────────
+
+# Tashkeel (diacritics)
+_TASHKEEL_RANGES = (
+    (0x0610, 0x061A), (0x064B, 0x065F), (0x0670, 0x0670), (0x06D6, 0x06DC),
+    (0x06DF, 0x06E4), (0x06E7, 0x06E8), (0x06EA, 0x06ED),
+)
+
+# One translate table for every per-character rule
+_CHAR_MAP = str.maketrans({
+    # Hamza normalization: إأآا → ا
+    "\u0622": "\u0627",  # آ → ا
+    "\u0623": "\u0627",  # أ → ا
+    "\u0625": "\u0627",  # إ → ا
+    "\u0671": "\u0627",  # ٱ → ا
+    # Final ة → ه  (optional, helps matching)
+    "\u0629": "\u0647",
+    # Tatweel (kashida)
+    "\u0640": None,
+    **{chr(c): None for lo, hi in _TASHKEEL_RANGES for c in range(lo, hi + 1)},
+})
+
+# Remove extra whitespace
+_MULTI_SPACE = re.compile(r"\s+")
+
+
+def normalize_arabic(text: str) -> str:
+    """Normalize Arabic text for search matching."""
+    if not text:
+        return ""
+    text = text.translate(_CHAR_MAP)
+    return _MULTI_SPACE.sub(" ", text).strip()
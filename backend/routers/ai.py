@@ -2,14 +2,27 @@
 
 from __future__ import annotations
 
+import json
+from typing import AsyncIterator, Optional
+
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from starlette.concurrency import run_in_threadpool
 
-from database import get_connection
-from models import ChatRequest, ChatResponse
-from services.ai_chat import process_chat
+from database import async_read_connection, read_connection
+from models import ChatRequest, ChatResponse, PlaceSummary
+from services.ai_chat import (
+    analyze_message, empty_response, fetch_places_async, greeting_response, plan_turn,
+    process_chat, query_places_async, results_response, search_response,
+)
+from services.conversation import forget_context
+from services.ranking import profile_weights
 
 router = APIRouter(prefix="/api/v1/ai", tags=["ai"])
 
+_places_adapter = TypeAdapter(list[PlaceSummary])
+
 
 @router.post("/chat", response_model=ChatResponse)
 def chat(payload: ChatRequest):
@@ -18,19 +31,122 @@ def chat(payload: ChatRequest):
     Currently rule-based with Saudi dialect responses.
     Ready for OpenAI API integration.
     """
-    conn = get_connection()
-
     user_lat = payload.location.lat if payload.location else None
     user_lng = payload.location.lng if payload.location else None
 
     history = [{"role": m.role, "content": m.content} for m in payload.history]
 
-    result = process_chat(
-        conn=conn,
-        message=payload.message,
-        history=history,
-        user_lat=user_lat,
-        user_lng=user_lng,
-    )
+    with read_connection() as conn:
+        result = process_chat(
+            conn=conn,
+            message=payload.message,
+            history=history,
+            user_lat=user_lat,
+            user_lng=user_lng,
+            session_id=payload.device_id,
+            weights=profile_weights(payload.profile),
+        )
 
     return result
+
+
+@router.post("/chat/stream")
+async def chat_stream(payload: ChatRequest):
+    """Same chat as ``/chat``, streamed as server-sent events.
+
+    Events, in order: ``intent`` (filters with keyword spans, and which
+    ones were ``carried`` from the previous turn),
+    ``places`` once per query stage that found something (``structured``,
+    then the ``search`` fallback), ``reply`` (text + suggestions), ``done``.
+    If the turn fails part-way, an ``error`` event (``detail``) ends the
+    stream instead of ``reply``/``done``.
+    """
+    user_lat = payload.location.lat if payload.location else None
+    user_lng = payload.location.lng if payload.location else None
+    history = [{"role": m.role, "content": m.content} for m in payload.history]
+    return StreamingResponse(
+        _chat_events(
+            payload.message, history, payload.device_id, user_lat, user_lng,
+            profile_weights(payload.profile),
+        ),
+        media_type="text/event-stream",
+        # no proxy buffering (nginx), no caching; gzip skips event streams
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _chat_events(
+    message: str,
+    history: list[dict],
+    session_id: str,
+    user_lat: Optional[float],
+    user_lng: Optional[float],
+    weights: Optional[dict[str, float]] = None,
+) -> AsyncIterator[str]:
+    """SSE frames of one turn; a failure becomes a final ``error`` frame.
+
+    The response status has already gone out with the first frame, so an
+    exception can't become an HTTP error any more — without this the
+    client would just see the connection drop mid-stream.
+    """
+    try:
+        async for frame in _chat_turn(message, history, session_id, user_lat, user_lng, weights):
+            yield frame
+    except Exception as e:
+        print(f"⚠️ فشل بث المحادثة: {e!r}")
+        yield _sse("error", {"detail": "صار خطأ وحنا نجهز الرد، جرّب مرة ثانية"})
+
+
+async def _chat_turn(
+    message: str,
+    history: list[dict],
+    session_id: str,
+    user_lat: Optional[float],
+    user_lng: Optional[float],
+    weights: Optional[dict[str, float]] = None,
+) -> AsyncIterator[str]:
+    intent = analyze_message(message)
+    ids = None
+    if intent["greeting"]:
+        forget_context(session_id)
+    else:
+        ids = plan_turn(intent, session_id, history, user_lat, user_lng, weights)
+    yield _sse("intent", intent)
+
+    if intent["greeting"]:
+        result = greeting_response()
+    else:
+        async with async_read_connection() as conn:
+            if ids is None:
+                places = await query_places_async(conn, intent, user_lat, user_lng, weights)
+            else:
+                places = await fetch_places_async(conn, ids)
+        if places:
+            result = results_response(places, intent)
+            yield _sse("places", {"stage": "structured", "places": _dump(result["places"])})
+        else:
+            search_results, total = await run_in_threadpool(_search, message)
+            if search_results:
+                result = search_response(search_results, total)
+                yield _sse("places", {
+                    "stage": "search", "total": total, "places": _dump(search_results),
+                })
+            else:
+                result = empty_response()
+
+    yield _sse("reply", {"reply": result["reply"], "suggestions": result["suggestions"]})
+    yield _sse("done", {})
+
+
+def _search(message: str) -> tuple[list[dict], int]:
+    from services.search import search_places
+    with read_connection() as conn:
+        return search_places(conn, message, limit=5)
+
+
+def _dump(places: list[dict]) -> list[dict]:
+    return _places_adapter.dump_python(_places_adapter.validate_python(places), mode="json")
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
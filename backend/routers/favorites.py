@@ -4,8 +4,9 @@ from __future__ import annotations
 
 from fastapi import APIRouter, HTTPException
 
-from database import get_connection, row_to_dict
+from database import read_connection, row_to_dict
 from models import FavoriteAction, FavoriteList
+from write_queue import Write, WriteFailed, get_write_queue
 
 router = APIRouter(prefix="/api/v1/favorites", tags=["favorites"])
 
@@ -13,21 +14,16 @@ router = APIRouter(prefix="/api/v1/favorites", tags=["favorites"])
 @router.post("", status_code=201)
 def add_favorite(action: FavoriteAction):
     """Add a place to favorites."""
-    conn = get_connection()
-
     # Verify place exists
-    place = conn.execute("SELECT id FROM places WHERE id = ?", (action.place_id,)).fetchone()
+    with read_connection() as conn:
+        place = conn.execute("SELECT id FROM places WHERE id = ?", (action.place_id,)).fetchone()
     if not place:
         raise HTTPException(status_code=404, detail="المكان مو موجود")
 
-    try:
-        conn.execute(
-            "INSERT OR IGNORE INTO favorites (device_id, place_id) VALUES (?, ?)",
-            (action.device_id, action.place_id),
-        )
-        conn.commit()
-    except Exception:
-        raise HTTPException(status_code=500, detail="خطأ في حفظ المفضلة")
+    _commit(action.device_id, Write(
+        "INSERT OR IGNORE INTO favorites (device_id, place_id) VALUES (?, ?)",
+        (action.device_id, action.place_id),
+    ))
 
     return {"status": "ok", "message": "تمت الإضافة للمفضلة ⭐"}
 
@@ -35,26 +31,26 @@ def add_favorite(action: FavoriteAction):
 @router.delete("")
 def remove_favorite(action: FavoriteAction):
     """Remove a place from favorites."""
-    conn = get_connection()
-    conn.execute(
+    _commit(action.device_id, Write(
         "DELETE FROM favorites WHERE device_id = ? AND place_id = ?",
         (action.device_id, action.place_id),
-    )
-    conn.commit()
+    ))
     return {"status": "ok", "message": "تم الحذف من المفضلة"}
 
 
 @router.get("/{device_id}", response_model=FavoriteList)
 def get_favorites(device_id: str):
     """Get all favorites for a device."""
-    conn = get_connection()
-    rows = conn.execute(
-        """SELECT p.* FROM places p
-        INNER JOIN favorites f ON p.id = f.place_id
-        WHERE f.device_id = ?
-        ORDER BY f.created_at DESC""",
-        (device_id,),
-    ).fetchall()
+    if not get_write_queue().wait_for_device(device_id):
+        raise HTTPException(status_code=503, detail="التغييرات الأخيرة لسا ما انحفظت، جرّب بعد شوي")
+    with read_connection() as conn:
+        rows = conn.execute(
+            """SELECT p.* FROM places p
+            INNER JOIN favorites f ON p.id = f.place_id
+            WHERE f.device_id = ?
+            ORDER BY f.created_at DESC""",
+            (device_id,),
+        ).fetchall()
 
     places = [row_to_dict(r) for r in rows]
     return {
@@ -62,3 +58,10 @@ def get_favorites(device_id: str):
         "favorites": places,
         "total": len(places),
     }
+
+
+def _commit(device_id: str, *writes: Write) -> None:
+    try:
+        get_write_queue().commit(device_id, *writes)
+    except WriteFailed:
+        raise HTTPException(status_code=503, detail="ما قدرنا نحفظ التغيير، جرّب مرة ثانية")
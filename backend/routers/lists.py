@@ -4,11 +4,14 @@ from __future__ import annotations
 
 import secrets
 import uuid
+from datetime import datetime, timezone
 
 from fastapi import APIRouter, HTTPException
 
-from database import get_connection, row_to_dict
+from cache import cached_places, place_cache
+from database import read_connection, row_to_dict
 from models import ShareableListCreate, ShareableListResponse
+from write_queue import Write, WriteFailed, get_write_queue
 
 router = APIRouter(prefix="/api/v1/lists", tags=["lists"])
 
@@ -16,15 +19,10 @@ router = APIRouter(prefix="/api/v1/lists", tags=["lists"])
 @router.post("", response_model=ShareableListResponse, status_code=201)
 def create_list(payload: ShareableListCreate):
     """Create a shareable list of places."""
-    conn = get_connection()
-
-    # Verify all places exist
-    placeholders = ",".join(["?"] * len(payload.place_ids))
-    existing = conn.execute(
-        f"SELECT id FROM places WHERE id IN ({placeholders})", payload.place_ids
-    ).fetchall()
-    existing_ids = {r["id"] for r in existing}
-    missing = set(payload.place_ids) - existing_ids
+    # Verify all places exist (and keep them for the response)
+    with read_connection() as conn:
+        found = cached_places(conn, payload.place_ids)
+    missing = set(payload.place_ids) - found.keys()
     if missing:
         raise HTTPException(
             status_code=400,
@@ -33,68 +31,99 @@ def create_list(payload: ShareableListCreate):
 
     list_id = str(uuid.uuid4())
     share_code = secrets.token_urlsafe(8)
-
-    conn.execute(
-        "INSERT INTO lists (id, name, device_id, share_code) VALUES (?, ?, ?, ?)",
-        (list_id, payload.name, payload.device_id, share_code),
-    )
-
-    for i, pid in enumerate(payload.place_ids):
-        conn.execute(
-            "INSERT INTO list_places (list_id, place_id, position) VALUES (?, ?, ?)",
-            (list_id, pid, i),
+    created_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    try:
+        get_write_queue().commit(
+            payload.device_id,
+            Write(
+                """INSERT INTO lists (id, name, device_id, share_code, created_at)
+                VALUES (?, ?, ?, ?, ?)""",
+                (list_id, payload.name, payload.device_id, share_code, created_at),
+            ),
+            Write(
+                "INSERT OR IGNORE INTO list_places (list_id, place_id, position) VALUES (?, ?, ?)",
+                [(list_id, pid, i) for i, pid in enumerate(payload.place_ids)],
+                many=True,
+            ),
         )
+    except WriteFailed:
+        raise HTTPException(status_code=503, detail="ما قدرنا ننشئ القائمة، جرّب مرة ثانية")
 
-    conn.commit()
-
-    # Fetch the created list with places
-    return _get_list_response(conn, list_id)
+    # Committed by now; the response is built from the request
+    return {
+        "id": list_id,
+        "name": payload.name,
+        "device_id": payload.device_id,
+        "places": [found[pid] for pid in dict.fromkeys(payload.place_ids)],
+        "share_code": share_code,
+        "created_at": created_at,
+    }
 
 
 @router.get("/share/{share_code}", response_model=ShareableListResponse)
 def get_list_by_share_code(share_code: str):
     """Get a list by its share code."""
-    conn = get_connection()
-    list_row = conn.execute(
-        "SELECT * FROM lists WHERE share_code = ?", (share_code,)
-    ).fetchone()
-
-    if not list_row:
+    # the code doesn't name its device, so wait out everything queued
+    if not get_write_queue().wait_for_all():
+        raise HTTPException(status_code=503, detail="التغييرات الأخيرة لسا ما انحفظت، جرّب بعد شوي")
+    with read_connection() as conn:
+        lists = _lists_with_places(conn, "l.share_code = ?", (share_code,))
+    if not lists:
         raise HTTPException(status_code=404, detail="القائمة مو موجودة")
-
-    return _get_list_response(conn, list_row["id"])
+    return lists[0]
 
 
 @router.get("/{device_id}", response_model=list[ShareableListResponse])
 def get_device_lists(device_id: str):
     """Get all lists for a device."""
-    conn = get_connection()
-    list_rows = conn.execute(
-        "SELECT * FROM lists WHERE device_id = ? ORDER BY created_at DESC",
-        (device_id,),
+    if not get_write_queue().wait_for_device(device_id):
+        raise HTTPException(status_code=503, detail="التغييرات الأخيرة لسا ما انحفظت، جرّب بعد شوي")
+    with read_connection() as conn:
+        return _lists_with_places(conn, "l.device_id = ?", (device_id,))
+
+
+def _lists_with_places(conn, where: str, params: tuple) -> list[dict]:
+    """Lists matching ``where`` with their places, from one joined query.
+
+    Rows come back one per (list, place) and are grouped here. A place is
+    decoded once and the same dict is shared by every list holding it
+    (and, through ``place_cache``, by later requests).
+    """
+    rows = conn.execute(
+        f"""SELECT l.id AS list_id, l.name AS list_name, l.device_id AS list_device_id,
+               l.share_code AS list_share_code, l.created_at AS list_created_at,
+               p.*
+        FROM lists l
+        LEFT JOIN list_places lp ON lp.list_id = l.id
+        LEFT JOIN places p ON p.id = lp.place_id
+        WHERE {where}
+        ORDER BY l.created_at DESC, l.id, lp.position""",
+        params,
     ).fetchall()
 
-    return [_get_list_response(conn, r["id"]) for r in list_rows]
-
-
-def _get_list_response(conn, list_id: str) -> dict:
-    list_row = conn.execute("SELECT * FROM lists WHERE id = ?", (list_id,)).fetchone()
-    if not list_row:
-        raise HTTPException(status_code=404, detail="القائمة مو موجودة")
-
-    place_rows = conn.execute(
-        """SELECT p.* FROM places p
-        INNER JOIN list_places lp ON p.id = lp.place_id
-        WHERE lp.list_id = ?
-        ORDER BY lp.position""",
-        (list_id,),
-    ).fetchall()
-
-    return {
-        "id": list_row["id"],
-        "name": list_row["name"],
-        "device_id": list_row["device_id"],
-        "places": [row_to_dict(r) for r in place_rows],
-        "share_code": list_row["share_code"],
-        "created_at": str(list_row["created_at"]),
-    }
+    lists: dict[str, dict] = {}
+    decoded: dict[str, dict] = {}
+    for row in rows:
+        entry = lists.get(row["list_id"])
+        if entry is None:
+            entry = lists[row["list_id"]] = {
+                "id": row["list_id"],
+                "name": row["list_name"],
+                "device_id": row["list_device_id"],
+                "places": [],
+                "share_code": row["list_share_code"],
+                "created_at": str(row["list_created_at"]),
+            }
+        pid = row["id"]
+        if pid is None:  # empty list, or a place that no longer exists
+            continue
+        place = decoded.get(pid)
+        if place is None:
+            place = place_cache.get(pid)
+            if place is None:
+                place = row_to_dict({k: row[k] for k in row.keys() if not k.startswith("list_")})
+                place_cache.set(pid, place)
+            decoded[pid] = place
+        entry["places"].append(place)
+    return list(lists.values())
@@ -2,25 +2,21 @@
 
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException, Response, Request
+from fastapi import APIRouter, HTTPException, Request
 
-from database import get_connection, row_to_dict
-from cache import neighborhood_cache, get_precomputed, compute_etag
+from database import read_connection, row_to_dict
+from cache import neighborhood_cache, get_precomputed, encode_response, encoded_response
 from models import NeighborhoodInfo, NeighborhoodTopPlaces, PlaceSummary
 
 router = APIRouter(prefix="/api/v1/neighborhoods", tags=["neighborhoods"])
 
 
 @router.get("", response_model=list[NeighborhoodInfo])
-def list_neighborhoods(request: Request, response: Response):
+def list_neighborhoods(request: Request):
     """List all neighborhoods with place counts."""
     cached = neighborhood_cache.get("all_neighborhoods")
-    if cached:
-        etag = compute_etag(cached)
-        if request.headers.get("if-none-match") == etag:
-            return Response(status_code=304)
-        response.headers["ETag"] = etag
-        return cached
+    if cached is not None:
+        return encoded_response(request, cached)
 
     precomputed = get_precomputed("neighborhoods")
     if precomputed:
@@ -28,55 +24,54 @@ def list_neighborhoods(request: Request, response: Response):
             {"name": n["neighborhood"], "name_en": n["neighborhood_en"], "place_count": n["cnt"]}
             for n in precomputed
         ]
-        neighborhood_cache.set("all_neighborhoods", result)
-        etag = compute_etag(result)
-        response.headers["ETag"] = etag
-        return result
+        entry = encode_response(list[NeighborhoodInfo], result)
+        neighborhood_cache.set("all_neighborhoods", entry)
+        return encoded_response(request, entry)
 
-    conn = get_connection()
-    rows = conn.execute(
-        """SELECT neighborhood as name, neighborhood_en as name_en, COUNT(*) as place_count
-        FROM places WHERE neighborhood != ''
-        GROUP BY neighborhood
-        ORDER BY place_count DESC"""
-    ).fetchall()
+    with read_connection() as conn:
+        rows = conn.execute(
+            """SELECT neighborhood as name, neighborhood_en as name_en, COUNT(*) as place_count
+            FROM places WHERE neighborhood != ''
+            GROUP BY neighborhood
+            ORDER BY place_count DESC"""
+        ).fetchall()
 
     result = [dict(r) for r in rows]
-    neighborhood_cache.set("all_neighborhoods", result)
-    return result
+    entry = encode_response(list[NeighborhoodInfo], result)
+    neighborhood_cache.set("all_neighborhoods", entry)
+    return encoded_response(request, entry)
 
 
 @router.get("/{name}/top", response_model=NeighborhoodTopPlaces)
-def top_places_in_neighborhood(name: str):
+def top_places_in_neighborhood(name: str, request: Request):
     """Top 10 places in a neighborhood."""
     cache_key = f"top:{name}"
     cached = neighborhood_cache.get(cache_key)
-    if cached:
-        return cached
+    if cached is not None:
+        return encoded_response(request, cached)
 
     # Check precomputed
-    top_by_hood = get_precomputed("top_by_neighborhood") or {}
-    if name in top_by_hood:
-        hood_en = ""
-        if top_by_hood[name]:
-            hood_en = top_by_hood[name][0].get("neighborhood_en", "")
+    top = get_precomputed(f"top_by_neighborhood:{name}")
+    if top is not None:
+        hood_en = top[0].get("neighborhood_en", "") if top else ""
         result = {
             "neighborhood": name,
             "neighborhood_en": hood_en,
-            "places": top_by_hood[name],
+            "places": top,
         }
-        neighborhood_cache.set(cache_key, result)
-        return result
+        entry = encode_response(NeighborhoodTopPlaces, result)
+        neighborhood_cache.set(cache_key, entry)
+        return encoded_response(request, entry)
 
     # Fallback: query directly
-    conn = get_connection()
-    rows = conn.execute(
-        """SELECT * FROM places
-        WHERE neighborhood = ?
-        ORDER BY google_rating DESC, trending DESC
-        LIMIT 10""",
-        (name,),
-    ).fetchall()
+    with read_connection() as conn:
+        rows = conn.execute(
+            """SELECT * FROM places
+            WHERE neighborhood = ?
+            ORDER BY google_rating DESC, trending DESC
+            LIMIT 10""",
+            (name,),
+        ).fetchall()
 
     if not rows:
         raise HTTPException(status_code=404, detail="الحي مو موجود أو ما فيه أماكن")
@@ -88,5 +83,6 @@ def top_places_in_neighborhood(name: str):
         "neighborhood_en": hood_en,
         "places": places,
     }
-    neighborhood_cache.set(cache_key, result)
-    return result
+    entry = encode_response(NeighborhoodTopPlaces, result)
+    neighborhood_cache.set(cache_key, entry)
+    return encoded_response(request, entry)
@@ -4,7 +4,7 @@ from __future__ import annotations
 
 from fastapi import APIRouter, HTTPException, Query
 
-from database import get_connection
+from database import read_connection
 from models import OccasionResponse
 from services.occasions import get_occasion_places
 
@@ -26,9 +26,9 @@ def get_occasion(
             detail=f"نوع المناسبة غير صحيح. الخيارات: {', '.join(VALID_OCCASIONS)}",
         )
 
-    conn = get_connection()
     offset = (page - 1) * limit
-    places, total = get_occasion_places(conn, occasion_type, limit=limit, offset=offset)
+    with read_connection() as conn:
+        places, total = get_occasion_places(conn, occasion_type, limit=limit, offset=offset)
 
     return {
         "occasion": occasion_type,
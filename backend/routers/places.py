@@ -2,13 +2,25 @@
 
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException, Query, Request, Response
+import sqlite3
+
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import Optional
 
-from database import get_connection, row_to_dict
-from cache import query_cache, compute_etag
-from models import Place, PlaceList, PlaceSummary
-from services.search import search_places
+from database import fetch_places_by_ids, read_connection, row_to_dict
+from cache import cached_places, query_cache, suggest_cache, encode_response, encoded_response
+from models import (
+    FacetedPlaceList, NearbyPlaceList, Place, PlaceBatchRequest, PlaceBatchResponse,
+    PlaceList, PlaceSummary, SearchPlaceList, SuggestResponse,
+)
+from services.facets import get_facet_index
+from services.nearby import nearby_places
+from services.pagination import decode_cursor, encode_cursor
+from services.ranking import PROFILE_PATTERN, get_ranking_index, profile_weights
+from services.search import (
+    blend_fuzzy, highlight_places, search_place_ids, search_places,
+)
+from services.suggest import get_suggest_index, suggest_key
 
 router = APIRouter(prefix="/api/v1/places", tags=["places"])
 
@@ -16,7 +28,6 @@ router = APIRouter(prefix="/api/v1/places", tags=["places"])
 @router.get("", response_model=PlaceList)
 def list_places(
     request: Request,
-    response: Response,
     category: Optional[str] = Query(None, max_length=50),
     neighborhood: Optional[str] = Query(None, max_length=100),
     price: Optional[str] = Query(None, pattern=r"^(\$|\$\$|\$\$\$|\$\$\$\$)$"),
@@ -24,19 +35,53 @@ def list_places(
     is_free: Optional[bool] = None,
     page: int = Query(1, ge=1, le=1000),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, max_length=300),
+    include_total: bool = True,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    profile: Optional[str] = Query(None, pattern=PROFILE_PATTERN),
 ):
-    """List places with filters."""
-    cache_key = f"places:{category}:{neighborhood}:{price}:{rating_min}:{is_free}:{page}:{limit}"
+    """List places with filters.
+
+    Pass ``cursor`` (the previous response's ``next_cursor``) for keyset
+    pagination: every page costs the same regardless of depth. With
+    ``lat``/``lng`` the matches are ranked by composite score instead,
+    weighted by ``profile`` (see ``services.ranking.RANKING_PROFILES``);
+    there is no column to seek on, so that ``next_cursor`` carries the
+    position in the ranking and only works with the same ``lat``/``lng``
+    and ``profile`` (a keyset cursor there, or vice versa, is a 400).
+    """
+    filter_key = f"{category}:{neighborhood}:{price}:{rating_min}:{is_free}"
+    cache_key = f"places:{filter_key}:{page}:{limit}:{cursor}:{include_total}"
+
+    if lat is not None and lng is not None:
+        facet_index = get_facet_index()
+        if facet_index is not None:
+            filters = {
+                "category": [category] if category else [],
+                "neighborhood": [neighborhood] if neighborhood else [],
+                "price": [price] if price else [],
+            }
+            mask = facet_index.match(filters, rating_min, is_free)
+            offset = _offset_cursor(cursor) if cursor else (page - 1) * limit
+            return _ranked_page(
+                facet_index.ids_of(mask), offset, page, limit, lat, lng,
+                include_total, profile,
+            )
+
     cached = query_cache.get(cache_key)
+    if cached is not None:
+        return encoded_response(request, cached)
 
-    if cached:
-        etag = compute_etag(cached)
-        if request.headers.get("if-none-match") == etag:
-            return Response(status_code=304)
-        response.headers["ETag"] = etag
-        return cached
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+            if len(after) != 2 or not isinstance(after[1], str):
+                raise ValueError("invalid cursor")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="الـ cursor غير صالح")
 
-    conn = get_connection()
     conditions = []
     params: list = []
 
@@ -56,62 +101,324 @@ def list_places(
         conditions.append("is_free = ?")
         params.append(1 if is_free else 0)
 
-    where = "WHERE " + " AND ".join(conditions) if conditions else ""
-    offset = (page - 1) * limit
+    with read_connection() as conn:
+        if after is not None:
+            rows = _keyset_page(conn, conditions, params, after, limit + 1)
+        else:
+            where = "WHERE " + " AND ".join(conditions) if conditions else ""
+            rows = conn.execute(
+                f"""SELECT * FROM places {where}
+                ORDER BY google_rating DESC, id DESC
+                LIMIT ? OFFSET ?""",
+                params + [limit + 1, (page - 1) * limit],
+            ).fetchall()
 
-    count_row = conn.execute(
-        f"SELECT COUNT(*) as cnt FROM places {where}", params
-    ).fetchone()
-    total = count_row["cnt"] if count_row else 0
+        total = _count_places(conn, filter_key, conditions, params) if include_total else None
 
-    rows = conn.execute(
-        f"""SELECT * FROM places {where}
-        ORDER BY google_rating DESC
-        LIMIT ? OFFSET ?""",
-        params + [limit, offset],
-    ).fetchall()
+    has_next = len(rows) > limit
+    places = [row_to_dict(r) for r in rows[:limit]]
+    next_cursor = None
+    if has_next and places:
+        last = places[-1]
+        next_cursor = encode_cursor([last["google_rating"], last["id"]])
 
-    places = [row_to_dict(r) for r in rows]
     result = {
         "places": places,
         "total": total,
         "page": page,
         "limit": limit,
-        "has_next": (page * limit) < total,
+        "has_next": has_next,
+        "next_cursor": next_cursor,
+    }
+
+    entry = encode_response(PlaceList, result)
+    query_cache.set(cache_key, entry)
+    return encoded_response(request, entry)
+
+
+def _ranked_page(
+    candidate_ids: list[str],
+    offset: int,
+    page: int,
+    limit: int,
+    lat: Optional[float],
+    lng: Optional[float],
+    include_total: bool = True,
+    profile: Optional[str] = None,
+) -> dict:
+    """One page of ``candidate_ids`` ordered by the vectorized ranking score."""
+    ranking = get_ranking_index()
+    if ranking is None:
+        ids = candidate_ids[offset : offset + limit]
+    else:
+        ids = ranking.top_k(
+            candidate_ids, limit, offset,
+            user_lat=lat, user_lng=lng, weights=profile_weights(profile),
+        )
+    with read_connection() as conn:
+        places = fetch_places_by_ids(conn, ids)
+    total = len(candidate_ids)
+    has_next = (offset + limit) < total
+    return {
+        "places": places,
+        "total": total if include_total else None,
+        "page": page,
+        "limit": limit,
+        "has_next": has_next,
+        "next_cursor": encode_cursor([offset + limit]) if has_next else None,
     }
 
-    query_cache.set(cache_key, result)
-    etag = compute_etag(result)
-    response.headers["ETag"] = etag
 
-    return result
+def _offset_cursor(cursor: str) -> int:
+    """Offset held by a ranked-order cursor (search, or lat/lng ranking)."""
+    try:
+        values = decode_cursor(cursor)
+        if len(values) != 1 or not isinstance(values[0], int) or values[0] < 0:
+            raise ValueError("invalid cursor")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="الـ cursor غير صالح")
+    return values[0]
+
+
+def _keyset_page(
+    conn: sqlite3.Connection,
+    conditions: list[str],
+    params: list,
+    after: list,
+    limit: int,
+) -> list[sqlite3.Row]:
+    """Rows strictly after ``after = [google_rating, id]`` in list order.
 
+    Ordering is ``google_rating DESC, id DESC`` with NULL ratings last, so
+    the row-value comparison can range-scan the ``(…, google_rating DESC)``
+    indexes; NULL-rated rows are only read once the rated ones run out.
+    """
+    last_rating, last_id = after
+    base = list(conditions)
+    rows: list[sqlite3.Row] = []
 
-@router.get("/search", response_model=PlaceList)
+    if last_rating is not None:
+        where = " AND ".join(base + ["(google_rating, id) < (?, ?)"])
+        rows = conn.execute(
+            f"""SELECT * FROM places WHERE {where}
+            ORDER BY google_rating DESC, id DESC
+            LIMIT ?""",
+            params + [last_rating, last_id, limit],
+        ).fetchall()
+        if len(rows) >= limit:
+            return rows
+        null_cond, null_params = "google_rating IS NULL", []
+    else:
+        null_cond, null_params = "google_rating IS NULL AND id < ?", [last_id]
+
+    where = " AND ".join(base + [null_cond])
+    rows += conn.execute(
+        f"""SELECT * FROM places WHERE {where}
+        ORDER BY id DESC
+        LIMIT ?""",
+        params + null_params + [limit - len(rows)],
+    ).fetchall()
+    return rows
+
+
+def _count_places(
+    conn: sqlite3.Connection,
+    filter_key: str,
+    conditions: list[str],
+    params: list,
+) -> int:
+    """COUNT(*) for a filter, cached independently of the page."""
+    count_key = f"places_count:{filter_key}"
+    total = query_cache.get(count_key)
+    if total is None:
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        count_row = conn.execute(
+            f"SELECT COUNT(*) as cnt FROM places {where}", params
+        ).fetchone()
+        total = count_row["cnt"] if count_row else 0
+        query_cache.set(count_key, total)
+    return total
+
+
+@router.get("/search", response_model=SearchPlaceList)
 def search(
     q: str = Query(..., min_length=1, max_length=200),
     page: int = Query(1, ge=1, le=1000),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, max_length=300),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    profile: Optional[str] = Query(None, pattern=PROFILE_PATTERN),
+    fuzzy: bool = False,
 ):
-    """Arabic FTS5 search."""
-    conn = get_connection()
-    offset = (page - 1) * limit
-    places, total = search_places(conn, q, limit=limit, offset=offset)
+    """Arabic FTS5 search.
+
+    Results are ordered by FTS rank rather than a column, so the search
+    cursor carries the position in the ranked result set. With
+    ``lat``/``lng`` the matches are re-ranked by composite score
+    (weighted by ``profile``).
+    ``fuzzy=true`` adds typo-tolerant name matches ("starbaks"). Matched
+    terms come back marked in ``highlights`` / ``snippet``.
+    """
+    offset = _offset_cursor(cursor) if cursor else (page - 1) * limit
+    if lat is not None and lng is not None:
+        with read_connection() as conn:
+            candidate_ids = search_place_ids(conn, q)
+        if fuzzy:
+            candidate_ids = blend_fuzzy(candidate_ids, q)
+        result = _ranked_page(candidate_ids, offset, page, limit, lat, lng, profile=profile)
+        with read_connection() as conn:
+            highlight_places(conn, q, result["places"])
+        return result
+
+    with read_connection() as conn:
+        places, total = search_places(conn, q, limit=limit, offset=offset, fuzzy=fuzzy)
+        highlight_places(conn, q, places)
 
+    has_next = (offset + limit) < total
     return {
+        "places": places,
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "has_next": has_next,
+        "next_cursor": encode_cursor([offset + limit]) if has_next else None,
+    }
+
+
+@router.get("/facets", response_model=FacetedPlaceList)
+def facets(
+    request: Request,
+    category: list[str] = Query([], max_length=20),
+    neighborhood: list[str] = Query([], max_length=50),
+    price: list[str] = Query([], max_length=6),
+    audience: list[str] = Query([], max_length=20),
+    perfect_for: list[str] = Query([], max_length=20),
+    rating_min: Optional[float] = Query(None, ge=0, le=5),
+    is_free: Optional[bool] = None,
+    page: int = Query(1, ge=1, le=1000),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Multi-value filters plus facet counts for every dimension.
+
+    Values are OR'd within a dimension and AND'd across dimensions, e.g.
+    ``?category=مطعم&category=كافيه&neighborhood=حي العليا``. Each facet's
+    counts apply every filter except its own.
+    """
+    index = get_facet_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="الفهرس لسه ما جهز")
+
+    filters = {
+        "category": category,
+        "neighborhood": neighborhood,
+        "price": price,
+        "audience": audience,
+        "perfect_for": perfect_for,
+    }
+    cache_key = f"facets:{sorted(filters.items())}:{rating_min}:{is_free}:{page}:{limit}"
+    cached = query_cache.get(cache_key)
+    if cached is not None:
+        return encoded_response(request, cached)
+
+    mask = index.match(filters, rating_min, is_free)
+    total = mask.bit_count()
+    ids = index.page(mask, (page - 1) * limit, limit)
+    with read_connection() as conn:
+        places = fetch_places_by_ids(conn, ids)
+
+    result = {
         "places": places,
         "total": total,
         "page": page,
         "limit": limit,
         "has_next": (page * limit) < total,
+        "facets": index.facet_counts(filters, rating_min, is_free),
     }
+    entry = encode_response(FacetedPlaceList, result)
+    query_cache.set(cache_key, entry)
+    return encoded_response(request, entry)
+
+
+@router.get("/nearby", response_model=NearbyPlaceList)
+def nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(2.0, gt=0, le=50),
+    category: Optional[str] = Query(None, max_length=50),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Places within ``radius_km`` of a point, nearest first."""
+    with read_connection() as conn:
+        places, total = nearby_places(conn, lat, lng, radius_km, category, limit)
+    return {"places": places, "total": total, "radius_km": radius_km}
+
+
+@router.get("/suggest", response_model=SuggestResponse)
+def suggest(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=20),
+):
+    """Autocomplete for the header search box, cached per normalized prefix.
+
+    Spellings that normalize alike ("أحمد"/"احمد", case, spacing) share a
+    cache slot; the response still echoes ``q`` as sent.
+    """
+    cache_key = f"{suggest_key(q)}:{limit}"
+    suggestions = suggest_cache.get(cache_key)
+    if suggestions is None:
+        index = get_suggest_index()
+        suggestions = index.suggest(q, limit) if index is not None else []
+        suggest_cache.set(cache_key, suggestions)
+    entry = encode_response(SuggestResponse, {"query": q, "suggestions": suggestions})
+    return encoded_response(request, entry)
+
+
+@router.post("/batch", response_model=PlaceBatchResponse)
+def batch_places(
+    payload: PlaceBatchRequest,
+    fields: Optional[str] = Query(None, max_length=500),
+):
+    """Many places in one round trip, in the order requested.
+
+    ``fields`` is ``summary`` (list-card columns) or a comma-separated
+    list of Place fields; the default is the full Place. Unknown ids come
+    back in ``missing``.
+    """
+    include = _projection(fields)
+    ids = list(dict.fromkeys(payload.ids))
+    with read_connection() as conn:
+        found = cached_places(conn, ids)
+
+    places = [
+        Place.model_validate(found[pid]).model_dump(mode="json", include=include)
+        for pid in ids
+        if pid in found
+    ]
+    return {"places": places, "missing": [pid for pid in ids if pid not in found]}
+
+
+def _projection(fields: Optional[str]) -> Optional[set[str]]:
+    if not fields:
+        return None
+    if fields == "summary":
+        return set(PlaceSummary.model_fields)
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(Place.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"حقول غير معروفة: {', '.join(sorted(unknown))}",
+        )
+    return requested | {"id"}
 
 
 @router.get("/{place_id}", response_model=Place)
 def get_place(place_id: str):
     """Get single place by ID."""
-    conn = get_connection()
-    row = conn.execute("SELECT * FROM places WHERE id = ?", (place_id,)).fetchone()
-    if not row:
+    with read_connection() as conn:
+        place = cached_places(conn, [place_id]).get(place_id)
+    if place is None:
         raise HTTPException(status_code=404, detail="المكان مو موجود")
-    return row_to_dict(row)
+    return place
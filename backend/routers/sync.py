@@ -0,0 +1,32 @@
+"""Offline sync router — وين نروح بالرياض."""
+
+from __future__ import annotations
+
+from fastapi import APIRouter, HTTPException
+
+from database import read_connection, write_connection
+from models import SyncRequest, SyncResponse
+from services.sync import apply_sync, device_state
+from write_queue import get_write_queue
+
+router = APIRouter(prefix="/api/v1/sync", tags=["sync"])
+
+
+@router.post("", response_model=SyncResponse)
+def sync(payload: SyncRequest):
+    """Replay a device's offline favorites / lists edits in one request.
+
+    Safe to retry: ops already applied (by ``op_id``) are skipped. All
+    ops are applied in one transaction; the response carries the
+    device's full state so the client can replace its local copy.
+    """
+    # queued single writes from this device go first
+    if not get_write_queue().wait_for_device(payload.device_id):
+        raise HTTPException(status_code=503, detail="التغييرات الأخيرة لسا ما انحفظت، جرّب بعد شوي")
+
+    ops = [op.model_dump() for op in payload.ops]
+    with write_connection() as conn:
+        summary = apply_sync(conn, payload.device_id, ops)
+    with read_connection() as conn:
+        state = device_state(conn, payload.device_id)
+    return {**state, **summary}
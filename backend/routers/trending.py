@@ -2,48 +2,44 @@
 
 from __future__ import annotations
 
-from fastapi import APIRouter, Request, Response
+from fastapi import APIRouter, Request
 
-from cache import get_precomputed, trending_cache, compute_etag
-from database import get_connection, row_to_dict
+from cache import get_precomputed, trending_cache, encode_response, encoded_response
+from database import read_connection, row_to_dict
 from models import TrendingResponse
 
 router = APIRouter(prefix="/api/v1/trending", tags=["trending"])
 
 
 @router.get("", response_model=TrendingResponse)
-def get_trending(request: Request, response: Response):
+def get_trending(request: Request):
     """Get trending (hot + new) places."""
     cached = trending_cache.get("trending")
-    if cached:
-        etag = compute_etag(cached)
-        if request.headers.get("if-none-match") == etag:
-            return Response(status_code=304)
-        response.headers["ETag"] = etag
-        return cached
+    if cached is not None:
+        return encoded_response(request, cached)
 
     hot = get_precomputed("trending_hot")
     new = get_precomputed("trending_new")
 
     if hot is not None and new is not None:
         result = {"hot": hot, "new": new}
-        trending_cache.set("trending", result)
-        etag = compute_etag(result)
-        response.headers["ETag"] = etag
-        return result
+        entry = encode_response(TrendingResponse, result)
+        trending_cache.set("trending", entry)
+        return encoded_response(request, entry)
 
     # Fallback
-    conn = get_connection()
-    hot_rows = conn.execute(
-        "SELECT * FROM places WHERE trending = 1 ORDER BY google_rating DESC LIMIT 30"
-    ).fetchall()
-    new_rows = conn.execute(
-        "SELECT * FROM places WHERE is_new = 1 ORDER BY google_rating DESC LIMIT 30"
-    ).fetchall()
+    with read_connection() as conn:
+        hot_rows = conn.execute(
+            "SELECT * FROM places WHERE trending = 1 ORDER BY google_rating DESC LIMIT 30"
+        ).fetchall()
+        new_rows = conn.execute(
+            "SELECT * FROM places WHERE is_new = 1 ORDER BY google_rating DESC LIMIT 30"
+        ).fetchall()
 
     result = {
         "hot": [row_to_dict(r) for r in hot_rows],
         "new": [row_to_dict(r) for r in new_rows],
     }
-    trending_cache.set("trending", result)
-    return result
+    entry = encode_response(TrendingResponse, result)
+    trending_cache.set("trending", entry)
+    return encoded_response(request, entry)
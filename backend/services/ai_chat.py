@@ -5,12 +5,22 @@ Ready for OpenAI API integration later.
 
 from __future__ import annotations
 
+import json
 import random
 import re
 import sqlite3
-from typing import Optional
-
-from database import row_to_dict
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import aiosqlite
+
+from database import fetch_places_by_ids, row_to_dict
+from services.conversation import (
+    FILTER_KINDS, candidate_mask, forget_context, get_context, merge_filters, save_context,
+)
+from services.facets import get_facet_index
+from services.matcher import AhoCorasick
+from services.ranking import get_ranking_index
 from services.search import normalize_arabic
 
 
@@ -38,7 +48,7 @@ OCCASION_PATTERNS: dict[str, list[str]] = {
     "quiet": ["هدوء", "هادي", "ساكت", "استرخاء", "ريلاكس", "مذاكرة", "دراسة"],
 }
 
-# Neighborhood patterns (common ones)
+# Neighborhood aliases (the full list is loaded from the neighborhoods JSON)
 NEIGHBORHOOD_PATTERNS: dict[str, list[str]] = {
     "حي العليا": ["العليا", "عليا", "التحلية"],
     "حي الملقا": ["الملقا", "ملقا"],
@@ -106,53 +116,150 @@ def process_chat(
     history: list[dict] | None = None,
     user_lat: Optional[float] = None,
     user_lng: Optional[float] = None,
+    session_id: Optional[str] = None,
+    weights: Optional[dict[str, float]] = None,
 ) -> dict:
     """Process a chat message and return response with places.
 
+    ``session_id`` keys the conversation context (see
+    ``services.conversation``); ``history`` rebuilds it if it expired.
+    ``weights`` override the ranking weights of located results.
+
     Returns: {reply: str, places: list[dict], suggestions: list[str]}
     """
-    normalized = normalize_arabic(message.lower())
-
-    # Check greeting
-    if _is_greeting(normalized):
-        return {
-            "reply": random.choice(GREETING_RESPONSES),
-            "places": [],
-            "suggestions": random.sample(SUGGESTION_TEMPLATES, min(3, len(SUGGESTION_TEMPLATES))),
-        }
-
-    # Extract intent
-    category = _extract_category(normalized)
-    occasion = _extract_occasion(normalized)
-    neighborhood = _extract_neighborhood(normalized)
-    price = _extract_price(normalized)
-
-    # Build query
-    places = _query_places(conn, category, occasion, neighborhood, price)
-
+    intent = analyze_message(message)
+    if intent["greeting"]:
+        forget_context(session_id)
+        return greeting_response()
+
+    ids = plan_turn(intent, session_id, history, user_lat, user_lng, weights)
+    if ids is None:
+        places = _query_places(
+            conn, intent["category"], intent["occasion"], intent["neighborhood"],
+            intent["price"], user_lat, user_lng, weights,
+        )
+    else:
+        places = fetch_places_by_ids(conn, ids)
     if places:
-        # Limit to top 5
-        top_places = places[:5]
-        reply = _build_reply(top_places, category, occasion, neighborhood)
-        suggestions = _build_suggestions(category, occasion, neighborhood)
-        return {
-            "reply": reply,
-            "places": top_places,
-            "suggestions": suggestions,
-        }
+        return results_response(places, intent)
 
     # No structured match — try FTS search
     from services.search import search_places
     search_results, total = search_places(conn, message, limit=5)
     if search_results:
-        reply = f"{random.choice(RESULT_INTROS)}\n\nلقيت لك {total} مكان! هذي أفضلها:"
-        return {
-            "reply": reply,
-            "places": search_results,
-            "suggestions": random.sample(SUGGESTION_TEMPLATES, 2),
-        }
+        return search_response(search_results, total)
+
+    return empty_response()
 
-    # No results at all
+
+def plan_turn(
+    intent: dict,
+    session_id: Optional[str],
+    history: list[dict] | None = None,
+    user_lat: Optional[float] = None,
+    user_lng: Optional[float] = None,
+    weights: Optional[dict[str, float]] = None,
+) -> Optional[list[str]]:
+    """Resolve this turn's structured matches in memory (up to 20 ids).
+
+    Filters the message doesn't name are carried over from the session's
+    previous turn (``intent`` is updated and ``intent["carried"]`` lists
+    them); if the combination matches nothing, the message's own filters
+    are used alone. A message with no filters at all leaves the context
+    alone and goes to search. Returns ``None`` when the facet index isn't built, so
+    the caller falls back to SQL.
+    """
+    own = {kind: intent[kind] for kind in FILTER_KINDS}
+    intent["carried"] = []
+    if not any(own.values()):
+        return []
+
+    context = get_context(session_id)
+    if context is None and history:
+        replayed = _replay_history(history)
+        context = {"filters": replayed} if replayed else None
+    filters = merge_filters(own, context["filters"] if context else None)
+    intent.update(filters)
+    intent["carried"] = [k for k in FILTER_KINDS if filters[k] and not own[k]]
+
+    facet = get_facet_index()
+    if facet is None:
+        return None
+    mask = candidate_mask(facet, filters, context)
+    if not mask and intent["carried"]:
+        filters = merge_filters(own, None)
+        intent.update(filters)
+        intent["carried"] = []
+        mask = candidate_mask(facet, filters, None)
+    save_context(session_id, filters, mask, facet.generation)
+
+    ranking = get_ranking_index()
+    if user_lat and user_lng and ranking is not None:
+        return ranking.top_k(
+            facet.ids_of(mask), 20, user_lat=user_lat, user_lng=user_lng, weights=weights
+        )
+    return facet.page(mask, 0, 20)
+
+
+def _replay_history(history: list[dict]) -> Optional[dict]:
+    """Filters accumulated over the user's earlier messages."""
+    filters = None
+    for turn in history:
+        if turn.get("role") != "user":
+            continue
+        intent = analyze_message(turn.get("content") or "")
+        if intent["greeting"]:
+            filters = None
+            continue
+        own = {kind: intent[kind] for kind in FILTER_KINDS}
+        if any(own.values()):
+            filters = merge_filters(own, filters)
+    return filters
+
+
+def analyze_message(message: str) -> dict:
+    """Greeting flag, extracted filters and the keyword spans behind them."""
+    normalized = normalize_arabic(message.lower())
+    matches = extract_intents(normalized)
+    intent: dict = {kind: m.value for kind, m in matches.items()}
+    for kind in FILTER_KINDS:
+        intent.setdefault(kind, None)
+    intent["greeting"] = _is_greeting(normalized)
+    intent["matches"] = [
+        {"kind": kind, "value": m.value, "keyword": m.keyword, "start": m.start, "end": m.end}
+        for kind, m in matches.items()
+    ]
+    return intent
+
+
+def greeting_response() -> dict:
+    return {
+        "reply": random.choice(GREETING_RESPONSES),
+        "places": [],
+        "suggestions": random.sample(SUGGESTION_TEMPLATES, min(3, len(SUGGESTION_TEMPLATES))),
+    }
+
+
+def results_response(places: list[dict], intent: dict) -> dict:
+    """Reply for structured matches (top 5 of them)."""
+    top_places = places[:5]
+    category, occasion, neighborhood = intent["category"], intent["occasion"], intent["neighborhood"]
+    return {
+        "reply": _build_reply(top_places, category, occasion, neighborhood),
+        "places": top_places,
+        "suggestions": _build_suggestions(category, occasion, neighborhood),
+    }
+
+
+def search_response(places: list[dict], total: int) -> dict:
+    return {
+        "reply": f"{random.choice(RESULT_INTROS)}\n\nلقيت لك {total} مكان! هذي أفضلها:",
+        "places": places,
+        "suggestions": random.sample(SUGGESTION_TEMPLATES, 2),
+    }
+
+
+def empty_response() -> dict:
     return {
         "reply": random.choice(NO_RESULT_RESPONSES),
         "places": [],
@@ -165,32 +272,104 @@ def _is_greeting(text: str) -> bool:
     return any(w in GREETINGS for w in words[:3])
 
 
-def _extract_category(text: str) -> Optional[str]:
-    for cat, keywords in CATEGORY_PATTERNS.items():
-        if any(kw in text for kw in keywords):
-            return cat
-    return None
+# ── Intent extraction ───────────────────────────────────────────────
+
 
+class IntentMatch(NamedTuple):
+    value: str
+    keyword: str
+    start: int
+    end: int
 
-def _extract_occasion(text: str) -> Optional[str]:
-    for occ, keywords in OCCASION_PATTERNS.items():
-        if any(kw in text for kw in keywords):
-            return occ
-    return None
 
+# Neighborhoods whose bare name is an everyday word ("صباح الخير",
+# "اجتماع عمل"): only matched with the "حي" prefix
+_AMBIGUOUS_NEIGHBORHOODS = frozenset({
+    "الخير", "السلام", "سلام", "العمل", "النور", "السعادة", "الهدا", "الندى",
+    "المؤتمرات", "الشرقية", "الصناعية", "الدفاع", "طيبة", "أحد", "بدر",
+    "الوادي", "الساحل", "الجزيرة", "القرى", "الزهور", "الواحة", "الحزم",
+    "المشرق", "لبن", "جرير",
+})
 
-def _extract_neighborhood(text: str) -> Optional[str]:
-    for hood, keywords in NEIGHBORHOOD_PATTERNS.items():
-        if any(kw in text for kw in keywords):
-            return hood
-    return None
+_PARENTHESIZED = re.compile(r"\s*\(.*?\)")
 
+_matcher: Optional[AhoCorasick] = None
 
-def _extract_price(text: str) -> Optional[str]:
-    for price, keywords in PRICE_PATTERNS.items():
-        if any(kw in text for kw in keywords):
-            return price
-    return None
+
+def build_intent_matcher(
+    neighborhoods_path: Optional[str | Path] = None,
+    conn: Optional[sqlite3.Connection] = None,
+) -> AhoCorasick:
+    """(Re)build the keyword automaton for every intent kind.
+
+    Neighborhood names come from ``data/all-riyadh-neighborhoods.json``
+    (as "حي X", "X" and the English name, matched as whole words) on top
+    of the hand-written aliases; a missing file leaves just the aliases.
+    With ``conn``, only neighborhoods that some place is in are added: the
+    others would become a filter that can never match.
+    """
+    global _matcher
+    matcher = AhoCorasick()
+    tables = (
+        ("category", CATEGORY_PATTERNS),
+        ("occasion", OCCASION_PATTERNS),
+        ("neighborhood", NEIGHBORHOOD_PATTERNS),
+        ("price", PRICE_PATTERNS),
+    )
+    for kind, patterns in tables:
+        for priority, (value, keywords) in enumerate(patterns.items()):
+            for kw in keywords:
+                matcher.add(_pattern_key(kw), (kind, priority, value))
+
+    hoods = _load_neighborhoods(neighborhoods_path)
+    if conn is not None:
+        present = {r[0] for r in conn.execute("SELECT DISTINCT neighborhood FROM places")}
+        hoods = [h for h in hoods if h["name_ar"] in present]
+    base = len(NEIGHBORHOOD_PATTERNS)
+    for priority, hood in enumerate(hoods, base):
+        name = hood["name_ar"]
+        bare = _PARENTHESIZED.sub("", name.removeprefix("حي ")).strip()
+        names = {name, hood.get("name_en") or ""}
+        if bare not in _AMBIGUOUS_NEIGHBORHOODS:
+            names.add(bare)
+        for alias in names:
+            key = _pattern_key(alias)
+            if len(key) >= 3:
+                matcher.add(key, ("neighborhood", priority, name), whole_word=True)
+
+    _matcher = matcher.build()
+    return _matcher
+
+
+def _pattern_key(text: str) -> str:
+    return normalize_arabic(text.lower())
+
+
+def _load_neighborhoods(path: Optional[str | Path]) -> list[dict]:
+    if not path:
+        return []
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return []
+    return [n for n in data.get("neighborhoods", []) if n.get("name_ar")]
+
+
+def extract_intents(text: str) -> dict[str, IntentMatch]:
+    """Best match per intent kind from a single pass over normalized ``text``.
+
+    Within a kind the value declared first wins (as the old per-kind scans
+    did), then the longer keyword, then the earlier one.
+    """
+    matcher = _matcher or build_intent_matcher()
+    best: dict[str, tuple[tuple[int, int, int], IntentMatch]] = {}
+    for m in matcher.find_all(text):
+        kind, priority, value = m.value
+        rank = (priority, m.start - m.end, m.start)
+        if kind not in best or rank < best[kind][0]:
+            best[kind] = (rank, IntentMatch(value, m.pattern, m.start, m.end))
+    return {kind: match for kind, (_, match) in best.items()}
 
 
 def _query_places(
@@ -199,8 +378,86 @@ def _query_places(
     occasion: Optional[str],
     neighborhood: Optional[str],
     price: Optional[str],
+    user_lat: Optional[float] = None,
+    user_lng: Optional[float] = None,
+    weights: Optional[dict[str, float]] = None,
+) -> list[dict]:
+    """Query places based on extracted filters.
+
+    With a user location, every match is scored by the ranking arrays
+    (distance included) instead of taking the 20 best-rated.
+    """
+    where, params = _filter_sql(category, occasion, neighborhood, price)
+    if not where:
+        return []
+
+    ranking = get_ranking_index()
+    if user_lat and user_lng and ranking is not None:
+        ids = [r["id"] for r in conn.execute(f"SELECT id FROM places WHERE {where}", params)]
+        top_ids = ranking.top_k(
+            ids, 20, user_lat=user_lat, user_lng=user_lng, weights=weights
+        )
+        return fetch_places_by_ids(conn, top_ids)
+
+    rows = conn.execute(
+        f"""SELECT * FROM places WHERE {where}
+        ORDER BY google_rating DESC
+        LIMIT 20""",
+        params,
+    ).fetchall()
+
+    return [row_to_dict(r) for r in rows]
+
+
+async def query_places_async(
+    conn: aiosqlite.Connection,
+    intent: dict,
+    user_lat: Optional[float] = None,
+    user_lng: Optional[float] = None,
+    weights: Optional[dict[str, float]] = None,
 ) -> list[dict]:
-    """Query places based on extracted filters."""
+    """:func:`_query_places` on an aiosqlite connection, for async handlers."""
+    where, params = _filter_sql(
+        intent["category"], intent["occasion"], intent["neighborhood"], intent["price"]
+    )
+    if not where:
+        return []
+
+    ranking = get_ranking_index()
+    if user_lat and user_lng and ranking is not None:
+        async with conn.execute(f"SELECT id FROM places WHERE {where}", params) as cur:
+            ids = [r["id"] for r in await cur.fetchall()]
+        top_ids = ranking.top_k(
+            ids, 20, user_lat=user_lat, user_lng=user_lng, weights=weights
+        )
+        return await fetch_places_async(conn, top_ids)
+
+    async with conn.execute(
+        f"""SELECT * FROM places WHERE {where}
+        ORDER BY google_rating DESC
+        LIMIT 20""",
+        params,
+    ) as cur:
+        return [row_to_dict(r) for r in await cur.fetchall()]
+
+
+async def fetch_places_async(conn: aiosqlite.Connection, ids: list[str]) -> list[dict]:
+    """``fetch_places_by_ids`` on an aiosqlite connection."""
+    if not ids:
+        return []
+    placeholders = ",".join("?" * len(ids))
+    async with conn.execute(f"SELECT * FROM places WHERE id IN ({placeholders})", ids) as cur:
+        by_id = {r["id"]: row_to_dict(r) for r in await cur.fetchall()}
+    return [by_id[pid] for pid in ids if pid in by_id]
+
+
+def _filter_sql(
+    category: Optional[str],
+    occasion: Optional[str],
+    neighborhood: Optional[str],
+    price: Optional[str],
+) -> tuple[str, list]:
+    """WHERE clause for the extracted filters ("" when there are none)."""
     conditions = []
     params: list = []
 
@@ -217,37 +474,13 @@ def _query_places(
         params.append(price)
 
     if occasion:
-        from services.occasions import OCCASION_CATEGORIES
-        from cache import get_precomputed
-
-        occasion_kws = (get_precomputed("occasion_keywords") or {}).get(occasion, [])
-        occ_conditions = []
-        for kw in occasion_kws:
-            occ_conditions.append("perfect_for LIKE ?")
-            params.append(f"%{kw}%")
-            occ_conditions.append("audience LIKE ?")
-            params.append(f"%{kw}%")
-
-        cats = OCCASION_CATEGORIES.get(occasion, [])
-        for cat in cats:
-            occ_conditions.append("category = ?")
-            params.append(cat)
-
-        if occ_conditions:
-            conditions.append(f"({' OR '.join(occ_conditions)})")
-
-    if not conditions:
-        return []
+        from services.occasions import occasion_filter
 
-    where = " AND ".join(conditions)
-    rows = conn.execute(
-        f"""SELECT * FROM places WHERE {where}
-        ORDER BY google_rating DESC
-        LIMIT 20""",
-        params,
-    ).fetchall()
+        occ_where, occ_params = occasion_filter(occasion)
+        conditions.append(occ_where)
+        params.extend(occ_params)
 
-    return [row_to_dict(r) for r in rows]
+    return " AND ".join(conditions), params
 
 
 def _build_reply(
@@ -0,0 +1,90 @@
+"""Multi-turn chat context — وين نروح بالرياض.
+
+Each session keeps the filters of its last structured turn and the facet
+bitmap of the places they matched. A follow-up that only names what
+changed ("وبحي الملقا؟") inherits the rest, and when it only adds filters
+the previous bitmap is narrowed in memory instead of querying again.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from cache import conversation_cache
+from services.facets import FacetIndex
+from services.occasions import get_occasion_ids
+
+FILTER_KINDS = ("category", "occasion", "neighborhood", "price")
+
+# Chat filter → facet dimension (occasions have their own id lists)
+_DIMENSIONS = {"category": "category", "neighborhood": "neighborhood", "price": "price"}
+
+# (facet generation, occasion) → bitmap
+_occasion_masks: dict[tuple[int, str], int] = {}
+
+
+def get_context(session_id: Optional[str]) -> Optional[dict]:
+    """``{"filters", "mask", "generation"}`` of the session's last turn."""
+    if not session_id:
+        return None
+    return conversation_cache.get(session_id)
+
+
+def save_context(session_id: Optional[str], filters: dict, mask: int, generation: int) -> None:
+    if session_id:
+        conversation_cache.set(
+            session_id, {"filters": filters, "mask": mask, "generation": generation}
+        )
+
+
+def forget_context(session_id: Optional[str]) -> None:
+    if session_id:
+        conversation_cache.invalidate(session_id)
+
+
+def merge_filters(current: dict, previous: Optional[dict]) -> dict:
+    """This turn's filters, with the unnamed ones carried from ``previous``."""
+    carried = previous or {}
+    return {kind: current.get(kind) or carried.get(kind) for kind in FILTER_KINDS}
+
+
+def candidate_mask(facet: FacetIndex, filters: dict, context: Optional[dict]) -> int:
+    """Bitmap of places matching ``filters``.
+
+    When the previous turn's filters all still hold (this turn only adds
+    some), its bitmap is narrowed by the new ones alone.
+    """
+    previous = None
+    if context and context.get("generation") == facet.generation:
+        previous = context
+    if previous is not None:
+        old = previous["filters"]
+        if all(old.get(kind) in (None, filters.get(kind)) for kind in FILTER_KINDS):
+            added = {kind: v for kind, v in filters.items() if v and not old.get(kind)}
+            return previous["mask"] & _filter_mask(facet, added)
+    return _filter_mask(facet, filters)
+
+
+def _filter_mask(facet: FacetIndex, filters: dict) -> int:
+    mask = facet.match({
+        dim: [filters[kind]] for kind, dim in _DIMENSIONS.items() if filters.get(kind)
+    })
+    occasion = filters.get("occasion")
+    if occasion:
+        mask &= _occasion_mask(facet, occasion)
+    return mask
+
+
+def _occasion_mask(facet: FacetIndex, occasion: str) -> int:
+    key = (facet.generation, occasion)
+    mask = _occasion_masks.get(key)
+    if mask is None:
+        if len(_occasion_masks) > 64:  # only stale generations accumulate
+            _occasion_masks.clear()
+        mask = 0
+        for pid in get_occasion_ids(occasion):
+            pos = facet.positions.get(pid)
+            if pos is not None:
+                mask |= 1 << pos
+        _occasion_masks[key] = mask
+    return mask
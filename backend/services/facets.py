@@ -0,0 +1,150 @@
+"""In-memory faceted filtering with bitmap indexes — وين نروح بالرياض."""
+
+from __future__ import annotations
+
+import bisect
+import functools
+import itertools
+import sqlite3
+from typing import Iterable, Optional
+
+import numpy as np
+
+from database import row_to_dict
+
+# Filterable dimensions → places column (list-valued columns are JSON arrays)
+DIMENSIONS: dict[str, str] = {
+    "category": "category",
+    "neighborhood": "neighborhood",
+    "price": "price_level",
+    "audience": "audience",
+    "perfect_for": "perfect_for",
+}
+
+_generations = itertools.count(1)
+
+
+class FacetIndex:
+    """One bitmap per (dimension, value) over every place.
+
+    Bit ``i`` stands for the ``i``-th place in ``google_rating DESC, id DESC``
+    order (the list endpoint's order), so walking the set bits of a result
+    yields places already ranked, and ``rating_min`` is just a prefix mask.
+    Bitmaps are Python ints: AND/OR/popcount run word-at-a-time in C.
+    """
+
+    def __init__(self, rows: Iterable[dict]):
+        # bitmaps from different builds are not comparable
+        self.generation = next(_generations)
+        self.ids: list[str] = []
+        self.bitmaps: dict[str, dict[str, int]] = {dim: {} for dim in DIMENSIONS}
+        self.free = 0
+        neg_ratings: list[float] = []  # ascending, for bisect
+
+        for i, place in enumerate(rows):
+            bit = 1 << i
+            self.ids.append(place["id"])
+            for dim, column in DIMENSIONS.items():
+                value = place.get(column)
+                values = value if isinstance(value, list) else [value]
+                for v in values:
+                    if v:
+                        bucket = self.bitmaps[dim]
+                        bucket[v] = bucket.get(v, 0) | bit
+            if place.get("is_free"):
+                self.free |= bit
+            rating = place.get("google_rating")
+            neg_ratings.append(-rating if rating is not None else float("inf"))
+
+        self.all = (1 << len(self.ids)) - 1
+        self._neg_ratings = neg_ratings
+        self.positions = {pid: i for i, pid in enumerate(self.ids)}
+        self._id_array = np.array(self.ids, dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def match(
+        self,
+        filters: dict[str, list[str]],
+        rating_min: Optional[float] = None,
+        is_free: Optional[bool] = None,
+        skip: Optional[str] = None,
+    ) -> int:
+        """Bitmap of places matching every dimension (values OR'd within one).
+
+        ``skip`` leaves one dimension out, for disjunctive facet counts.
+        """
+        mask = self.all
+        for dim, values in filters.items():
+            if dim == skip or not values:
+                continue
+            bucket = self.bitmaps[dim]
+            union = 0
+            for v in values:
+                union |= bucket.get(v, 0)
+            mask &= union
+        if rating_min is not None:
+            # ratings are sorted descending, NULLs last
+            mask &= (1 << bisect.bisect_right(self._neg_ratings, -rating_min)) - 1
+        if is_free is not None:
+            mask &= self.free if is_free else self.all & ~self.free
+        return mask
+
+    def facet_counts(
+        self,
+        filters: dict[str, list[str]],
+        rating_min: Optional[float] = None,
+        is_free: Optional[bool] = None,
+    ) -> dict[str, dict[str, int]]:
+        """Counts for every value of every dimension, given the other filters."""
+        counts: dict[str, dict[str, int]] = {}
+        for dim, bucket in self.bitmaps.items():
+            mask = self.match(filters, rating_min, is_free, skip=dim)
+            dim_counts = {}
+            for value, bitmap in bucket.items():
+                n = (bitmap & mask).bit_count()
+                if n:
+                    dim_counts[value] = n
+            counts[dim] = dict(sorted(dim_counts.items(), key=lambda kv: -kv[1]))
+        return counts
+
+    def page(self, mask: int, offset: int, limit: int) -> list[str]:
+        """IDs of set bits ``offset .. offset+limit`` in rank order."""
+        return self._id_array[_set_bits(mask, len(self.ids))[offset : offset + limit]].tolist()
+
+    def ids_of(self, mask: int) -> list[str]:
+        return self._id_array[_set_bits(mask, len(self.ids))].tolist()
+
+
+@functools.lru_cache(maxsize=64)
+def _set_bits(mask: int, nbits: int) -> np.ndarray:
+    """Positions of the set bits of ``mask``, ascending.
+
+    Unpacked in one vectorized pass, so a deep page costs the same as the
+    first; cached because paging through one filter reuses the same mask.
+    """
+    raw = np.frombuffer(mask.to_bytes((nbits + 7) // 8, "little"), dtype=np.uint8)
+    bits = np.flatnonzero(np.unpackbits(raw, bitorder="little"))
+    bits.flags.writeable = False
+    return bits
+
+
+_index: Optional[FacetIndex] = None
+
+
+def build_facet_index(conn: sqlite3.Connection) -> FacetIndex:
+    """(Re)build the global index from the places table."""
+    global _index
+    rows = conn.execute(
+        """SELECT id, category, neighborhood, price_level, audience, perfect_for,
+        google_rating, is_free
+        FROM places
+        ORDER BY google_rating DESC, id DESC"""
+    ).fetchall()
+    _index = FacetIndex(row_to_dict(r) for r in rows)
+    return _index
+
+
+def get_facet_index() -> Optional[FacetIndex]:
+    return _index
@@ -0,0 +1,171 @@
+"""Typo-tolerant name matching (Arabic + English) — وين نروح بالرياض.
+
+Two layers over the words of every place name:
+
+* a symmetric-delete dictionary (SymSpell): every word is indexed under
+  the strings obtained by deleting up to ``MAX_DISTANCE`` characters from
+  its prefix, so a misspelling is resolved with a handful of dict lookups
+  plus a bounded edit-distance check instead of a scan;
+* a phonetic key that folds letters users swap when transliterating and
+  drops vowels, so "starbaks"/"starbucks" or "كوفي"/"كافي" collide even
+  when they are further apart than the edit-distance budget.
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+from typing import Optional
+
+from normalization import normalize_arabic
+
+MAX_DISTANCE = 2
+PREFIX_LENGTH = 7
+PHONETIC_SCORE = 0.7
+
+_WORD = re.compile(r"\w+")
+
+_ARABIC_FOLD = str.maketrans({
+    "ى": "ي", "ئ": "ي", "ؤ": "و", "ء": None,
+    "ث": "س", "ذ": "ز", "ظ": "ض",
+    "گ": "ك", "چ": "ج", "پ": "ب", "ڤ": "ف",
+})
+_ARABIC_VOWELS = set("اوي")
+_LATIN_DIGRAPHS = (("ph", "f"), ("ck", "k"), ("sh", "x"), ("ch", "x"), ("kh", "x"))
+_LATIN_FOLD = str.maketrans({"c": "k", "q": "k", "z": "s"})
+_LATIN_VOWELS = set("aeiouy")
+
+
+def tokenize(text: str) -> list[str]:
+    return [w for w in _WORD.findall(normalize_arabic(text).lower()) if len(w) > 1]
+
+
+def phonetic_key(word: str) -> str:
+    """Consonant skeleton with commonly confused letters folded together."""
+    if word.isascii():
+        for src, dst in _LATIN_DIGRAPHS:
+            word = word.replace(src, dst)
+        word = word.translate(_LATIN_FOLD)
+        vowels = _LATIN_VOWELS
+    else:
+        word = word.translate(_ARABIC_FOLD)
+        vowels = _ARABIC_VOWELS
+    if not word:
+        return ""
+    out = [word[0]]
+    for ch in word[1:]:
+        if ch in vowels or ch == out[-1]:
+            continue
+        out.append(ch)
+    return "".join(out)
+
+
+def _deletes(word: str, max_distance: int) -> set[str]:
+    """``word`` plus every string reachable by up to ``max_distance`` deletions."""
+    seen = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        nxt = set()
+        for w in frontier:
+            if len(w) <= 1:
+                continue
+            for i in range(len(w)):
+                nxt.add(w[:i] + w[i + 1:])
+        nxt -= seen
+        seen |= nxt
+        frontier = nxt
+    return seen
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Damerau-Levenshtein (optimal string alignment), capped at max+1."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2: list[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = cur[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+            row_min = min(row_min, cur[j])
+        if row_min > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class FuzzyIndex:
+    """Resolves misspelled name words to candidate place ids."""
+
+    def __init__(self, places: list[dict]):
+        self.words: dict[str, set[str]] = {}          # word → place ids
+        self.deletes: dict[str, list[str]] = {}       # delete variant → words
+        self.phonetic: dict[str, list[str]] = {}      # phonetic key → words
+        self.ratings: dict[str, float] = {}
+
+        for place in places:
+            self.ratings[place["id"]] = place.get("google_rating") or 0.0
+            for field in ("name_ar", "name_en"):
+                for word in tokenize(place.get(field) or ""):
+                    self.words.setdefault(word, set()).add(place["id"])
+
+        for word in self.words:
+            for variant in _deletes(word[:PREFIX_LENGTH], MAX_DISTANCE):
+                self.deletes.setdefault(variant, []).append(word)
+            key = phonetic_key(word)
+            if len(key) >= 2:
+                self.phonetic.setdefault(key, []).append(word)
+
+    def lookup(self, word: str) -> dict[str, float]:
+        """Dictionary words close to ``word`` → similarity in (0, 1]."""
+        if word in self.words:
+            return {word: 1.0}
+        max_distance = 1 if len(word) <= 4 else MAX_DISTANCE
+        matches: dict[str, float] = {}
+        candidates = set()
+        for variant in _deletes(word[:PREFIX_LENGTH], max_distance):
+            candidates.update(self.deletes.get(variant, ()))
+        for cand in candidates:
+            d = edit_distance(word, cand, max_distance)
+            if d <= max_distance:
+                matches[cand] = 1.0 - d / (len(word) + 1)
+        if len(word) >= 3:
+            for cand in self.phonetic.get(phonetic_key(word), ()):
+                matches[cand] = max(matches.get(cand, 0.0), PHONETIC_SCORE)
+        return matches
+
+    def search(self, query: str, limit: int = 200) -> list[str]:
+        """Place ids whose names best match ``query``, best first."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        scores: dict[str, float] = {}
+        for token in tokens:
+            best: dict[str, float] = {}
+            for word, sim in self.lookup(token).items():
+                for pid in self.words[word]:
+                    if sim > best.get(pid, 0.0):
+                        best[pid] = sim
+            for pid, sim in best.items():
+                scores[pid] = scores.get(pid, 0.0) + sim
+        ranked = sorted(scores, key=lambda pid: (-scores[pid], -self.ratings[pid]))
+        return ranked[:limit]
+
+
+_index: Optional[FuzzyIndex] = None
+
+
+def build_fuzzy_index(conn: sqlite3.Connection) -> FuzzyIndex:
+    """(Re)build the global index from place names."""
+    global _index
+    rows = conn.execute("SELECT id, name_ar, name_en, google_rating FROM places").fetchall()
+    _index = FuzzyIndex([dict(r) for r in rows])
+    return _index
+
+
+def get_fuzzy_index() -> Optional[FuzzyIndex]:
+    return _index
@@ -0,0 +1,107 @@
+"""Multi-pattern keyword matching (Aho-Corasick) — وين نروح بالرياض.
+
+All patterns are compiled into one automaton, so a message is scanned
+once no matter how many keywords there are, and every occurrence —
+overlapping ones included — comes back with its span.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, NamedTuple
+
+# One-letter Arabic proclitics allowed in front of a whole-word match
+# ("بالعليا", "وللملقا" → "العليا", "الملقا")
+_CLITICS = frozenset({"", "ب", "ل", "و", "ف", "ك", "وب", "ول", "فب", "فل"})
+
+
+class Match(NamedTuple):
+    start: int
+    end: int  # exclusive
+    pattern: str
+    value: Any
+
+
+class AhoCorasick:
+    """Trie of patterns with failure links; call :meth:`build` after adding.
+
+    Patterns may be added after a build; the next :meth:`build` (or
+    :meth:`find_all`) recomputes the automaton from scratch.
+    """
+
+    def __init__(self):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        # per state: (pattern, value, whole_word) of the patterns ending exactly here
+        self._own: list[list[tuple[str, Any, bool]]] = [[]]
+        # ... plus those of its failure chain (filled by build)
+        self._out: list[list[tuple[str, Any, bool]]] = [[]]
+        self._built = False
+
+    def __len__(self) -> int:
+        return sum(len(own) for own in self._own)
+
+    def add(self, pattern: str, value: Any, whole_word: bool = False) -> None:
+        """Register ``pattern``; ``whole_word`` rejects matches inside words."""
+        if not pattern:
+            return
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+            state = nxt
+        self._own[state].append((pattern, value, whole_word))
+        self._built = False
+
+    def build(self) -> "AhoCorasick":
+        """Compute failure links breadth-first and merge outputs along them."""
+        out = [list(own) for own in self._own]
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                # the failure state is shallower, so its outputs are merged already
+                out[nxt] = out[nxt] + out[self._fail[nxt]]
+        self._out = out
+        self._built = True
+        return self
+
+    def find_all(self, text: str) -> list[Match]:
+        """Every pattern occurrence in ``text``, ordered by end position."""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        matches: list[Match] = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern, value, whole_word in out[state]:
+                start = i + 1 - len(pattern)
+                if whole_word and not _is_word(text, start, i + 1):
+                    continue
+                matches.append(Match(start, i + 1, pattern, value))
+        return matches
+
+
+def _is_word(text: str, start: int, end: int) -> bool:
+    if end < len(text) and text[end].isalnum():
+        return False
+    word_start = start
+    while word_start and text[word_start - 1].isalnum():
+        word_start -= 1
+    return text[word_start:start] in _CLITICS
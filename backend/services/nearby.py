@@ -0,0 +1,64 @@
+"""Nearby places via the R*Tree spatial index — وين نروح بالرياض."""
+
+from __future__ import annotations
+
+import math
+import sqlite3
+from typing import Optional
+
+from database import row_to_dict
+from services.geo import haversine
+
+_KM_PER_DEG_LAT = 111.32
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lng, max_lng) enclosing a circle of ``radius_km``."""
+    dlat = radius_km / _KM_PER_DEG_LAT
+    dlng = radius_km / (_KM_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def nearby_places(
+    conn: sqlite3.Connection,
+    lat: float,
+    lng: float,
+    radius_km: float,
+    category: Optional[str] = None,
+    limit: int = 20,
+) -> tuple[list[dict], int]:
+    """Places within ``radius_km``, nearest first.
+
+    The R*Tree narrows candidates to the bounding box; exact haversine
+    distance then drops the corners and orders the rest.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    conditions = [
+        "r.min_lat >= ?", "r.max_lat <= ?",
+        "r.min_lng >= ?", "r.max_lng <= ?",
+    ]
+    params: list = [min_lat, max_lat, min_lng, max_lng]
+    if category:
+        conditions.append("p.category = ?")
+        params.append(category)
+
+    rows = conn.execute(
+        f"""SELECT p.* FROM places_rtree r
+        INNER JOIN places p ON p.rowid = r.id
+        WHERE {' AND '.join(conditions)}""",
+        params,
+    ).fetchall()
+
+    hits = []
+    for row in rows:
+        dist = haversine(lat, lng, row["lat"], row["lng"])
+        if dist <= radius_km:
+            hits.append((dist, row))
+    hits.sort(key=lambda h: (h[0], -(h[1]["google_rating"] or 0)))
+
+    places = []
+    for dist, row in hits[:limit]:
+        place = row_to_dict(row)
+        place["distance_km"] = round(dist, 3)
+        places.append(place)
+    return places, len(hits)
@@ -2,12 +2,10 @@
 
 from __future__ import annotations
 
-import json
 import sqlite3
-from typing import Optional
 
 from cache import get_precomputed, occasion_cache
-from database import row_to_dict
+from database import fetch_places_by_ids
 
 
 # Category hints per occasion type
@@ -19,6 +17,76 @@ OCCASION_CATEGORIES: dict[str, list[str]] = {
     "quiet": ["كافيه", "طبيعة", "متاحف"],
 }
 
+# place_tags kinds an occasion keyword is matched against
+OCCASION_TAG_KINDS = ("perfect_for", "audience")
+
+
+# ── Occasion index ──────────────────────────────────────────────────
+
+# occasion → place ids in list order (google_rating DESC, id DESC)
+_occasion_ids: dict[str, list[str]] = {}
+# occasion → (kind, tag) pairs whose text contains one of its keywords
+_occasion_tags: dict[str, list[tuple[str, str]]] = {}
+
+
+def build_occasion_index(conn: sqlite3.Connection) -> dict[str, list[str]]:
+    """(Re)compute every occasion's members from ``place_tags``.
+
+    A keyword matches any tag that contains it ("سهرة" → "سهرة رومانسية"),
+    as the old ``LIKE '%kw%'`` scans did; that is resolved once against
+    the distinct tags, so membership is a plain indexed lookup.
+    """
+    global _occasion_ids, _occasion_tags
+    keywords = get_precomputed("occasion_keywords") or {}
+    kinds = ",".join("?" * len(OCCASION_TAG_KINDS))
+    distinct = conn.execute(
+        f"SELECT DISTINCT kind, tag FROM place_tags WHERE kind IN ({kinds})",
+        OCCASION_TAG_KINDS,
+    ).fetchall()
+
+    occasion_ids: dict[str, list[str]] = {}
+    occasion_tags: dict[str, list[tuple[str, str]]] = {}
+    for occasion in OCCASION_CATEGORIES.keys() | keywords.keys():
+        kws = keywords.get(occasion, [])
+        tags = [(r["kind"], r["tag"]) for r in distinct if any(kw in r["tag"] for kw in kws)]
+        where, params = _membership_filter(occasion, tags)
+        rows = conn.execute(
+            f"""SELECT id FROM places WHERE {where}
+            ORDER BY google_rating DESC, id DESC""",
+            params,
+        ).fetchall()
+        occasion_tags[occasion] = tags
+        occasion_ids[occasion] = [r["id"] for r in rows]
+
+    _occasion_ids, _occasion_tags = occasion_ids, occasion_tags
+    return occasion_ids
+
+
+def get_occasion_ids(occasion_type: str) -> list[str]:
+    return _occasion_ids.get(occasion_type, [])
+
+
+def occasion_filter(occasion_type: str) -> tuple[str, list]:
+    """SQL condition (and params) selecting the places of an occasion."""
+    return _membership_filter(occasion_type, _occasion_tags.get(occasion_type, []))
+
+
+def _membership_filter(occasion_type: str, tags: list[tuple[str, str]]) -> tuple[str, list]:
+    conditions = []
+    params: list = []
+    categories = OCCASION_CATEGORIES.get(occasion_type, [])
+    if categories:
+        conditions.append(f"category IN ({','.join('?' * len(categories))})")
+        params.extend(categories)
+    if tags:
+        pairs = " OR ".join("(kind = ? AND tag = ?)" for _ in tags)
+        conditions.append(f"id IN (SELECT place_id FROM place_tags WHERE {pairs})")
+        for kind, tag in tags:
+            params.extend((kind, tag))
+    if not conditions:
+        return "0", []
+    return f"({' OR '.join(conditions)})", params
+
 
 def get_occasion_places(
     conn: sqlite3.Connection,
@@ -32,41 +100,7 @@ def get_occasion_places(
     if cached:
         return cached
 
-    keywords = get_precomputed("occasion_keywords") or {}
-    kw_list = keywords.get(occasion_type, [])
-    categories = OCCASION_CATEGORIES.get(occasion_type, [])
-
-    if not kw_list and not categories:
-        return [], 0
-
-    # Build query: match perfect_for keywords OR audience OR category
-    conditions = []
-    params: list = []
-
-    for kw in kw_list:
-        conditions.append("perfect_for LIKE ?")
-        params.append(f"%{kw}%")
-        conditions.append("audience LIKE ?")
-        params.append(f"%{kw}%")
-
-    for cat in categories:
-        conditions.append("category = ?")
-        params.append(cat)
-
-    where = " OR ".join(conditions)
-
-    count_row = conn.execute(
-        f"SELECT COUNT(*) as cnt FROM places WHERE {where}", params
-    ).fetchone()
-    total = count_row["cnt"] if count_row else 0
-
-    rows = conn.execute(
-        f"""SELECT * FROM places WHERE {where}
-        ORDER BY google_rating DESC
-        LIMIT ? OFFSET ?""",
-        params + [limit, offset],
-    ).fetchall()
-
-    result = [row_to_dict(r) for r in rows]
-    occasion_cache.set(cache_key, (result, total))
-    return result, total
+    ids = get_occasion_ids(occasion_type)
+    result = fetch_places_by_ids(conn, ids[offset : offset + limit])
+    occasion_cache.set(cache_key, (result, len(ids)))
+    return result, len(ids)
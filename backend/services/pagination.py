@@ -0,0 +1,26 @@
+"""Opaque pagination cursors — وين نروح بالرياض."""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from typing import Any
+
+
+def encode_cursor(values: list[Any]) -> str:
+    """Encode the sort key of the last row as an opaque URL-safe token."""
+    raw = json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list[Any]:
+    """Inverse of :func:`encode_cursor`; raises ``ValueError`` on bad input."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("invalid cursor") from e
+    if not isinstance(values, list):
+        raise ValueError("invalid cursor")
+    return values
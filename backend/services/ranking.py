@@ -3,7 +3,12 @@
 from __future__ import annotations
 
 import math
-from typing import Optional
+import sqlite3
+from typing import Iterable, Optional
+
+import numpy as np
+
+from services.geo import EARTH_RADIUS_KM, haversine
 
 
 def score_place(
@@ -27,34 +32,146 @@ def score_place(
 
     distance_score = 0.3  # Default full score if no location
     if user_lat and user_lng and place.get("lat") and place.get("lng"):
-        dist = _haversine(user_lat, user_lng, place["lat"], place["lng"])
+        dist = haversine(user_lat, user_lng, place["lat"], place["lng"])
         # Normalize: 0 km = 1.0, 20+ km = 0.0
         distance_score = max(0, (1.0 - dist / 20.0)) * 0.3
 
     return rating_score + trending_score + new_score + distance_score
 
 
-def _haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    """Haversine distance in km."""
-    R = 6371.0
-    dlat = math.radians(lat2 - lat1)
-    dlng = math.radians(lng2 - lng1)
-    a = (
-        math.sin(dlat / 2) ** 2
-        + math.cos(math.radians(lat1))
-        * math.cos(math.radians(lat2))
-        * math.sin(dlng / 2) ** 2
-    )
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+DEFAULT_WEIGHTS: dict[str, float] = {
+    "rating": 0.4,
+    "trending": 0.2,
+    "new": 0.1,
+    "distance": 0.3,
+}
+
+# Named weight sets a client can rank with (``?profile=nearby``)
+RANKING_PROFILES: dict[str, dict[str, float]] = {
+    "balanced": DEFAULT_WEIGHTS,
+    "nearby": {"rating": 0.2, "trending": 0.05, "new": 0.05, "distance": 0.7},
+    "top_rated": {"rating": 0.7, "trending": 0.1, "new": 0.0, "distance": 0.2},
+    "trending": {"rating": 0.25, "trending": 0.5, "new": 0.05, "distance": 0.2},
+    "new": {"rating": 0.25, "trending": 0.05, "new": 0.5, "distance": 0.2},
+}
+PROFILE_PATTERN = r"^(" + "|".join(RANKING_PROFILES) + r")$"
+
+
+def profile_weights(profile: Optional[str]) -> Optional[dict[str, float]]:
+    """Weights of a ranking profile (``None`` → the defaults)."""
+    return RANKING_PROFILES[profile] if profile else None
+
+
+_DISTANCE_FALLOFF_KM = 20.0
+
+
+class RankingIndex:
+    """Ranking features as contiguous NumPy arrays aligned with place ids.
+
+    Scores any candidate set in one vectorized pass — same formula as
+    :func:`score_place` — and selects the top-k with ``argpartition``.
+    """
+
+    def __init__(self, places: list[dict]):
+        self.ids: list[str] = [p["id"] for p in places]
+        self.positions: dict[str, int] = {pid: i for i, pid in enumerate(self.ids)}
+        self.rating = np.array(
+            [p.get("google_rating") or 0.0 for p in places], dtype=np.float64
+        )
+        self.trending = np.array([bool(p.get("trending")) for p in places], dtype=bool)
+        self.is_new = np.array([bool(p.get("is_new")) for p in places], dtype=bool)
+        lat = np.array([p.get("lat") or np.nan for p in places], dtype=np.float64)
+        lng = np.array([p.get("lng") or np.nan for p in places], dtype=np.float64)
+        self.has_location = ~(np.isnan(lat) | np.isnan(lng))
+        self.lat_rad = np.radians(lat)
+        self.lng_rad = np.radians(lng)
+        self.cos_lat = np.cos(self.lat_rad)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def positions_of(self, ids: Iterable[str]) -> np.ndarray:
+        get = self.positions.get
+        return np.fromiter(
+            (i for i in (get(pid) for pid in ids) if i is not None), dtype=np.intp
+        )
+
+    def scores(
+        self,
+        pos: np.ndarray,
+        user_lat: Optional[float] = None,
+        user_lng: Optional[float] = None,
+        weights: Optional[dict[str, float]] = None,
+    ) -> np.ndarray:
+        w = {**DEFAULT_WEIGHTS, **(weights or {})}
+        score = (self.rating[pos] / 5.0) * w["rating"]
+        score += self.trending[pos] * w["trending"]
+        score += self.is_new[pos] * w["new"]
+
+        distance = np.ones(len(pos))  # full score if no location
+        if user_lat and user_lng:
+            lat1, lng1 = math.radians(user_lat), math.radians(user_lng)
+            a = (
+                np.sin((self.lat_rad[pos] - lat1) / 2) ** 2
+                + math.cos(lat1)
+                * self.cos_lat[pos]
+                * np.sin((self.lng_rad[pos] - lng1) / 2) ** 2
+            )
+            km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+            near = np.clip(1.0 - km / _DISTANCE_FALLOFF_KM, 0.0, None)
+            distance = np.where(self.has_location[pos], near, 1.0)
+        score += distance * w["distance"]
+        return score
+
+    def top_k(
+        self,
+        ids: Optional[Iterable[str]],
+        k: int,
+        offset: int = 0,
+        user_lat: Optional[float] = None,
+        user_lng: Optional[float] = None,
+        weights: Optional[dict[str, float]] = None,
+    ) -> list[str]:
+        """Ids ranked ``offset .. offset+k`` among ``ids`` (all places if None)."""
+        pos = np.arange(len(self.ids)) if ids is None else self.positions_of(ids)
+        if not len(pos) or k <= 0:
+            return []
+        score = self.scores(pos, user_lat, user_lng, weights)
+        n = min(offset + k, len(pos))
+        if n < len(pos):
+            head = np.argpartition(-score, n - 1)[:n]
+        else:
+            head = np.arange(len(pos))
+        order = head[np.argsort(-score[head], kind="stable")][offset:n]
+        return [self.ids[i] for i in pos[order]]
+
+
+_index: Optional[RankingIndex] = None
+
+
+def build_ranking_index(conn: sqlite3.Connection) -> RankingIndex:
+    """(Re)build the global ranking arrays from the places table."""
+    global _index
+    rows = conn.execute(
+        "SELECT id, google_rating, trending, is_new, lat, lng FROM places"
+    ).fetchall()
+    _index = RankingIndex([dict(r) for r in rows])
+    return _index
+
+
+def get_ranking_index() -> Optional[RankingIndex]:
+    return _index
 
 
 def rank_places(
     places: list[dict],
     user_lat: Optional[float] = None,
     user_lng: Optional[float] = None,
+    weights: Optional[dict[str, float]] = None,
 ) -> list[dict]:
     """Sort places by composite score (descending)."""
-    scored = [(p, score_place(p, user_lat, user_lng)) for p in places]
-    scored.sort(key=lambda x: x[1], reverse=True)
-    return [p for p, _ in scored]
+    if not places:
+        return []
+    index = RankingIndex(places)
+    score = index.scores(np.arange(len(places)), user_lat, user_lng, weights)
+    return [places[i] for i in np.argsort(-score, kind="stable")]
@@ -2,46 +2,14 @@
 
 from __future__ import annotations
 
-import re
+import html
 import sqlite3
 from typing import Optional
 
-from database import row_to_dict
-
-
-# ── Arabic Normalization ────────────────────────────────────────────
-
-# Hamza normalization: إأآا → ا
-_HAMZA_MAP = str.maketrans({
-    "\u0622": "\u0627",  # آ → ا
-    "\u0623": "\u0627",  # أ → ا
-    "\u0625": "\u0627",  # إ → ا
-    "\u0671": "\u0627",  # ٱ → ا
-})
-
-# Tashkeel (diacritics) pattern
-_TASHKEEL = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06DC\u06DF-\u06E4\u06E7-\u06E8\u06EA-\u06ED]")
-
-# Tatweel (kashida)
-_TATWEEL = re.compile(r"\u0640")
-
-# Final ة → ه  (optional, helps matching)
-_TAA_MARBUTA = str.maketrans({"\u0629": "\u0647"})
-
-# Remove extra whitespace
-_MULTI_SPACE = re.compile(r"\s+")
-
-
-def normalize_arabic(text: str) -> str:
-    """Normalize Arabic text for search matching."""
-    if not text:
-        return ""
-    text = text.translate(_HAMZA_MAP)
-    text = _TASHKEEL.sub("", text)
-    text = _TATWEEL.sub("", text)
-    text = text.translate(_TAA_MARBUTA)
-    text = _MULTI_SPACE.sub(" ", text).strip()
-    return text
+from cache import search_cache
+from database import fetch_places_by_ids
+from normalization import normalize_arabic
+from services.fuzzy import get_fuzzy_index
 
 
 def build_fts_query(query: str) -> str:
@@ -68,69 +36,228 @@ def build_fts_query(query: str) -> str:
     return " AND ".join(parts)
 
 
+# Matches kept per query; also the largest total a search reports
+SEARCH_ID_CAP = 1000
+
+# bm25() weight per places_fts column (id is UNINDEXED); a hit in the name
+# must outrank a passing mention in the description
+COLUMN_WEIGHTS: dict[str, float] = {
+    "name_ar": 10.0,
+    "name_en": 8.0,
+    "description_ar": 1.0,
+    "tags": 3.0,
+    "category": 2.0,
+    "neighborhood": 2.0,
+}
+
+# How much rating / review volume lift text relevance (multiplicative)
+BLEND_WEIGHTS: dict[str, float] = {
+    "rating": 0.3,
+    "reviews": 0.2,
+}
+
+# Match markers inside SQLite; swapped for <mark> after escaping
+_MARK_OPEN, _MARK_CLOSE, _ELLIPSIS = "\x02", "\x03", "\x04"
+SNIPPET_TOKENS = 16
+
+
 def search_places(
     conn: sqlite3.Connection,
     query: str,
     limit: int = 20,
     offset: int = 0,
+    fuzzy: bool = False,
 ) -> tuple[list[dict], int]:
-    """Full-text search using FTS5 with Arabic normalization."""
+    """Full-text search using FTS5 with Arabic normalization.
+
+    The ranked id list is computed once per normalized query and cached,
+    so the total is its length and any page is a slice plus one id lookup.
+    With ``fuzzy``, typo-tolerant name matches are appended after the
+    exact matches.
+    """
+    ids = search_place_ids(conn, query)
+    if fuzzy:
+        ids = blend_fuzzy(ids, query)
+    return fetch_places_by_ids(conn, list(ids[offset : offset + limit])), len(ids)
+
+
+def search_place_ids(conn: sqlite3.Connection, query: str) -> tuple[str, ...]:
+    """IDs of every match (up to ``SEARCH_ID_CAP``) in relevance order.
+
+    One FTS ``MATCH`` per query; only when it finds nothing does the
+    trigram substring index run. Cached per normalized query.
+    """
     fts_query = build_fts_query(query)
     if not fts_query:
-        return [], 0
+        return ()
+    cached = search_cache.get(fts_query)
+    if cached is not None:
+        return cached
 
-    # Count total
-    count_row = conn.execute(
-        "SELECT COUNT(*) as cnt FROM places_fts WHERE places_fts MATCH ?",
-        (fts_query,),
-    ).fetchone()
-    total = count_row["cnt"] if count_row else 0
+    ids = _ranked_fts_ids(conn, fts_query)
+    if not ids:
+        where, params = _substring_filter(normalize_arabic(query))
+        rows = conn.execute(
+            f"""SELECT p.id FROM places p
+            INNER JOIN places_trigram t ON p.id = t.id
+            WHERE {where}
+            ORDER BY p.google_rating DESC
+            LIMIT ?""",
+            params + [SEARCH_ID_CAP],
+        ).fetchall()
+        ids = tuple(r["id"] for r in rows)
 
-    if total == 0:
-        # Fallback: LIKE search on original text
-        return _fallback_search(conn, query, limit, offset)
+    search_cache.set(fts_query, ids)
+    return ids
 
-    # Fetch matching IDs from FTS, then join with main table
-    rows = conn.execute(
-        """SELECT p.* FROM places p
-        INNER JOIN places_fts fts ON p.id = fts.id
-        WHERE places_fts MATCH ?
-        ORDER BY rank
-        LIMIT ? OFFSET ?""",
-        (fts_query, limit, offset),
-    ).fetchall()
 
-    results = [row_to_dict(r) for r in rows]
-    return results, total
+def _ranked_fts_ids(conn: sqlite3.Connection, fts_query: str) -> tuple[str, ...]:
+    """FTS matches ordered by column-weighted BM25 blended with popularity.
 
+    ``bm25()`` is negative (lower is better), so relevance is its negation,
+    scaled up by rating and by review count on a log scale relative to the
+    most-reviewed place. The whole score is computed in SQL so SQLite can
+    keep just the top ``SEARCH_ID_CAP`` while scanning the matches.
+    """
+    weights = ", ".join(str(float(w)) for w in COLUMN_WEIGHTS.values())
+    rows = conn.execute(
+        f"""SELECT f.id
+        FROM places_fts f
+        INNER JOIN places p ON p.id = f.id
+        WHERE places_fts MATCH ?1
+        ORDER BY -bm25(places_fts, 0, {weights}) * (
+            1.0 + ?2 * COALESCE(p.google_rating, 0) / 5.0
+                + ?3 * ln(1 + COALESCE(p.review_count, 0)) / (
+                    SELECT COALESCE(NULLIF(ln(1 + MAX(review_count)), 0), 1.0) FROM places
+                )
+        ) DESC
+        LIMIT ?4""",
+        (fts_query, BLEND_WEIGHTS["rating"], BLEND_WEIGHTS["reviews"], SEARCH_ID_CAP),
+    ).fetchall()
+    return tuple(r["id"] for r in rows)
 
-def _fallback_search(
-    conn: sqlite3.Connection,
-    query: str,
-    limit: int,
-    offset: int,
-) -> tuple[list[dict], int]:
-    """Fallback LIKE search when FTS doesn't match."""
-    normalized = normalize_arabic(query)
-    like_pattern = f"%{normalized}%"
 
-    count_row = conn.execute(
-        """SELECT COUNT(*) as cnt FROM places
-        WHERE name_ar LIKE ? OR name_en LIKE ?
-        OR description_ar LIKE ? OR category LIKE ?
-        OR neighborhood LIKE ?""",
-        (like_pattern, like_pattern, like_pattern, like_pattern, like_pattern),
-    ).fetchone()
-    total = count_row["cnt"] if count_row else 0
+def highlight_places(conn: sqlite3.Connection, query: str, places: list[dict]) -> list[dict]:
+    """Attach ``highlights`` (names) and a description ``snippet`` to a page.
 
+    SQLite's ``highlight()``/``snippet()`` mark the normalized text held in
+    ``places_fts``; the marks are projected back onto the original text so
+    clients show what they stored, with diacritics and all. Only the rows
+    of the current page are touched.
+    """
+    fts_query = build_fts_query(query)
+    if not fts_query or not places:
+        return places
+    marks = f"'{_MARK_OPEN}', '{_MARK_CLOSE}'"
+    placeholders = ",".join("?" * len(places))
     rows = conn.execute(
-        """SELECT * FROM places
-        WHERE name_ar LIKE ? OR name_en LIKE ?
-        OR description_ar LIKE ? OR category LIKE ?
-        OR neighborhood LIKE ?
-        ORDER BY google_rating DESC
-        LIMIT ? OFFSET ?""",
-        (like_pattern, like_pattern, like_pattern, like_pattern, like_pattern, limit, offset),
+        f"""SELECT id,
+               highlight(places_fts, 1, {marks}) AS name_ar,
+               highlight(places_fts, 2, {marks}) AS name_en,
+               snippet(places_fts, 3, {marks}, '{_ELLIPSIS}', {SNIPPET_TOKENS}) AS description_ar
+        FROM places_fts
+        WHERE places_fts MATCH ? AND id IN ({placeholders})""",
+        [fts_query] + [p["id"] for p in places],
     ).fetchall()
+    by_id = {r["id"]: r for r in rows}
+
+    for place in places:
+        row = by_id.get(place["id"])
+        if row is None:  # fuzzy / substring match: nothing to mark
+            continue
+        place["highlights"] = {
+            field: _project_marks(place.get(field) or "", row[field])
+            for field in ("name_ar", "name_en")
+            if _MARK_OPEN in (row[field] or "")
+        }
+        if _MARK_OPEN in (row["description_ar"] or ""):
+            place["snippet"] = _project_marks(
+                place.get("description_ar") or "", row["description_ar"]
+            )
+    return places
+
+
+def _project_marks(original: str, marked: str) -> str:
+    """Re-apply marks made on normalized text to ``original``.
+
+    ``normalize_arabic`` only maps letters one-to-one or drops characters
+    (tashkeel, tatweel, repeated spaces), so normalized text is an in-order
+    subsequence of the original and a greedy walk aligns the two.
+    """
+    lead = marked.startswith(_ELLIPSIS)
+    trail = marked.endswith(_ELLIPSIS) and len(marked) > 1
+    fragment = marked.strip(_ELLIPSIS)
+
+    plain, spans, inside = [], [], None
+    for ch in fragment:
+        if ch == _MARK_OPEN:
+            inside = len(plain)
+        elif ch == _MARK_CLOSE and inside is not None:
+            spans.append((inside, len(plain)))
+            inside = None
+        else:
+            plain.append(ch)
+    plain = "".join(plain)
 
-    return [row_to_dict(r) for r in rows], total
+    normalized = normalize_arabic(original)
+    base = normalized.find(plain)
+    if base < 0:  # index out of step with the table: show normalized text
+        original, normalized, base = plain, plain, 0
+
+    # positions[j] = index in ``original`` of the j-th normalized character
+    positions: list[int] = []
+    for i, ch in enumerate(original):
+        if len(positions) == len(normalized):
+            break
+        target = normalized[len(positions)]
+        if normalize_arabic(ch) == target or (ch.isspace() and target == " "):
+            positions.append(i)
+    if len(positions) < len(normalized):
+        original, positions = normalized, list(range(len(normalized)))
+
+    def at(j: int) -> int:
+        return positions[j] if j < len(positions) else len(original)
+
+    def after(j: int) -> int:
+        # end of the j-th character, including trailing tashkeel / tatweel
+        i = at(j) + 1
+        while i < len(original) and not original[i].isspace() and not normalize_arabic(original[i]):
+            i += 1
+        return i
+
+    start = at(base)
+    end = after(base + len(plain) - 1) if plain else start
+    out, cursor = [], start
+    for s, e in spans:
+        s, e = at(base + s), after(base + e - 1)
+        out.append(html.escape(original[cursor:s]))
+        out.append("<mark>" + html.escape(original[s:e]) + "</mark>")
+        cursor = e
+    out.append(html.escape(original[cursor:end]))
+    return ("…" if lead else "") + "".join(out) + ("…" if trail else "")
+
+
+def blend_fuzzy(ids: tuple[str, ...], query: str) -> tuple[str, ...]:
+    """Append fuzzy name matches that exact search didn't find."""
+    index = get_fuzzy_index()
+    if index is None:
+        return ids
+    seen = set(ids)
+    return ids + tuple(pid for pid in index.search(query) if pid not in seen)
+
+
+# Columns of the trigram table, all holding normalized text
+_TRIGRAM_COLUMNS = ("name_ar", "name_en", "description_ar", "category", "neighborhood")
+
+
+def _substring_filter(normalized: str) -> tuple[str, list]:
+    """WHERE clause for a substring match served by ``places_trigram``.
+
+    The trigram tokenizer needs at least three characters; shorter queries
+    fall back to LIKE over the (small, normalized) trigram columns.
+    """
+    if len(normalized) >= 3:
+        return "places_trigram MATCH ?", ['"' + normalized.replace('"', '""') + '"']
+    pattern = f"%{normalized}%"
+    where = " OR ".join(f"t.{col} LIKE ?" for col in _TRIGRAM_COLUMNS)
+    return f"({where})", [pattern] * len(_TRIGRAM_COLUMNS)
@@ -0,0 +1,179 @@
+"""Prefix autocomplete over names, neighborhoods and categories — وين نروح بالرياض."""
+
+from __future__ import annotations
+
+import bisect
+import heapq
+import re
+import sqlite3
+from typing import Optional
+
+from normalization import normalize_arabic
+
+_WORD_START = re.compile(r"(?:^|\s)(?=\S)")
+
+# How many neighborhood / category suggestions to show ahead of places
+MAX_GROUP_SUGGESTIONS = 3
+# Largest ``limit`` the endpoint accepts
+MAX_SUGGESTIONS = 20
+# Prefixes matching more keys than this get their ranking precomputed
+HEAVY_PREFIX_KEYS = 256
+
+
+def suggest_key(text: str) -> str:
+    """Normalized form prefixes and names are compared in."""
+    return normalize_arabic(text).lower()
+
+
+def _word_suffixes(text: str) -> list[str]:
+    """The text from each word start on: "cafe olaya" → [cafe olaya, olaya]."""
+    return [text[m.end():] for m in _WORD_START.finditer(text)]
+
+
+class SuggestIndex:
+    """Sorted-array prefix index.
+
+    Every indexed string (and each of its word suffixes, so a prefix can
+    match mid-name) is a key in one sorted list; a prefix maps to a
+    contiguous ``bisect`` range whose targets are ranked by weight.
+    Short, common prefixes ("م", "كا") cover a large part of the catalog,
+    so every prefix whose range exceeds ``HEAVY_PREFIX_KEYS`` has its top
+    suggestions ranked once at build time instead of on each request.
+    """
+
+    def __init__(
+        self,
+        places: list[dict],
+        neighborhoods: list[dict],
+        categories: list[dict],
+    ):
+        self.targets: list[dict] = []
+        self.weights: list[float] = []
+        pairs: list[tuple[str, int]] = []
+
+        def add(target: dict, weight: float, *texts: Optional[str]) -> None:
+            idx = len(self.targets)
+            self.targets.append(target)
+            self.weights.append(weight)
+            keys = set()
+            for text in texts:
+                if text:
+                    keys.update(_word_suffixes(suggest_key(text)))
+            pairs.extend((k, idx) for k in keys)
+
+        for p in places:
+            add(
+                {
+                    "type": "place",
+                    "id": p["id"],
+                    "name_ar": p["name_ar"] or "",
+                    "name_en": p["name_en"],
+                },
+                p.get("google_rating") or 0.0,
+                p["name_ar"], p["name_en"],
+            )
+        for n in neighborhoods:
+            add(
+                {"type": "neighborhood", "id": None, "name_ar": n["name"], "name_en": n["name_en"]},
+                n["place_count"],
+                n["name"], n["name_en"],
+            )
+        for c in categories:
+            add(
+                {"type": "category", "id": None, "name_ar": c["name"], "name_en": c["name_en"]},
+                c["place_count"],
+                c["name"], c["name_en"],
+            )
+
+        pairs.sort()
+        self.keys = [k for k, _ in pairs]
+        self.key_targets = [t for _, t in pairs]
+        self._heavy = self._rank_heavy_prefixes()
+
+    def suggest(self, prefix: str, k: int = 8) -> list[dict]:
+        """Up to ``k`` suggestions: matching neighborhoods/categories, then places.
+
+        Groups take at most ``MAX_GROUP_SUGGESTIONS`` slots (and no more
+        than half of ``k`` while places are there to fill the rest).
+        """
+        p = suggest_key(prefix)
+        if not p or k <= 0:
+            return []
+        ranked = self._heavy.get(p)
+        if ranked is None:
+            lo = bisect.bisect_left(self.keys, p)
+            ranked = self._rank(lo, bisect.bisect_left(self.keys, p + "\U0010ffff", lo))
+        groups, places = ranked
+        n_groups = min(len(groups), MAX_GROUP_SUGGESTIONS, max(k // 2, k - len(places)))
+        picked = groups[:n_groups] + places[: k - n_groups]
+        return [self.targets[i] for i in picked]
+
+    def _rank(self, lo: int, hi: int) -> tuple[list[int], list[int]]:
+        """Best groups and places of the key range ``lo:hi``, by weight."""
+        places, groups = [], []
+        for idx in sorted(set(self.key_targets[lo:hi])):
+            (places if self.targets[idx]["type"] == "place" else groups).append(idx)
+        weight = self.weights.__getitem__
+        return (
+            heapq.nlargest(MAX_GROUP_SUGGESTIONS, groups, key=weight),
+            heapq.nlargest(MAX_SUGGESTIONS, places, key=weight),
+        )
+
+    def _rank_heavy_prefixes(self) -> dict[str, tuple[list[int], list[int]]]:
+        """``_rank`` of every prefix matching more than ``HEAVY_PREFIX_KEYS`` keys.
+
+        Prefixes are grouped one length at a time: a prefix's keys are a
+        run of the sorted list, and only heavy runs are split further at
+        the next length.
+        """
+        heavy: dict[str, tuple[list[int], list[int]]] = {}
+        runs = [(0, len(self.keys))]
+        length = 1
+        while runs:
+            next_runs = []
+            for lo, hi in runs:
+                start = lo
+                while start < hi:
+                    if len(self.keys[start]) < length:  # shorter keys sort first
+                        start += 1
+                        continue
+                    prefix = self.keys[start][:length]
+                    end = bisect.bisect_left(self.keys, prefix + "\U0010ffff", start, hi)
+                    if end - start > HEAVY_PREFIX_KEYS:
+                        heavy[prefix] = self._rank(start, end)
+                        next_runs.append((start, end))
+                    start = end
+            runs = next_runs
+            length += 1
+        return heavy
+
+
+_index: Optional[SuggestIndex] = None
+
+
+def build_suggest_index(conn: sqlite3.Connection) -> SuggestIndex:
+    """(Re)build the global index from the places table."""
+    global _index
+    places = conn.execute(
+        "SELECT id, name_ar, name_en, google_rating FROM places"
+    ).fetchall()
+    neighborhoods = conn.execute(
+        """SELECT neighborhood as name, neighborhood_en as name_en, COUNT(*) as place_count
+        FROM places WHERE neighborhood != ''
+        GROUP BY neighborhood"""
+    ).fetchall()
+    categories = conn.execute(
+        """SELECT category as name, category_en as name_en, COUNT(*) as place_count
+        FROM places WHERE category != ''
+        GROUP BY category"""
+    ).fetchall()
+    _index = SuggestIndex(
+        [dict(r) for r in places],
+        [dict(r) for r in neighborhoods],
+        [dict(r) for r in categories],
+    )
+    return _index
+
+
+def get_suggest_index() -> Optional[SuggestIndex]:
+    return _index
@@ -0,0 +1,269 @@
+"""Offline sync of favorites and lists — وين نروح بالرياض.
+
+A device replays its queued edits as one batch. Each op carries a
+client-generated ``op_id`` (replays of the same op are skipped) and a
+``client_ts``; conflicting edits of the same thing are settled
+last-writer-wins against ``sync_state``, which keeps the newest
+timestamp applied per (device, entity, key) — deletions included, so an
+older add arriving late can't resurrect a removed favorite.
+
+Both records are kept for ``SYNC_RETENTION_DAYS`` (and op ids up to
+``SYNC_OPS_PER_DEVICE`` per device). Ops stamped before that horizon
+count as stale: whatever would have de-duplicated or out-voted them may
+already be pruned.
+"""
+
+from __future__ import annotations
+
+import secrets
+import sqlite3
+import time
+
+SYNC_RETENTION_DAYS = 90
+SYNC_OPS_PER_DEVICE = 5000
+
+# op types that need their places to exist; removals must still go
+# through for places that have left the catalog since
+_REFERENCES_PLACES = {"favorite_add", "list_create", "list_add_place"}
+
+# op type → (entity, whether the op removes it)
+_ENTITIES: dict[str, tuple[str, bool]] = {
+    "favorite_add": ("favorite", False),
+    "favorite_remove": ("favorite", True),
+    "list_create": ("list", False),
+    "list_delete": ("list", True),
+    "list_rename": ("list_name", False),
+    "list_add_place": ("list_place", False),
+    "list_remove_place": ("list_place", True),
+}
+
+
+def apply_sync(conn: sqlite3.Connection, device_id: str, ops: list[dict]) -> dict:
+    """Apply ``ops`` in one write transaction; returns counters.
+
+    The transaction is opened ``IMMEDIATE`` before the op-id and clock
+    reads, so with several workers the checks and the writes of one batch
+    are serialized against any other writer. The caller commits.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    rejected: list[str] = []
+    fresh: list[dict] = []
+    seen_ids: set[str] = set()
+    duplicates = 0
+
+    known = _known_op_ids(conn, device_id, [op["op_id"] for op in ops])
+    for op in ops:
+        if op["op_id"] in known or op["op_id"] in seen_ids:
+            duplicates += 1
+            continue
+        seen_ids.add(op["op_id"])
+        key = _key(op)
+        if key is None:
+            rejected.append(op["op_id"])
+            continue
+        fresh.append({**op, "entity": _ENTITIES[op["type"]][0], "key": key})
+
+    # Adds that reference places we don't have are rejected up front
+    def refs(op: dict) -> list[str]:
+        if op["type"] not in _REFERENCES_PLACES:
+            return []
+        return ([op["place_id"]] if op.get("place_id") else []) + list(op.get("place_ids") or [])
+
+    existing = _existing_places(conn, {pid for op in fresh for pid in refs(op)})
+    valid = []
+    for op in fresh:
+        if all(pid in existing for pid in refs(op)):
+            valid.append(op)
+        else:
+            rejected.append(op["op_id"])
+
+    # Last writer wins: newest op per key, and only if not older than state
+    # (or than the retention horizon, past which state may be pruned)
+    horizon = int((time.time() - SYNC_RETENTION_DAYS * 86400) * 1000)
+    clocks = {
+        (r["entity"], r["key"]): r["client_ts"]
+        for r in conn.execute(
+            "SELECT entity, key, client_ts FROM sync_state WHERE device_id = ?", (device_id,)
+        )
+    }
+    winners: dict[tuple[str, str], dict] = {}
+    for op in sorted(valid, key=lambda o: o["client_ts"]):  # stable: batch order breaks ties
+        winners[(op["entity"], op["key"])] = op
+    winners = {
+        k: op for k, op in winners.items() if op["client_ts"] >= max(clocks.get(k, -1), horizon)
+    }
+    applied = list(winners.values())
+
+    _write(conn, device_id, applied)
+    conn.executemany(
+        """INSERT INTO sync_state (device_id, entity, key, client_ts, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (device_id, entity, key) DO UPDATE
+        SET client_ts = excluded.client_ts, updated_at = excluded.updated_at""",
+        [(device_id, op["entity"], op["key"], op["client_ts"]) for op in applied],
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO sync_ops (device_id, op_id) VALUES (?, ?)",
+        [(device_id, op["op_id"]) for op in valid],
+    )
+    prune_sync_history(conn, device_id)
+    return {
+        "applied": len(applied),
+        "duplicates": duplicates,
+        "stale": len(valid) - len(applied),
+        "rejected": rejected,
+    }
+
+
+def prune_sync_history(conn: sqlite3.Connection, device_id: str | None = None) -> int:
+    """Drop op ids and clocks past retention (one device, or all); returns rows removed."""
+    where, params = ("device_id = ? AND ", [device_id]) if device_id else ("", [])
+    cutoff = f"-{SYNC_RETENTION_DAYS} days"
+    removed = conn.execute(
+        f"DELETE FROM sync_ops WHERE {where}applied_at < datetime('now', ?)", params + [cutoff]
+    ).rowcount
+    removed += conn.execute(
+        f"DELETE FROM sync_state WHERE {where}updated_at < datetime('now', ?)", params + [cutoff]
+    ).rowcount
+    # Cap per device: keep the newest op ids
+    devices = [
+        r["device_id"] for r in conn.execute(
+            f"""SELECT device_id FROM sync_ops {'WHERE device_id = ?' if device_id else ''}
+            GROUP BY device_id HAVING COUNT(*) > ?""",
+            params + [SYNC_OPS_PER_DEVICE],
+        )
+    ]
+    for device in devices:
+        removed += conn.execute(
+            """DELETE FROM sync_ops WHERE device_id = ?1 AND op_id NOT IN (
+                SELECT op_id FROM sync_ops WHERE device_id = ?1
+                ORDER BY applied_at DESC LIMIT ?2)""",
+            (device, SYNC_OPS_PER_DEVICE),
+        ).rowcount
+    return removed
+
+
+def device_state(conn: sqlite3.Connection, device_id: str) -> dict:
+    """Compact favorites + lists of a device (ids only)."""
+    favorites = [
+        r["place_id"]
+        for r in conn.execute(
+            """SELECT place_id FROM favorites WHERE device_id = ?
+            ORDER BY created_at DESC, rowid DESC""",
+            (device_id,),
+        )
+    ]
+    lists: dict[str, dict] = {}
+    rows = conn.execute(
+        """SELECT l.id, l.name, l.share_code, lp.place_id
+        FROM lists l
+        LEFT JOIN list_places lp ON lp.list_id = l.id
+        WHERE l.device_id = ?
+        ORDER BY l.created_at DESC, l.id, lp.position""",
+        (device_id,),
+    ).fetchall()
+    for r in rows:
+        entry = lists.setdefault(
+            r["id"],
+            {"id": r["id"], "name": r["name"], "share_code": r["share_code"], "place_ids": []},
+        )
+        if r["place_id"] is not None:
+            entry["place_ids"].append(r["place_id"])
+    return {"device_id": device_id, "favorites": favorites, "lists": list(lists.values())}
+
+
+def _key(op: dict) -> str | None:
+    """LWW key of an op, or None if it lacks the fields its type needs."""
+    kind = op["type"]
+    if kind.startswith("favorite_"):
+        return op.get("place_id") or None
+    if not op.get("list_id"):
+        return None
+    if kind in ("list_add_place", "list_remove_place"):
+        return f"{op['list_id']}/{op['place_id']}" if op.get("place_id") else None
+    if kind in ("list_create", "list_rename") and not op.get("name"):
+        return None
+    return op["list_id"]
+
+
+def _known_op_ids(conn: sqlite3.Connection, device_id: str, op_ids: list[str]) -> set[str]:
+    if not op_ids:
+        return set()
+    placeholders = ",".join("?" * len(op_ids))
+    rows = conn.execute(
+        f"SELECT op_id FROM sync_ops WHERE device_id = ? AND op_id IN ({placeholders})",
+        [device_id, *op_ids],
+    )
+    return {r["op_id"] for r in rows}
+
+
+def _existing_places(conn: sqlite3.Connection, place_ids: set[str]) -> set[str]:
+    if not place_ids:
+        return set()
+    ids = list(place_ids)
+    placeholders = ",".join("?" * len(ids))
+    rows = conn.execute(f"SELECT id FROM places WHERE id IN ({placeholders})", ids)
+    return {r["id"] for r in rows}
+
+
+def _write(conn: sqlite3.Connection, device_id: str, ops: list[dict]) -> None:
+    """Apply winning ops grouped by statement, one ``executemany`` each.
+
+    Order: list creates and renames, then list entries, then list
+    deletes (which also drop entries), so a list deleted in the same
+    batch ends up gone whatever the other ops did to it.
+    """
+    by_type: dict[str, list[dict]] = {}
+    for op in ops:
+        by_type.setdefault(op["type"], []).append(op)
+
+    def get(kind: str) -> list[dict]:
+        return by_type.get(kind, [])
+
+    conn.executemany(
+        "INSERT OR IGNORE INTO favorites (device_id, place_id) VALUES (?, ?)",
+        [(device_id, op["place_id"]) for op in get("favorite_add")],
+    )
+    conn.executemany(
+        "DELETE FROM favorites WHERE device_id = ? AND place_id = ?",
+        [(device_id, op["place_id"]) for op in get("favorite_remove")],
+    )
+
+    creates = get("list_create")
+    conn.executemany(
+        "INSERT OR IGNORE INTO lists (id, name, device_id, share_code) VALUES (?, ?, ?, ?)",
+        [(op["list_id"], op["name"], device_id, secrets.token_urlsafe(8)) for op in creates],
+    )
+    conn.executemany(
+        "UPDATE lists SET name = ? WHERE id = ? AND device_id = ?",
+        [(op["name"], op["list_id"], device_id) for op in get("list_rename")],
+    )
+
+    # Entries only go into lists this device owns
+    entries = [
+        (op["list_id"], pid, i)
+        for op in creates
+        for i, pid in enumerate(op.get("place_ids") or [])
+    ]
+    entries += [(op["list_id"], op["place_id"], None) for op in get("list_add_place")]
+    conn.executemany(
+        """INSERT OR IGNORE INTO list_places (list_id, place_id, position)
+        SELECT ?1, ?2, COALESCE(?3, (SELECT COALESCE(MAX(position) + 1, 0)
+                                     FROM list_places WHERE list_id = ?1))
+        WHERE EXISTS (SELECT 1 FROM lists WHERE id = ?1 AND device_id = ?4)""",
+        [(list_id, pid, pos, device_id) for list_id, pid, pos in entries],
+    )
+    conn.executemany(
+        """DELETE FROM list_places WHERE list_id = ? AND place_id = ?
+        AND EXISTS (SELECT 1 FROM lists WHERE id = list_id AND device_id = ?)""",
+        [(op["list_id"], op["place_id"], device_id) for op in get("list_remove_place")],
+    )
+
+    deletes = [(op["list_id"], device_id) for op in get("list_delete")]
+    conn.executemany(
+        """DELETE FROM list_places WHERE list_id = ?1
+        AND EXISTS (SELECT 1 FROM lists WHERE id = ?1 AND device_id = ?2)""",
+        deletes,
+    )
+    conn.executemany("DELETE FROM lists WHERE id = ? AND device_id = ?", deletes)
@@ -0,0 +1,142 @@
+"""Memory-mapped snapshot of pre-computed views — وين نروح بالرياض.
+
+The views are built once per data version into a read-only file next to
+the database. Every uvicorn worker maps the same file, so the pages are
+shared through the OS page cache instead of being copied per process, and
+a restarted worker attaches to the existing file without rebuilding.
+
+Layout::
+
+    MAGIC (8 bytes) | header length (uint32 LE) | header JSON | blobs...
+
+The header maps each view key to ``[offset, length]`` of its JSON blob
+and records the ``version`` it was built for: the data version plus the
+view schema (see ``cache.VIEWS_SCHEMA``), which is also in the file name.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+MAGIC = b"WNRSNAP1"
+_HEADER_LEN = struct.Struct("<I")
+
+
+class Snapshot:
+    """Read-only view over a snapshot file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[: len(MAGIC)] != MAGIC:
+            self._mm.close()
+            raise ValueError(f"not a views snapshot: {path}")
+        start = len(MAGIC) + _HEADER_LEN.size
+        (header_len,) = _HEADER_LEN.unpack_from(self._mm, len(MAGIC))
+        header = json.loads(self._mm[start : start + header_len])
+        self.version: str = header["version"]
+        self._index: dict[str, list[int]] = header["keys"]
+        self._view = memoryview(self._mm)
+
+    def raw(self, key: str) -> Optional[memoryview]:
+        """Zero-copy slice of the JSON blob for ``key``."""
+        loc = self._index.get(key)
+        if loc is None:
+            return None
+        offset, length = loc
+        return self._view[offset : offset + length]
+
+    def get(self, key: str) -> Any:
+        blob = self.raw(key)
+        if blob is None:
+            return None
+        return json.loads(bytes(blob))
+
+    def keys(self) -> list[str]:
+        return list(self._index)
+
+    def close(self) -> None:
+        self._view.release()
+        self._mm.close()
+
+
+def snapshot_path(db_path: Path, version: str) -> Path:
+    return db_path.with_name(f"{db_path.stem}.views-{version}.snap")
+
+
+def write_snapshot(path: Path, version: str, views: dict[str, Any]) -> None:
+    """Serialize ``views`` and atomically move the file into place."""
+    blobs = [
+        (key, json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode())
+        for key, value in views.items()
+    ]
+
+    # Offsets depend on the header length, which depends on the offsets;
+    # iterate until the header size is stable (two passes in practice).
+    header_len = 0
+    while True:
+        offset = len(MAGIC) + _HEADER_LEN.size + header_len
+        index: dict[str, list[int]] = {}
+        for key, blob in blobs:
+            index[key] = [offset, len(blob)]
+            offset += len(blob)
+        header = json.dumps({"version": version, "keys": index}, ensure_ascii=False).encode()
+        if len(header) == header_len:
+            break
+        header_len = len(header)
+
+    tmp = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LEN.pack(len(header)))
+        f.write(header)
+        for _, blob in blobs:
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_or_build(
+    db_path: Path,
+    version: str,
+    build: Callable[[], dict[str, Any]],
+) -> Snapshot:
+    """Attach to the snapshot for ``version``, building it first if needed.
+
+    Concurrent workers serialize on a lock file, so only the first one
+    runs ``build``; the rest wait and then map the finished file.
+    """
+    path = snapshot_path(db_path, version)
+    if path.exists():
+        snapshot = Snapshot(path)
+        if snapshot.version == version:
+            return snapshot
+
+    lock_path = db_path.with_name(f"{db_path.stem}.views.lock")
+    with open(lock_path, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not path.exists() or Snapshot(path).version != version:
+                write_snapshot(path, version, build())
+                _remove_stale(db_path, keep=path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return Snapshot(path)
+
+
+def _remove_stale(db_path: Path, keep: Path) -> None:
+    # Workers still mapping an old file keep their pages until they reattach.
+    for old in db_path.parent.glob(f"{db_path.stem}.views-*.snap"):
+        if old != keep:
+            try:
+                old.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,51 @@
+"""Shared fixtures for the backend tests — وين نروح بالرياض."""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A fresh user DB + empty catalog in ``tmp_path``; yields the writer."""
+    conn = database.init_db(tmp_path / "places.db", pool_size=2)
+    yield conn
+    database.close_db()
+
+
+@pytest.fixture
+def add_places(db):
+    """Insert places into the attached catalog and index them."""
+
+    def add(*places: dict) -> None:
+        for place in places:
+            database.insert_place(db, place)
+        database.rebuild_tags(db)
+        database.rebuild_fts(db)
+        database.rebuild_spatial_index(db)
+        db.commit()
+
+    return add
+
+
+def make_place(pid: str, **overrides) -> dict:
+    """A minimal place dict as found in places.json."""
+    place = {
+        "id": pid,
+        "name_ar": f"مكان {pid}",
+        "name_en": f"Place {pid}",
+        "category": "كافيه",
+        "neighborhood": "العليا",
+        "google_rating": 4.2,
+        "lat": 24.7,
+        "lng": 46.7,
+    }
+    place.update(overrides)
+    return place
@@ -0,0 +1,28 @@
+"""Pre-encoded responses: every variant says it varies on Accept-Encoding."""
+
+from __future__ import annotations
+
+from starlette.requests import Request
+
+from cache import encode_response, encoded_response
+
+
+def _request(**headers: str) -> Request:
+    raw = [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "headers": raw})
+
+
+def test_vary_is_sent_on_every_variant():
+    big = encode_response(dict, {"x": "y" * 1000})
+    small = encode_response(dict, {"x": "y"})
+    assert big.gzip_body is not None and small.gzip_body is None
+
+    responses = [
+        encoded_response(_request(accept_encoding="gzip"), big),
+        encoded_response(_request(accept_encoding="identity"), big),
+        encoded_response(_request(accept_encoding="gzip"), small),
+        encoded_response(_request(if_none_match=big.etag), big),
+    ]
+    assert [r.headers.get("content-encoding") for r in responses] == ["gzip", None, None, None]
+    assert responses[-1].status_code == 304
+    assert all(r.headers["vary"] == "Accept-Encoding" for r in responses)
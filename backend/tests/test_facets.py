@@ -0,0 +1,42 @@
+"""Bitmap facet index: matching and paging set bits in rank order."""
+
+from __future__ import annotations
+
+import random
+
+from services.facets import FacetIndex
+
+
+def _index(n: int) -> FacetIndex:
+    rng = random.Random(7)
+    rows = [
+        {"id": f"p{i}", "category": rng.choice(["مطعم", "كافيه", "حديقة"]),
+         "google_rating": round(5 - i / n * 5, 2), "is_free": i % 3 == 0}
+        for i in range(n)
+    ]
+    return FacetIndex(rows)
+
+
+def _naive(index: FacetIndex, mask: int) -> list[str]:
+    return [pid for i, pid in enumerate(index.ids) if mask >> i & 1]
+
+
+def test_pages_match_a_naive_walk_at_any_depth():
+    index = _index(5000)
+    mask = index.match({"category": ["مطعم", "كافيه"]}, is_free=False)
+    expected = _naive(index, mask)
+    assert index.ids_of(mask) == expected
+    for offset in (0, 1, 999, len(expected) - 5, len(expected), len(expected) + 10):
+        assert index.page(mask, offset, 20) == expected[offset : offset + 20]
+
+
+def test_empty_and_full_masks():
+    index = _index(70)
+    assert index.page(0, 0, 10) == []
+    assert index.ids_of(index.all) == index.ids
+
+
+def test_rating_min_is_a_prefix():
+    index = _index(100)
+    ids = index.ids_of(index.match({}, rating_min=4.0))
+    assert ids == index.ids[: len(ids)] and 0 < len(ids) < 100
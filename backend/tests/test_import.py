@@ -0,0 +1,77 @@
+"""Incremental import: content-hash diff and the changeset it records."""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+
+import pytest
+
+import import_data
+from conftest import make_place
+from database import catalog_path, get_changeset, get_data_version
+
+
+@pytest.fixture
+def run_import(tmp_path):
+    db_path = tmp_path / "places.db"
+    data = tmp_path / "places.json"
+
+    def run(places: list[dict], full: bool = False) -> sqlite3.Connection:
+        data.write_text(json.dumps(places, ensure_ascii=False), encoding="utf-8")
+        assert import_data.main(str(data), str(db_path), full=full) == 0
+        conn = sqlite3.connect(catalog_path(db_path))
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    return run
+
+
+def _rowids(conn: sqlite3.Connection) -> dict[str, int]:
+    return {r["id"]: r["rowid"] for r in conn.execute("SELECT rowid, id FROM places")}
+
+
+def test_changeset_lists_exactly_what_changed(run_import):
+    base = [make_place(f"p{i}") for i in range(5)]
+    conn = run_import(base)
+    assert get_changeset(conn) is None  # full build
+    first_version, rowids = get_data_version(conn), _rowids(conn)
+    conn.close()
+
+    edited = [p for p in base if p["id"] != "p4"]
+    edited[1] = {**edited[1], "name_ar": "اسم جديد"}
+    edited.append(make_place("p9"))
+    conn = run_import(edited)
+
+    changeset = get_changeset(conn)
+    assert changeset["base"] == first_version
+    assert changeset["counts"] == {"inserted": 1, "updated": 1, "deleted": 1}
+    assert changeset["ids"] == {"inserted": ["p9"], "updated": ["p1"], "deleted": ["p4"]}
+    # unchanged and updated rows keep their rowids (R*Tree is keyed by them)
+    assert all(_rowids(conn)[pid] == rowids[pid] for pid in ("p0", "p1", "p2", "p3"))
+    # indexes follow the changes
+    fts = {r[0] for r in conn.execute("SELECT id FROM places_fts WHERE places_fts MATCH 'جديد'")}
+    assert fts == {"p1"}
+    assert conn.execute("SELECT COUNT(*) FROM places_rtree").fetchone()[0] == 5
+
+
+def test_repeated_id_counts_as_updated(run_import):
+    run_import([make_place("p1"), make_place("p2")]).close()
+    conn = run_import([make_place("p1"), make_place("p2"), make_place("p1")])
+    assert get_changeset(conn)["ids"]["updated"] == ["p1"]
+
+
+def test_no_changes_keeps_the_live_catalog(run_import, tmp_path):
+    run_import([make_place("p1")]).close()
+    before = catalog_path(tmp_path / "places.db").stat().st_ino
+    run_import([make_place("p1")]).close()
+    assert catalog_path(tmp_path / "places.db").stat().st_ino == before
+
+
+def test_large_changesets_drop_the_ids(run_import, monkeypatch):
+    run_import([make_place("p1")]).close()
+    monkeypatch.setattr(import_data, "CHANGESET_MAX_IDS", 2)
+    conn = run_import([make_place(f"n{i}") for i in range(3)])
+    changeset = get_changeset(conn)
+    assert changeset["ids"] is None
+    assert changeset["counts"] == {"inserted": 3, "updated": 0, "deleted": 1}
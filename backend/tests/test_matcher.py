@@ -0,0 +1,65 @@
+"""Aho-Corasick keyword automaton and the intent matcher built on it."""
+
+from __future__ import annotations
+
+import json
+
+from conftest import make_place
+from services.ai_chat import build_intent_matcher
+from services.matcher import AhoCorasick
+
+
+def _spans(matcher: AhoCorasick, text: str) -> list[tuple[int, int, str]]:
+    return [(m.start, m.end, m.pattern) for m in matcher.find_all(text)]
+
+
+def test_overlapping_and_nested_matches():
+    ac = AhoCorasick()
+    for p in ("he", "she", "his", "hers"):
+        ac.add(p, p)
+    assert _spans(ac, "ushers") == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+
+
+def test_whole_word_rejects_inner_matches_but_allows_clitics():
+    ac = AhoCorasick()
+    ac.add("العليا", "hood", whole_word=True)
+    ac.add("قهوة", "cat")
+    assert [m.value for m in ac.find_all("كافيه بالعليا")] == ["hood"]
+    assert [m.value for m in ac.find_all("والعليا")] == ["hood"]
+    assert ac.find_all("مالعليا") == []
+    assert ac.find_all("العلياء") == []
+    # plain patterns match inside words
+    assert [m.value for m in ac.find_all("القهوةالباردة")] == ["cat"]
+
+
+def test_build_is_idempotent():
+    ac = AhoCorasick()
+    for p in ("a", "ab", "bab"):
+        ac.add(p, p)
+    first = _spans(ac.build(), "abab")
+    assert _spans(ac.build().build(), "abab") == first
+    assert len(ac) == 3
+
+
+def test_add_after_build():
+    ac = AhoCorasick()
+    ac.add("ab", "ab")
+    ac.build()
+    ac.add("b", "b")
+    assert _spans(ac, "ab") == [(0, 2, "ab"), (1, 2, "b")]
+
+
+def test_neighborhoods_without_places_are_not_registered(db, add_places, tmp_path):
+    hoods = tmp_path / "hoods.json"
+    hoods.write_text(json.dumps({"neighborhoods": [
+        {"name_ar": "حي حطين", "name_en": "Hittin"},
+        {"name_ar": "حي بنبان", "name_en": "Banban"},
+    ]}, ensure_ascii=False), encoding="utf-8")
+    add_places(make_place("p1", neighborhood="حي حطين"))
+
+    values = lambda m, text: {v for *_, v in (x.value for x in m.find_all(text))}
+    matcher = build_intent_matcher(hoods, db)
+    assert values(matcher, "حطين") == {"حي حطين"}
+    assert values(matcher, "بنبان") == set()
+    # without a catalog every listed neighborhood is registered
+    assert values(build_intent_matcher(hoods), "بنبان") == {"حي بنبان"}
@@ -0,0 +1,39 @@
+"""Databases from before the catalog split keep their places."""
+
+from __future__ import annotations
+
+import sqlite3
+
+import database
+
+
+def test_legacy_places_move_into_the_catalog(tmp_path):
+    db_path = tmp_path / "places.db"
+    legacy = sqlite3.connect(db_path)
+    legacy.executescript("""
+        CREATE TABLE places (id TEXT PRIMARY KEY, name_ar TEXT, name_en TEXT,
+            category TEXT, neighborhood TEXT, google_rating REAL, lat REAL, lng REAL,
+            tags TEXT, perfect_for TEXT, audience TEXT);
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE VIRTUAL TABLE places_fts USING fts5(id UNINDEXED, name_ar);
+        INSERT INTO places VALUES ('p1', 'كافيه الورد', 'Rose Cafe', 'كافيه', 'حي العليا',
+            4.5, 24.7, 46.7, '["هادي"]', '[]', '[]');
+        INSERT INTO meta VALUES ('data_version', 'legacy-v1');
+    """)
+    legacy.commit()
+    legacy.close()
+
+    conn = database.init_db(db_path, pool_size=1)
+    try:
+        assert conn.execute(
+            "SELECT 1 FROM main.sqlite_master WHERE name = 'places'"
+        ).fetchone() is None
+        assert [r["id"] for r in conn.execute("SELECT id FROM catalog.places")] == ["p1"]
+        assert database.get_data_version(conn) == "legacy-v1"
+        assert conn.execute(
+            "SELECT id FROM places_fts WHERE places_fts MATCH 'الورد'"
+        ).fetchone()["id"] == "p1"
+        assert conn.execute("SELECT COUNT(*) FROM places_rtree").fetchone()[0] == 1
+        assert conn.execute("SELECT tag FROM place_tags").fetchone()["tag"] == "هادي"
+    finally:
+        database.close_db()
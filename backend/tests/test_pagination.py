@@ -0,0 +1,98 @@
+"""Cursor codec and keyset pagination (NULL ratings last)."""
+
+from __future__ import annotations
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from cache import clear_caches
+from conftest import make_place
+from routers.places import _keyset_page, router
+from services.facets import build_facet_index
+from services.pagination import decode_cursor, encode_cursor
+from services.ranking import build_ranking_index
+
+RATINGS = [4.5, None, 3.0, 4.5, None, 5.0, 3.0, None]
+
+
+@pytest.fixture
+def rated(db, add_places):
+    add_places(*(make_place(f"p{i}", google_rating=r) for i, r in enumerate(RATINGS)))
+    clear_caches()
+
+
+@pytest.fixture
+def client(rated, db):
+    build_facet_index(db)
+    build_ranking_index(db)
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("values", [[4.5, "p1"], [None, "مكان"], [0]])
+def test_cursor_round_trip(values):
+    cursor = encode_cursor(values)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == values
+
+
+@pytest.mark.parametrize("bad", ["!!!", encode_cursor([1])[:-1] + "x", "e30"])  # e30 = {}
+def test_bad_cursor_raises_value_error(bad):
+    with pytest.raises(ValueError):
+        decode_cursor(bad)
+
+
+def test_keyset_walk_matches_offset_order(db, rated):
+    expected = [r["id"] for r in db.execute(
+        "SELECT id FROM places ORDER BY google_rating IS NULL, google_rating DESC, id DESC"
+    )]
+    first = db.execute(
+        "SELECT * FROM places ORDER BY google_rating DESC, id DESC LIMIT 1"
+    ).fetchone()
+    seen = [first["id"]]
+    after = [first["google_rating"], first["id"]]
+    while True:
+        rows = _keyset_page(db, [], [], after, 3)
+        if not rows:
+            break
+        seen += [r["id"] for r in rows]
+        after = [rows[-1]["google_rating"], rows[-1]["id"]]
+    assert seen == expected
+    assert seen[-3:] == sorted(
+        (f"p{i}" for i, r in enumerate(RATINGS) if r is None), reverse=True
+    )
+
+
+def test_keyset_pages_over_the_api(client):
+    ids, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/v1/places", params=params).json()
+        ids += [p["id"] for p in body["places"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert len(ids) == len(set(ids)) == len(RATINGS)
+
+
+def test_ranked_listing_pages_by_offset_cursor(client):
+    near = {"lat": 24.7, "lng": 46.7, "limit": 3}
+    first = client.get("/api/v1/places", params=near).json()
+    assert first["total"] == len(RATINGS) and first["next_cursor"]
+    second = client.get("/api/v1/places", params={**near, "cursor": first["next_cursor"]}).json()
+    assert not {p["id"] for p in first["places"]} & {p["id"] for p in second["places"]}
+    untotalled = client.get("/api/v1/places", params={**near, "include_total": False}).json()
+    assert untotalled["total"] is None
+
+
+def test_cursor_kinds_do_not_mix(client):
+    keyset = client.get("/api/v1/places", params={"limit": 3}).json()["next_cursor"]
+    ranked = client.get(
+        "/api/v1/places", params={"limit": 3, "lat": 24.7, "lng": 46.7}
+    ).json()["next_cursor"]
+    assert client.get(
+        "/api/v1/places", params={"cursor": keyset, "lat": 24.7, "lng": 46.7}
+    ).status_code == 400
+    assert client.get("/api/v1/places", params={"cursor": ranked}).status_code == 400
@@ -0,0 +1,58 @@
+"""Ranking profiles reach the listing, search and chat rankings."""
+
+from __future__ import annotations
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from cache import clear_caches
+from conftest import make_place
+from models import ChatRequest
+from routers.places import router
+from services.ai_chat import _query_places
+from services.facets import build_facet_index
+from services.ranking import build_ranking_index, profile_weights
+
+HERE = {"lat": 24.7, "lng": 46.7}
+
+
+@pytest.fixture
+def near_and_far(db, add_places):
+    add_places(
+        make_place("near", google_rating=3.0),
+        make_place("far", google_rating=5.0, lat=24.1, lng=46.1),  # ~90 km away
+    )
+    build_facet_index(db)
+    build_ranking_index(db)
+    clear_caches()
+
+
+def test_profile_reorders_the_ranked_listing(near_and_far):
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+
+    def order(**params):
+        body = client.get("/api/v1/places", params={**HERE, **params}).json()
+        return [p["id"] for p in body["places"]]
+
+    assert order() == ["near", "far"]
+    assert order(profile="top_rated") == ["far", "near"]
+    assert order(profile="nearby") == ["near", "far"]
+    assert client.get("/api/v1/places", params={**HERE, "profile": "x"}).status_code == 422
+
+
+def test_chat_ranks_with_the_requested_profile(db, near_and_far):
+    located = dict(user_lat=HERE["lat"], user_lng=HERE["lng"])
+    default = _query_places(db, "كافيه", None, None, None, **located)
+    top_rated = _query_places(
+        db, "كافيه", None, None, None, **located, weights=profile_weights("top_rated")
+    )
+    assert [p["id"] for p in default] == ["near", "far"]
+    assert [p["id"] for p in top_rated] == ["far", "near"]
+
+    assert ChatRequest(message="هلا", device_id="d", profile="nearby").profile == "nearby"
+    with pytest.raises(ValidationError):
+        ChatRequest(message="هلا", device_id="d", profile="cheapest")
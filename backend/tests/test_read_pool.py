@@ -0,0 +1,99 @@
+"""Read pools across a catalog reload (pool swap + close)."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+import database
+from database import PoolClosed, ReadPool, read_connection
+
+
+def test_closed_pool_refuses_new_borrowers(db):
+    pool = ReadPool(database.DATABASE_PATH, 1)
+    pool.close()
+    with pytest.raises(PoolClosed):
+        pool.acquire()
+
+
+def test_borrowed_connection_closes_when_returned(db):
+    pool = ReadPool(database.DATABASE_PATH, 1)
+    conn = pool.acquire()
+    pool.close()
+    conn.execute("SELECT 1")  # still usable by its borrower
+    pool.release(conn)
+    with pytest.raises(Exception):
+        conn.execute("SELECT 1")
+
+
+def test_waiter_moves_to_the_new_pool_on_reload(db):
+    database.init_db(database.DATABASE_PATH, pool_size=1)
+    got = threading.Event()
+
+    def reader():
+        with read_connection() as conn:
+            conn.execute("SELECT COUNT(*) FROM places").fetchone()
+            got.set()
+
+    with read_connection():  # the only connection is borrowed
+        t = threading.Thread(target=reader, daemon=True)
+        t.start()
+        assert not got.wait(0.2)  # blocked on the old pool
+        database.reload_catalog()
+        assert got.wait(2), "waiter hung on the closed pool"
+    t.join(2)
+
+
+def test_reader_racing_the_swap_does_not_hang(db):
+    database.init_db(database.DATABASE_PATH, pool_size=1)
+    old = database._read_pool
+    old.close()  # closed, nothing borrowed, not replaced yet
+    done = threading.Event()
+
+    def reader():
+        with read_connection():
+            done.set()
+
+    t = threading.Thread(target=reader, daemon=True)
+    t.start()
+    database._read_pool = ReadPool(database.DATABASE_PATH, 1)
+    assert done.wait(2)
+    t.join(2)
+
+
+def test_async_waiter_moves_to_the_new_pool(db):
+    async def scenario():
+        await database.open_async_pool()
+        database.READ_POOL_SIZE = 1
+        await database.open_async_pool()
+        async with database.async_read_connection():
+            waiter = asyncio.create_task(_read_one())
+            await asyncio.sleep(0.05)
+            assert not waiter.done()
+            await database.open_async_pool()
+            await asyncio.wait_for(waiter, 2)
+        await database.close_async_pool()
+
+    async def _read_one():
+        async with database.async_read_connection() as conn:
+            await conn.execute("SELECT 1")
+
+    asyncio.run(scenario())
+
+
+def test_failed_reload_is_retried(db):
+    import os
+
+    catalog = database.catalog_path()
+    copy = catalog.with_name("copy.db")
+    copy.write_bytes(catalog.read_bytes())
+    os.replace(copy, catalog)  # a new file: new inode
+    assert database.catalog_changed()
+
+    stamp = database.reload_catalog()
+    # a failure before mark_catalog_loaded leaves it pending
+    assert database.catalog_changed()
+    database.mark_catalog_loaded(stamp)
+    assert not database.catalog_changed()
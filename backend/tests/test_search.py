@@ -0,0 +1,30 @@
+"""Search ranking: column-weighted BM25 blended with popularity, in SQL."""
+
+from __future__ import annotations
+
+from conftest import make_place
+from services import search
+from services.search import _ranked_fts_ids, build_fts_query
+
+
+def test_name_hit_outranks_description_hit(db, add_places):
+    add_places(
+        make_place("desc", name_ar="مطعم الحي", description_ar="عندهم برجر لذيذ",
+                   google_rating=5.0, review_count=900),
+        make_place("name", name_ar="برجر الديرة", google_rating=3.0, review_count=5),
+    )
+    assert _ranked_fts_ids(db, build_fts_query("برجر")) == ("name", "desc")
+
+
+def test_popularity_breaks_equal_text_relevance(db, add_places):
+    add_places(
+        make_place("low", name_ar="كافيه ورد", google_rating=3.0, review_count=10),
+        make_place("high", name_ar="كافيه ورد", google_rating=4.8, review_count=2000),
+    )
+    assert _ranked_fts_ids(db, build_fts_query("ورد")) == ("high", "low")
+
+
+def test_cap_is_applied_in_sql(db, add_places, monkeypatch):
+    add_places(*(make_place(f"p{i}", name_ar=f"كافيه {i}") for i in range(5)))
+    monkeypatch.setattr(search, "SEARCH_ID_CAP", 2)
+    assert len(_ranked_fts_ids(db, build_fts_query("كافيه"))) == 2
@@ -0,0 +1,42 @@
+"""Views snapshot: swapped on reload while requests may still read it."""
+
+from __future__ import annotations
+
+import json
+
+import cache
+from conftest import make_place
+from database import set_data_version
+
+
+def test_reload_while_a_reader_holds_a_slice(db, add_places):
+    add_places(make_place("p1", neighborhood="حي العليا"))
+    set_data_version(db, "v1")
+    db.commit()
+    cache.precompute_views(db)
+    old = cache._views
+    held = old.raw("neighborhoods")  # an in-flight request's zero-copy slice
+
+    add_places(make_place("p2", neighborhood="حي الملقا"))
+    set_data_version(db, "v2")
+    db.commit()
+    cache.precompute_views(db)  # used to raise BufferError closing the old map
+
+    assert json.loads(bytes(held))[0]["neighborhood"] == "حي العليا"
+    assert {h["neighborhood"] for h in cache.get_precomputed("neighborhoods")} == {
+        "حي العليا", "حي الملقا",
+    }
+    assert cache._views is not old
+
+
+def test_view_schema_change_rebuilds_the_snapshot(db, add_places, monkeypatch):
+    add_places(make_place("p1"))
+    set_data_version(db, "v1")
+    db.commit()
+    cache.precompute_views(db)
+    first = cache._views.path
+
+    monkeypatch.setattr(cache, "VIEWS_SCHEMA", cache.VIEWS_SCHEMA + 1)
+    cache.precompute_views(db)
+    assert cache._views.path != first
+    assert cache._views.version.endswith(f"-s{cache.VIEWS_SCHEMA}")
@@ -0,0 +1,62 @@
+"""The SSE chat stream: bypasses gzip (JSON still compresses), fails with an error event."""
+
+from __future__ import annotations
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from main import StreamAwareGZipMiddleware
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(StreamAwareGZipMiddleware, minimum_size=10)
+
+    @app.get("/stream")
+    def stream():
+        events = (f"event: e\ndata: {'x' * 100}\n\n" for _ in range(3))
+        return StreamingResponse(events, media_type="text/event-stream")
+
+    @app.get("/json")
+    def json_():
+        return JSONResponse({"x": "y" * 1000})
+
+    return TestClient(app)
+
+
+def test_event_stream_is_not_compressed():
+    r = _client().get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+    assert r.text.count("event: e") == 3
+
+
+def test_json_is_still_compressed():
+    r = _client().get("/json", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+
+
+def test_failure_mid_stream_ends_with_an_error_event(monkeypatch):
+    import asyncio
+    from contextlib import asynccontextmanager
+
+    import routers.ai as ai
+
+    @asynccontextmanager
+    async def connection():
+        yield None
+
+    async def broken(*args, **kwargs):
+        raise RuntimeError("db gone")
+
+    monkeypatch.setattr(ai, "analyze_message", lambda m: {"greeting": False, "category": "كافيه"})
+    monkeypatch.setattr(ai, "plan_turn", lambda *args: [])
+    monkeypatch.setattr(ai, "async_read_connection", connection)
+    monkeypatch.setattr(ai, "fetch_places_async", broken)
+
+    async def collect():
+        return [frame async for frame in ai._chat_events("كافيه", [], "d", None, None)]
+
+    frames = asyncio.run(collect())
+    assert [f.split("\n", 1)[0] for f in frames] == ["event: intent", "event: error"]
+    assert '"detail"' in frames[-1]
@@ -0,0 +1,64 @@
+"""Autocomplete: spelling variants share one cache slot."""
+
+from __future__ import annotations
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from cache import clear_caches, suggest_cache
+from conftest import make_place
+from routers.places import router
+from services.suggest import build_suggest_index
+
+
+def test_variants_share_a_cache_entry(db, add_places):
+    add_places(make_place("p1", name_ar="أحمد للقهوة", name_en="Ahmad Coffee"))
+    build_suggest_index(db)
+    clear_caches()
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+
+    bodies = [
+        client.get("/api/v1/places/suggest", params={"q": q}).json()
+        for q in ("أحمد", "احمد", "  احمد ", "AHMAD", "ahmad")
+    ]
+    assert [b["query"] for b in bodies] == ["أحمد", "احمد", "  احمد ", "AHMAD", "ahmad"]
+    assert all(any(s.get("id") == "p1" for s in b["suggestions"]) for b in bodies)
+    assert len(suggest_cache) == 2
+
+
+def _index(n_places: int):
+    from services.suggest import SuggestIndex
+
+    places = [
+        {"id": f"p{i}", "name_ar": f"مقهى {i}", "name_en": f"Cafe {i}", "google_rating": i % 50 / 10}
+        for i in range(n_places)
+    ]
+    neighborhoods = [
+        {"name": f"حي {i}", "name_en": f"Hay {i}", "place_count": i} for i in range(6)
+    ]
+    categories = [{"name": "مقاهي", "name_en": "Cafes", "place_count": n_places}]
+    return SuggestIndex(places, neighborhoods, categories)
+
+
+def test_suggestions_never_exceed_the_limit():
+    index = _index(40)
+    for k in (1, 2, 5, 8, 20):
+        for q in ("م", "مق", "c", "cafe", "حي", "h"):
+            assert len(index.suggest(q, k)) <= k
+    # Groups leave room for places when both match
+    assert sum(s["type"] == "place" for s in index.suggest("c", 2)) == 1
+
+
+def test_heavy_prefixes_match_the_live_ranking(monkeypatch):
+    import services.suggest as suggest
+
+    monkeypatch.setattr(suggest, "HEAVY_PREFIX_KEYS", 10)
+    index = _index(60)
+    assert {"م", "مق", "c", "ca"} <= set(index._heavy)
+    for prefix, ranked in index._heavy.items():
+        lo = suggest.bisect.bisect_left(index.keys, prefix)
+        hi = suggest.bisect.bisect_left(index.keys, prefix + "\U0010ffff", lo)
+        assert ranked == index._rank(lo, hi)
+        assert hi - lo > 10
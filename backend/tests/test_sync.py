@@ -0,0 +1,100 @@
+"""Offline sync: op_id idempotency, last-writer-wins, retention."""
+
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from conftest import make_place
+from services import sync
+from services.sync import apply_sync, device_state, prune_sync_history
+
+NOW = int(time.time() * 1000)
+
+
+@pytest.fixture
+def places(add_places):
+    add_places(make_place("p1"), make_place("p2"))
+
+
+def op(op_id, kind, ts, **fields):
+    return {"op_id": op_id, "type": kind, "client_ts": NOW + ts, **fields}
+
+
+def test_replayed_op_ids_are_skipped(db, places):
+    ops = [op("a", "favorite_add", 1, place_id="p1")]
+    assert apply_sync(db, "d1", ops)["applied"] == 1
+    again = apply_sync(db, "d1", ops + ops)
+    assert again["applied"] == 0 and again["duplicates"] == 2
+    assert device_state(db, "d1")["favorites"] == ["p1"]
+
+
+def test_newest_op_wins_regardless_of_batch_order(db, places):
+    summary = apply_sync(db, "d1", [
+        op("rm", "favorite_remove", 20, place_id="p1"),
+        op("add", "favorite_add", 10, place_id="p1"),
+    ])
+    assert summary["applied"] == 1 and summary["stale"] == 1
+    assert device_state(db, "d1")["favorites"] == []
+
+    # an older add arriving in a later batch can't resurrect it
+    late = apply_sync(db, "d1", [op("add-late", "favorite_add", 15, place_id="p1")])
+    assert late["stale"] == 1
+    assert device_state(db, "d1")["favorites"] == []
+
+
+def test_equal_timestamps_keep_batch_order(db, places):
+    apply_sync(db, "d1", [
+        op("c", "list_create", 1, list_id="l1", name="أول"),
+        op("r1", "list_rename", 5, list_id="l1", name="ثاني"),
+        op("r2", "list_rename", 5, list_id="l1", name="ثالث"),
+    ])
+    assert [l["name"] for l in device_state(db, "d1")["lists"]] == ["ثالث"]
+
+
+def test_adds_need_the_place_but_removals_do_not(db, places):
+    summary = apply_sync(db, "d1", [
+        op("add", "favorite_add", 1, place_id="gone"),
+        op("rm", "favorite_remove", 2, place_id="gone"),
+        op("c", "list_create", 3, list_id="l1", name="x", place_ids=["p1", "gone"]),
+    ])
+    assert summary["rejected"] == ["add", "c"]
+    assert summary["applied"] == 1
+
+
+def test_ops_older_than_retention_are_stale(db, places):
+    old = NOW - (sync.SYNC_RETENTION_DAYS + 1) * 86400 * 1000
+    summary = apply_sync(db, "d1", [
+        {"op_id": "old", "type": "favorite_add", "client_ts": old, "place_id": "p1"},
+    ])
+    assert summary["stale"] == 1
+    assert device_state(db, "d1")["favorites"] == []
+
+
+def test_op_ids_are_capped_per_device(db, places, monkeypatch):
+    monkeypatch.setattr(sync, "SYNC_OPS_PER_DEVICE", 3)
+    apply_sync(db, "d1", [op(f"o{i}", "favorite_add", i, place_id="p1") for i in range(6)])
+    assert db.execute("SELECT COUNT(*) FROM sync_ops WHERE device_id = 'd1'").fetchone()[0] == 3
+
+    db.execute("UPDATE sync_ops SET applied_at = datetime('now', '-1 year')")
+    db.execute("UPDATE sync_state SET updated_at = datetime('now', '-1 year')")
+    assert prune_sync_history(db) == 4
+
+
+def test_checks_run_inside_an_immediate_transaction(db, places):
+    import sqlite3
+
+    import database
+
+    db.commit()
+    apply_sync(db, "d1", [op("a", "favorite_add", 1, place_id="p1")])
+    assert db.in_transaction
+    # another process (worker) can't start writing until this batch commits
+    other = sqlite3.connect(database.DATABASE_PATH, timeout=0)
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            other.execute("BEGIN IMMEDIATE")
+    finally:
+        other.close()
+    db.commit()
@@ -0,0 +1,55 @@
+"""Write-behind queue: commit-before-return and failure reporting."""
+
+from __future__ import annotations
+
+import pytest
+
+from database import read_connection
+from write_queue import Write, WriteFailed, WriteQueue
+
+INSERT = "INSERT INTO lists (id, name, device_id, share_code) VALUES (?, ?, ?, ?)"
+
+
+@pytest.fixture
+def wq(db):
+    q = WriteQueue(window=0.05)
+    q.start()
+    yield q
+    q.stop()
+
+
+def _list_ids():
+    with read_connection() as conn:
+        return {r["id"] for r in conn.execute("SELECT id FROM lists")}
+
+
+def test_commit_returns_after_the_batch_is_on_disk(wq):
+    wq.commit("d1", Write(INSERT, ("l1", "x", "d1", "c1")))
+    assert _list_ids() == {"l1"}
+
+
+def test_failed_op_raises_and_leaves_the_rest_of_the_batch(wq):
+    ok = wq.submit("d1", Write(INSERT, ("l1", "x", "d1", "c1")))
+    dup = wq.submit("d2", Write(INSERT, ("l2", "y", "d2", "c1")))  # share_code clash
+    ok.result(2)
+    with pytest.raises(Exception):
+        dup.result(2)
+    with pytest.raises(WriteFailed):
+        wq.commit("d2", Write("INSERT INTO nope VALUES (1)"))
+    assert _list_ids() == {"l1"}
+    assert wq.stats()["failed"] == 2
+
+
+def test_wait_for_all_covers_every_device(wq):
+    futures = [wq.submit(f"d{i}", Write(INSERT, (f"l{i}", "x", f"d{i}", f"c{i}"))) for i in range(5)]
+    assert wq.wait_for_all(2)
+    assert all(f.done() for f in futures)
+    assert _list_ids() == {f"l{i}" for i in range(5)}
+
+
+def test_without_a_writer_thread_commit_is_synchronous(db):
+    q = WriteQueue()
+    q.commit("d1", Write(INSERT, ("l1", "x", "d1", "c1")))
+    assert _list_ids() == {"l1"}
+    with pytest.raises(WriteFailed):
+        q.commit("d1", Write(INSERT, ("l1", "x", "d1", "c1")))
@@ -0,0 +1,225 @@
+"""Write-behind queue for user writes (favorites, lists) — وين نروح بالرياض.
+
+Handlers hand their statements to :meth:`WriteQueue.commit`; one writer
+thread drains the queue and commits everything that arrived within
+``BATCH_WINDOW`` in a single transaction, so a burst of taps costs one
+fsync instead of one each. ``commit`` returns only after the op's batch
+is committed and raises :class:`WriteFailed` if the op was rolled back
+or didn't land in time, so a handler never answers "ok" for a write
+that isn't on disk. The queue is FIFO with a single consumer, so writes
+from the same device are applied in the order they were accepted.
+
+Reads that must see a device's own writes call :func:`wait_for_device`
+first; share-code lookups, which can't name the device, wait for
+everything accepted so far with :func:`wait_for_all`.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, NamedTuple, Optional
+
+from database import write_connection
+
+BATCH_WINDOW = 0.005  # seconds to keep collecting after the first write
+MAX_BATCH = 500
+COMMIT_TIMEOUT = 5.0  # seconds a handler waits for its batch
+
+
+class WriteFailed(Exception):
+    """An op was rolled back, or its batch didn't commit in time."""
+
+
+class Write(NamedTuple):
+    sql: str
+    params: Any = ()
+    many: bool = False  # params is a sequence of rows → executemany
+
+
+class _Op(NamedTuple):
+    device_id: str
+    writes: tuple[Write, ...]
+    future: Future
+    seq: int
+
+
+_STOP = object()
+
+
+class WriteQueue:
+    def __init__(self, window: float = BATCH_WINDOW, max_batch: int = MAX_BATCH):
+        self._window = window
+        self._max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._pending: dict[str, int] = {}
+        self._accepted = 0  # ops handed to the queue so far
+        self._done = 0  # of those, finished (committed or failed); FIFO
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.ops = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Commit everything already accepted, then stop the writer."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, device_id: str, *writes: Write) -> Future:
+        """Accept ``writes`` (applied atomically, in order) for ``device_id``.
+
+        The returned future resolves once the batch holding them is
+        committed, or fails with the op's error. Without a running writer
+        thread (scripts, startup) they are committed right away.
+        """
+        future: Future = Future()
+        if self._thread is None:
+            try:
+                with write_connection() as conn:
+                    _apply(conn, writes)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+            return future
+        with self._cond:
+            self._pending[device_id] = self._pending.get(device_id, 0) + 1
+            self._accepted += 1
+            seq = self._accepted
+        self._queue.put(_Op(device_id, writes, future, seq))
+        return future
+
+    def commit(self, device_id: str, *writes: Write, timeout: float = COMMIT_TIMEOUT) -> None:
+        """:meth:`submit` and block until committed; raises :class:`WriteFailed`."""
+        future = self.submit(device_id, *writes)
+        try:
+            future.result(timeout)
+        except FutureTimeout as e:
+            raise WriteFailed("commit timed out") from e
+        except Exception as e:
+            raise WriteFailed(str(e)) from e
+
+    def wait_for_device(self, device_id: str, timeout: float = 2.0) -> bool:
+        """Block until every accepted write of ``device_id`` is committed."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending.get(device_id):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def wait_for_all(self, timeout: float = 2.0) -> bool:
+        """Block until every write accepted before this call is committed."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._accepted
+            while self._done < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "ops": self.ops,
+            "failed": self.failed,
+        }
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self._window
+            while len(batch) < self._max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+        # drain whatever raced the stop marker
+        rest = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                rest.append(item)
+        if rest:
+            self._commit(rest)
+
+    def _commit(self, batch: list[_Op]) -> None:
+        errors: dict[int, Exception] = {}
+        try:
+            with write_connection() as conn:
+                # explicit BEGIN: otherwise releasing the first savepoint commits
+                conn.execute("BEGIN IMMEDIATE")
+                for i, op in enumerate(batch):
+                    # one savepoint per op: a bad op doesn't sink the batch
+                    conn.execute(f"SAVEPOINT op{i}")
+                    try:
+                        _apply(conn, op.writes)
+                    except Exception as e:
+                        conn.execute(f"ROLLBACK TO op{i}")
+                        errors[i] = e
+                        print(f"⚠️ فشل حفظ عملية للجهاز {op.device_id}: {e}")
+                    conn.execute(f"RELEASE op{i}")
+        except Exception as e:
+            errors = {i: e for i in range(len(batch))}
+            print(f"⚠️ فشل حفظ دفعة ({len(batch)} عملية): {e}")
+        finally:
+            self.batches += 1
+            self.ops += len(batch)
+            self.failed += len(errors)
+            # futures resolve only now, after the transaction is committed
+            for i, op in enumerate(batch):
+                if i in errors:
+                    op.future.set_exception(errors[i])
+                else:
+                    op.future.set_result(None)
+            with self._cond:
+                for op in batch:
+                    left = self._pending.get(op.device_id, 0) - 1
+                    if left > 0:
+                        self._pending[op.device_id] = left
+                    else:
+                        self._pending.pop(op.device_id, None)
+                self._done = max(self._done, batch[-1].seq)
+                self._cond.notify_all()
+
+
+def _apply(conn, writes: tuple[Write, ...]) -> None:
+    for w in writes:
+        if w.many:
+            conn.executemany(w.sql, w.params)
+        else:
+            conn.execute(w.sql, w.params)
+
+
+_write_queue = WriteQueue()
+
+
+def get_write_queue() -> WriteQueue:
+    return _write_queue